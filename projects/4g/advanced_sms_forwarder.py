@@ -4,101 +4,535 @@ EC25 LTE Modem Telegram Bot - Complete Version
 With SMS and Call Detection
 """
 
+from __future__ import annotations
+
 import serial
 import time
 import logging
 import logging.handlers
+import atexit
+import copy
 import json
 import os
 import subprocess
 import threading
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+import asyncio
+import itertools
+import datetime
+import array
+import statistics
+import http.server
+import queue
+import re
+import collections
+import functools
+import contextlib
+import glob
+import concurrent.futures
+import struct
+import argparse
+import csv
+import sqlite3
+from typing import TYPE_CHECKING
+
+# python-telegram-bot takes longer to import than the rest of the bot; it is
+# imported when the application is built, while the modems are being opened
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 # Configuration
 TELEGRAM_BOT_TOKEN = "YOUR_BOT_TOKEN_HERE"
+TELEGRAM_API_URL = None  # Bot API server, e.g. a local telegram-bot-api (None: api.telegram.org)
 MODEM_PORT = '/dev/ttyUSB2'
 BAUDRATE = 115200
 CHECK_INTERVAL = 30
+# Modem worker priority classes (lower runs first)
+PRIORITY_CALL = 0  # ATA / ATH / AT+CHUP
+PRIORITY_SEND = 1  # AT+CMGS, AT+CMGD
+PRIORITY_STATUS = 2  # AT+CSQ / AT+COPS / AT+CPMS, user queries
+PRIORITY_BACKGROUND = 3  # periodic AT+CMGL scans
+# Telegram fan-out limits (Telegram allows ~30 msg/s overall and ~1 msg/s per chat)
+NOTIFY_GLOBAL_RATE = 25  # messages per second across all chats
+NOTIFY_CHAT_RATE = 1  # messages per second per chat
+NOTIFY_CHAT_BURST = 3  # messages a chat may receive back to back
+NOTIFY_MAX_ATTEMPTS = 3  # tries per message when Telegram answers 429
+NOTIFY_SEPARATOR = "\n" + "─" * 20 + "\n"
+TELEGRAM_MAX_MESSAGE = 4096
+BRIDGE_MAX_PENDING = 100  # events from modem threads awaiting the event loop
+MESSAGE_STORAGES = ("SM", "ME")  # SIM and modem memory
+CALL_CLIP_WAIT = 1.0  # seconds to wait for +CLIP after the first RING
+CALL_RING_TIMEOUT = 8  # seconds without RING before checking AT+CLCC for a missed call
+TELEMETRY_INTERVAL = 5  # seconds between signal/network samples
+HISTORY_SPARK_WIDTH = 30  # points per /history sparkline
+# Seconds a status query result is reused before asking the modem again
+STATUS_CACHE_TTLS = {
+    'signal': 10,
+    'registration': 30,
+    'operator': 60,
+    'storage': 15,
+}
+METRICS_ENABLED = True  # serve Prometheus metrics over HTTP
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SMS_EVENT_MODE = True  # fetch new SMS on +CMTI instead of polling every CHECK_INTERVAL
+SMS_PDU_MODE = True  # read SMS as PDUs (AT+CMGF=0): UCS-2 text and long SMS reassembly
+CONCAT_TIMEOUT = 300  # seconds to wait for missing parts of a long SMS before forwarding it
+STORAGE_AUTO_DELETE = True  # delete SMS from the modem once forwarded (False only monitors occupancy)
+STORAGE_KEEP_FORWARDED = False  # keep forwarded SMS until the high watermark instead of deleting right away
+STORAGE_HIGH_WATERMARK = 0.8  # storage fill (0-1) that triggers cleanup and warns users
+STORAGE_LOW_WATERMARK = 0.5  # cleanup brings a storage back down to this fill
+STORAGE_CHECK_INTERVAL = 300  # seconds between storage occupancy checks
+STORAGE_DELETE_BATCH = 5  # AT+CMGD per modem request; calls and sends get the port between batches
+OUTBOX_PIPELINE = 3  # queued SMS handed to the modem worker at once, so sends run back to back
+OUTBOX_MAX_ATTEMPTS = 5  # tries per SMS part before giving up
+OUTBOX_RETRY_BASE = 10  # seconds before the first retry, doubled after every failure
+OUTBOX_RETRY_MAX = 600  # ceiling for the retry backoff
+OUTBOX_COMPACT_EVERY = 500  # journal entries between compactions
+# +CMS ERROR codes a retry cannot fix (unassigned number, barred, rejected, bad parameters)
+OUTBOX_PERMANENT_ERRORS = {1, 8, 10, 21, 28, 29, 30, 50, 96, 302, 303, 304, 305, 310}
+PHONE_NUMBER = re.compile(r'\+?\d{3,15}')
+RECONCILE_INTERVAL = 600  # full storage scan interval when SMS_EVENT_MODE is on
+HEALTH_CHECK_INTERVAL = 60  # seconds of idle before re-validating the session
+DEFAULT_COMMAND_TIMEOUT = 5  # ceiling for commands without a specific timeout
+READ_POLL_INTERVAL = 0.05  # serial read timeout; reads return as soon as data arrives
+STREAM_BUFFER_LINES = 256  # response lines read ahead of a streaming consumer
+# Per-command timeout ceilings (seconds), matched by command prefix
+COMMAND_TIMEOUTS = {
+    'AT+CMGL': 60,
+    'AT+CMGS': 60,
+    'AT+CMGR': 10,
+    'AT+CMGD': 10,
+    'AT+CPMS': 10,
+    'AT+COPS=?': 180,
+    'AT+COPS': 10,
+    'ATA': 10,
+    'ATH': 10,
+    'AT+CHUP': 10,
+}
 AUTHORIZED_USERS_FILE = '/var/lib/ec25-bot/authorized_users.json'
 SEEN_MESSAGES_FILE = '/var/lib/ec25-bot/seen_messages.json'
+SEEN_MAX_ENTRIES = 20000  # retention: most recently seen IDs kept
+SEEN_MAX_AGE_DAYS = 180  # retention: IDs not seen on the modem for this long are dropped
+SEEN_COMPACT_EVERY = 500  # journal entries between snapshot compactions
+OUTBOX_FILE = '/var/lib/ec25-bot/outbox.jsonl'
+PORT_CACHE_FILE = '/var/lib/ec25-bot/port_cache.json'
+ARCHIVE_FILE = '/var/lib/ec25-bot/archive.db'  # every SMS received and sent, searchable with /search and /from
+ARCHIVE_PAGE_SIZE = 10  # messages per /list, /search and /from reply
+USB_SERIAL_SYSFS = '/sys/bus/usb-serial/devices'
+EC25_USB_IDS = {('2c7c', '0125')}  # (idVendor, idProduct)
+EC25_AT_INTERFACES = (2, 3)  # USB interface numbers of the AT and modem ports, in preference order
+MODEM_POOL = True  # run every EC25 found on USB, each with its own session (False: only the first)
+MODEM_NAMES = {}  # USB device path -> name shown in notifications, e.g. {'1-1.2': 'SIM A'}
 LOG_FILE = '/tmp/sms_bot.log'
+LOG_FORMAT = 'text'  # 'text', or 'json' for one JSON object per line
+LOG_ROUTINE_INTERVAL = 600  # routine lines (every SMS check, every Telegram poll) are logged once per this many seconds
+LOG_ROUTINE_LOGGERS = ('httpx',)  # loggers whose INFO lines are all routine (one per Telegram API call)
+TRACE_FILE = None  # record all serial traffic to this file (replay with --replay)
 
-os.makedirs(os.path.dirname(AUTHORIZED_USERS_FILE), exist_ok=True)
-
-# Setup logging to file with rotation
+# Logging is set up by setup_logging(): records are queued to a listener thread that writes them
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
+ROUTINE = {'routine': True}  # extra= for lines logged on every poll cycle
+
+
+class LogSampler(logging.Filter):
+    """Rate-limit routine log lines per line of code.
+    
+    Routine records below WARNING (extra=ROUTINE, or from a routine logger)
+    are let through once per routine_interval from each call site; the next
+    one let through says how many were dropped. Every other record, like the
+    per-message lines of sent and received SMS and calls, always passes.
+    """
+    
+    def __init__(self, routine_interval=LOG_ROUTINE_INTERVAL, routine_loggers=LOG_ROUTINE_LOGGERS):
+        super().__init__()
+        self.routine_interval = routine_interval
+        self.routine_loggers = routine_loggers
+        self.sites = {}  # (pathname, lineno) -> [window start, records logged, records dropped]
+        self.dropped = 0
+        self.lock = threading.Lock()
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.routine_interval:
+            return True
+        if not (getattr(record, 'routine', False) or record.name.startswith(self.routine_loggers)):
+            return True
+        
+        with self.lock:
+            site = self.sites.setdefault((record.pathname, record.lineno), [record.created, 0, 0])
+            if record.created - site[0] >= self.routine_interval:
+                site[0], site[1] = record.created, 0
+            if site[1] >= 1:
+                site[2] += 1
+                self.dropped += 1
+                return False
+            site[1] += 1
+            dropped, site[2] = site[2], 0
+        
+        if dropped:
+            record.msg, record.args = f"{record.getMessage()} ({dropped} similar lines suppressed)", None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
 
-# Create formatter
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-# File handler with rotation (max 10MB, keep 5 old files)
-file_handler = logging.handlers.RotatingFileHandler(
-    LOG_FILE,
-    maxBytes=10*1024*1024,  # 10MB
-    backupCount=5
-)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-
-# Console handler (optional, for systemd journal)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
-
-# Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# Also configure root logger for telegram library logs
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Queue records for the listener thread, leaving formatting to its handlers.
+    
+    QueueHandler.prepare() formats the record with its own formatter and
+    folds the traceback into the message. Here only the message arguments
+    are merged and the traceback rendered to exc_text, so the listener's
+    formatter (text or JSON) still sees the exception as its own field.
+    """
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            # Rendered now: the traceback's frames are not kept alive in the queue
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+log_sampler = LogSampler()
+
+
+def setup_logging():
+    """Route all logging through a queue to a listener thread writing LOG_FILE and the console"""
+    if LOG_FORMAT == 'json':
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
+    # File handler with rotation (max 10MB, keep 5 old files)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=10*1024*1024,  # 10MB
+        backupCount=5
+    )
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    
+    # Console handler (optional, for systemd journal)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+    
+    # Both handlers run on the listener thread, so slow flash writes never block the bot
+    log_queue = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(log_sampler)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                              respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # Attached to the root logger only: the bot's records and the telegram library's
+    # reach it by propagation, each exactly once
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(queue_handler)
 
 
 class SeenMessagesManager:
-    """Manage seen messages with persistence"""
+    """Manage seen messages with an append-only journal and compacted snapshot.
+    
+    mark_seen() appends one line to the journal; inside batch() entries are
+    buffered and committed with a single write and fsync. The snapshot is
+    rewritten atomically (temp file + rename) only on compaction, which
+    also applies the retention policy. With the event loop running, the
+    writes, fsyncs and compactions run on a thread (one at a time), so a
+    scan is never held up by the disk. Entries are kept in least-recently-seen order so
+    IDs still present on the modem are refreshed by every scan and never
+    aged out while they could be re-notified.
     
-    def __init__(self, filepath=SEEN_MESSAGES_FILE):
+    A message is only marked seen once its notification reached a chat;
+    those IDs are also recorded as forwarded, which is what allows the
+    message to be deleted from the modem. IDs being notified right now
+    count as seen in memory only, so a concurrent scan does not notify
+    them twice and an undelivered message is retried by the next one.
+    """
+    
+    def __init__(self, filepath=SEEN_MESSAGES_FILE, max_entries=SEEN_MAX_ENTRIES,
+                 max_age=SEEN_MAX_AGE_DAYS * 86400, compact_every=SEEN_COMPACT_EVERY):
         self.filepath = filepath
+        self.journal_path = filepath + '.journal'
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.compact_every = compact_every
+        self.journal = None
+        self.journal_entries = 0
+        self.pending = []
+        self.batch_depth = 0
+        self.total_writes = 0
+        self.total_bytes = 0
+        self.last_commit = {'entries': 0, 'writes': 0, 'bytes': 0}
+        self.commit_failed = False
+        self.compact_requested = False
+        self.write_lock = asyncio.Lock()  # one write on the thread at a time, in order
+        self.writing = False
+        self.flushes = set()  # commits scheduled outside a batch
+        self.forwarded = set()  # seen IDs that reached a chat: deletable from the modem
+        self.delivering = set()  # IDs whose notifications are in flight (not persisted)
         self.seen = self.load_seen()
+        if self.journal_entries:
+            # No pruning yet: retention ages are refreshed by the first scan
+            self.compact(prune=False)
     
     def load_seen(self):
-        """Load seen messages from file"""
+        """Load the snapshot, then replay the journal on top of it"""
+        seen = collections.OrderedDict()
         if os.path.exists(self.filepath):
             try:
                 with open(self.filepath, 'r') as f:
-                    return set(json.load(f))
+                    data = json.load(f)
+                if isinstance(data, list):
+                    # Legacy format: plain list of IDs
+                    now = time.time()
+                    data = {msg_id: now for msg_id in data}
+                elif 'seen' in data and 'forwarded' in data:
+                    self.forwarded.update(data['forwarded'])
+                    data = data['seen']
+                # IDs from before the forwarded state was kept are never deleted
+                seen.update(sorted(data.items(), key=lambda item: item[1]))
             except Exception as e:
                 logger.error(f"Error loading seen messages: {e}")
-        return set()
+        
+        if os.path.exists(self.journal_path):
+            try:
+                with open(self.journal_path, 'r') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            msg_id, seen_at = entry[:2]
+                        except (ValueError, TypeError):
+                            # Torn final line from a crash mid-append
+                            logger.warning("Skipping corrupt seen-messages journal entry")
+                            continue
+                        if seen_at is None:
+                            # Forgotten once the message left the modem
+                            seen.pop(msg_id, None)
+                            self.forwarded.discard(msg_id)
+                        else:
+                            seen[msg_id] = seen_at
+                            seen.move_to_end(msg_id)
+                            if len(entry) > 2 and entry[2]:
+                                self.forwarded.add(msg_id)
+                        self.journal_entries += 1
+            except Exception as e:
+                logger.error(f"Error replaying seen messages journal: {e}")
+        return seen
+    
+    def _write(self, f, data):
+        """Write to a store file, counting writes and bytes"""
+        f.write(data)
+        self.total_writes += 1
+        self.total_bytes += len(data)
     
-    def save_seen(self):
-        """Save seen messages to file"""
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Buffer mark_seen() calls and commit them with one durable write"""
+        self.batch_depth += 1
         try:
-            with open(self.filepath, 'w') as f:
-                json.dump(list(self.seen), f)
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                await self.flush()
+    
+    def _schedule(self):
+        """Commit outside a batch: on a thread while the event loop runs, right away otherwise"""
+        if self.batch_depth:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.commit()
+            return
+        task = loop.create_task(self.flush())
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+    
+    def _take(self):
+        """Claim the buffered entries, and a snapshot when compaction is due"""
+        entries, self.pending = self.pending, []
+        snapshot = None
+        if self.compact_requested or self.journal_entries + len(entries) >= self.compact_every:
+            self.compact_requested = False
+            self._prune()
+            # Copied: the event loop keeps updating the live dict while a thread writes
+            snapshot = {'seen': dict(self.seen), 'forwarded': sorted(self.forwarded)}
+        return entries, snapshot
+    
+    def commit(self):
+        """Write buffered entries (and a due compaction) from the calling thread"""
+        self._write_entries(*self._take())
+    
+    async def flush(self):
+        """Write buffered entries (and a due compaction) on a thread"""
+        async with self.write_lock:
+            entries, snapshot = self._take()
+            if not entries and snapshot is None:
+                return
+            self.writing = True
+            try:
+                await asyncio.to_thread(self._write_entries, entries, snapshot)
+            finally:
+                self.writing = False
+    
+    def _write_entries(self, entries, snapshot):
+        """Append entries to the journal in one write, fsync, then write the snapshot if given"""
+        writes, size = self.total_writes, self.total_bytes
+        if entries:
+            try:
+                if self.journal is None:
+                    self.journal = open(self.journal_path, 'a')
+                self._write(self.journal, ''.join(json.dumps(entry) + '\n' for entry in entries))
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.journal_entries += len(entries)
+            except Exception as e:
+                self.commit_failed = True
+                logger.error(f"Error appending to seen messages journal: {e}")
+        
+        if snapshot is not None:
+            self._write_snapshot(snapshot)
+        
+        if entries:
+            self.last_commit = {
+                'entries': len(entries),
+                'writes': self.total_writes - writes,
+                'bytes': self.total_bytes - size,
+            }
+            logger.info(f"Committed {len(entries)} seen IDs: {self.last_commit['writes']} writes, "
+                        f"{self.last_commit['bytes']} bytes")
+    
+    def _prune(self):
+        """Apply the age and size retention policy (oldest first)"""
+        cutoff = time.time() - self.max_age
+        while self.seen:
+            msg_id, seen_at = next(iter(self.seen.items()))
+            if seen_at >= cutoff and len(self.seen) <= self.max_entries:
+                break
+            del self.seen[msg_id]
+            self.forwarded.discard(msg_id)
+    
+    def compact(self, prune=True):
+        """Write a pruned snapshot atomically and truncate the journal (calling thread)"""
+        if prune:
+            self._prune()
+        self._write_snapshot({'seen': dict(self.seen), 'forwarded': sorted(self.forwarded)})
+    
+    def _write_snapshot(self, snapshot):
+        tmp_path = self.filepath + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                self._write(f, json.dumps(snapshot))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+            
+            # The snapshot now holds everything; a crash before truncation only replays duplicates
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = open(self.journal_path, 'w')
+            self.journal_entries = 0
+            self.commit_failed = False
+            logger.info(f"Compacted seen messages ({len(snapshot['seen'])} entries)")
         except Exception as e:
             logger.error(f"Error saving seen messages: {e}")
     
-    def mark_seen(self, msg_id):
-        """Mark message as seen"""
-        self.seen.add(msg_id)
-        self.save_seen()
+    @property
+    def durable(self):
+        """Whether every ID marked seen so far has reached the disk"""
+        return not self.pending and not self.writing and not self.commit_failed
+    
+    def mark_seen(self, msg_id, forwarded=False):
+        """Mark message as seen, and as forwarded once a chat got it (committed immediately unless in a batch)"""
+        seen_at = time.time()
+        self.seen[msg_id] = seen_at
+        self.seen.move_to_end(msg_id)
+        if forwarded:
+            self.forwarded.add(msg_id)
+            self.pending.append([msg_id, seen_at, True])
+        else:
+            self.pending.append([msg_id, seen_at])
+        self._schedule()
+    
+    def forget(self, msg_id):
+        """Drop the ID of a message deleted from the modem, so a new message may reuse it"""
+        self.forwarded.discard(msg_id)
+        if self.seen.pop(msg_id, None) is not None:
+            self.pending.append([msg_id, None])
+            self._schedule()
     
     def is_seen(self, msg_id):
-        """Check if message was seen"""
-        return msg_id in self.seen
+        """Check if message was seen (refreshing its retention age)"""
+        if msg_id not in self.seen:
+            return False
+        self.seen[msg_id] = time.time()
+        self.seen.move_to_end(msg_id)
+        return True
+    
+    def is_forwarded(self, msg_id):
+        """Whether a seen message reached a chat, so it may be deleted from the modem"""
+        return msg_id in self.forwarded
+    
+    def is_message_seen(self, msg):
+        """Check a message by ID, migrating entries recorded under a legacy ID (noted in msg['previous_id'])"""
+        if msg['id'] in self.delivering or self.is_seen(msg['id']):
+            return True
+        for legacy_id in msg.get('legacy_ids') or ():
+            if legacy_id == msg['id'] or legacy_id not in self.seen:
+                continue
+            # Legacy IDs may only carry the date, so one may match a single message:
+            # move it to the current ID rather than keep it matching newcomers
+            forwarded = legacy_id in self.forwarded
+            del self.seen[legacy_id]
+            self.forwarded.discard(legacy_id)
+            # Journaled too, or the legacy ID would come back on restart
+            self.pending.append([legacy_id, None])
+            self.mark_seen(msg['id'], forwarded)
+            msg['previous_id'] = legacy_id
+            return True
+        # A long SMS whose parts were each notified before PDU mode
+        parts = msg.get('parts')
+        if parts and all(self.is_message_seen(part) for part in parts):
+            self.mark_seen(msg['id'])
+            return True
+        return False
     
     def clear(self):
         """Clear all seen messages"""
         self.seen.clear()
-        self.save_seen()
+        self.forwarded.clear()
+        self.pending = []
+        self.compact_requested = True
+        self._schedule()
 
 
 class UserManager:
@@ -135,383 +569,3111 @@ class UserManager:
         return list(self.users)
 
 
-class CallMonitor:
-    """Monitor for incoming calls in background"""
+class Metrics:
+    """Minimal metrics registry rendered in the Prometheus text format.
     
-    def __init__(self, baudrate=115200):
-        self.baudrate = baudrate
-        self.ser = None
-        self.monitoring = False
-        self.thread = None
-        self.callback = None
-        self.port = None
+    Counters and histograms are updated in place by the code that owns the
+    event; state that already lives on other objects (queue depths, byte
+    counters, signal values) is read at scrape time by collector callbacks.
+    """
     
-    def find_available_port(self):
-        """Find an available port that's not being used by main modem"""
-        import glob
-        
-        # Get all ttyUSB ports
-        all_ports = sorted(glob.glob('/dev/ttyUSB*'))
+    HELP = {
+        'ec25_at_command_duration_seconds': ('histogram', 'AT command round-trip time'),
+        'ec25_at_command_failures_total': ('counter', 'AT commands that timed out or failed'),
+        'ec25_modem_reconnects_total': ('counter', 'Modem sessions opened'),
+        'ec25_poll_cycle_duration_seconds': ('histogram', 'Duration of a full SMS storage scan'),
+        'ec25_messages_new_total': ('counter', 'New SMS detected'),
+        'ec25_messages_incomplete_total': ('counter', 'Long SMS forwarded with parts missing'),
+        'ec25_messages_forwarded_total': ('counter', 'New SMS delivered to at least one user'),
+        'ec25_telegram_send_duration_seconds': ('histogram', 'Telegram send_message latency'),
+        'ec25_telegram_sends_total': ('counter', 'Telegram notifications by kind and result'),
+        'ec25_telegram_throttled_total': ('counter', 'Telegram 429 (RetryAfter) responses'),
+        'ec25_call_events_total': ('counter', 'Call lifecycle events'),
+        'ec25_sms_sent_total': ('counter', 'Outgoing SMS by result'),
+        'ec25_sms_send_duration_seconds': ('histogram', 'Time to send one SMS part, queueing included'),
+        'ec25_archive_query_duration_seconds': ('histogram', 'SMS archive queries by kind'),
+    }
+    
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # one count per bucket, then sum and total count
+                histogram = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+    
+    def add_collector(self, collector):
+        """Register collector() -> iterable of (name, type, help, labels, value)"""
+        self.collectors.append(collector)
+    
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ''
+        escaped = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+    
+    def render(self):
+        """Render all metrics as Prometheus text exposition format"""
+        families = collections.OrderedDict()
         
-        if not all_ports:
-            logger.error("No ttyUSB ports found")
-            return None
+        def family(name, kind, text):
+            if name not in families:
+                families[name] = [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            return families[name]
         
-        logger.info(f"Available ports for call monitoring: {all_ports}")
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                kind, text = self.HELP.get(name, ('counter', name))
+                family(name, kind, text).append(f"{name}{self._labels(labels)} {value}")
+            
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                kind, text = self.HELP.get(name, ('histogram', name))
+                lines = family(name, kind, text)
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram[-1]}")
         
-        # Try each port to find one that responds to AT
-        # Prefer higher numbered ports (less likely to be used for data)
-        for port in reversed(all_ports):
+        for collector in self.collectors:
             try:
-                logger.info(f"Testing {port} for call monitoring...")
-                test_ser = serial.Serial(port, self.baudrate, timeout=1)
-                time.sleep(0.3)
-                test_ser.write(b'AT\r\n')
-                time.sleep(0.5)
-                response = test_ser.read(test_ser.in_waiting).decode('utf-8', errors='ignore')
-                test_ser.close()
-                
-                if 'OK' in response:
-                    logger.info(f"Port {port} responds to AT commands - using for call monitoring")
-                    return port
-                else:
-                    logger.debug(f"Port {port} no AT response: {repr(response)}")
+                for name, kind, text, labels, value in collector():
+                    if value is None:
+                        continue
+                    family(name, kind, text).append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value}")
             except Exception as e:
-                logger.debug(f"Port {port} failed: {e}")
-                continue
+                logger.error(f"Error collecting metrics: {e}")
+        
+        return '\n'.join(line for lines in families.values() for line in lines) + '\n'
+
+
+class MetricsServer:
+    """Serve Metrics.render() at /metrics on a background HTTP thread"""
+    
+    def __init__(self, registry, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+    
+    def start(self):
+        registry = self.registry
         
-        # If no port responds, just use the last one
-        if all_ports:
-            logger.warning(f"No port responded to AT, using {all_ports[-1]}")
-            return all_ports[-1]
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
         
+        try:
+            self.httpd = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error(f"Could not start metrics server on {self.host}:{self.port}: {e}")
+            return
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+        logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+    
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+class RingBuffer:
+    """Fixed-size, array-backed ring of (time, avg, min, max) samples"""
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.avg = array.array('d', bytes(8 * capacity))
+        self.lo = array.array('d', bytes(8 * capacity))
+        self.hi = array.array('d', bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+    
+    def append(self, t, avg, lo, hi):
+        self.times[self.head] = t
+        self.avg[self.head] = avg
+        self.lo[self.head] = lo
+        self.hi[self.head] = hi
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def oldest(self):
+        """Timestamp of the oldest sample held, or None"""
+        if not self.count:
+            return None
+        return self.times[(self.head - self.count) % self.capacity]
+    
+    def since(self, start):
+        """Yield (time, avg, min, max) samples at or after start, oldest first"""
+        for i in range(self.count):
+            idx = (self.head - self.count + i) % self.capacity
+            if self.times[idx] >= start:
+                yield self.times[idx], self.avg[idx], self.lo[idx], self.hi[idx]
+
+
+class TelemetrySeries:
+    """One metric kept at per-sample, per-minute and per-hour resolution"""
+    
+    # (name, bucket width in seconds, capacity)
+    TIERS = (('sample', 0, 3600), ('minute', 60, 1440), ('hour', 3600, 720))
+    
+    def __init__(self):
+        self.tiers = [(name, width, RingBuffer(capacity)) for name, width, capacity in self.TIERS]
+        self.buckets = {}  # tier name -> [bucket start, sum, n, min, max]
+    
+    def add(self, t, value):
+        for name, width, ring in self.tiers:
+            if not width:
+                ring.append(t, value, value, value)
+                continue
+            start = t - t % width
+            bucket = self.buckets.get(name)
+            if bucket is not None and bucket[0] != start:
+                ring.append(bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4])
+                bucket = None
+            if bucket is None:
+                self.buckets[name] = [start, value, 1, value, value]
+            else:
+                bucket[1] += value
+                bucket[2] += 1
+                bucket[3] = min(bucket[3], value)
+                bucket[4] = max(bucket[4], value)
+    
+    def window(self, seconds):
+        """Samples of the finest tier that covers the last `seconds`"""
+        start = time.time() - seconds
+        for name, width, ring in self.tiers:
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= start:
+                return list(ring.since(start))
+        # Not enough history yet for any tier: use the most detailed one
+        return list(self.tiers[0][2].since(start))
+
+
+class TelemetryHistory:
+    """Signal/network samples: latest values plus downsampled history"""
+    
+    METRICS = (
+        ('rssi', 'RSSI', ''),
+        ('rsrp', 'RSRP', ' dBm'),
+        ('rsrq', 'RSRQ', ' dB'),
+        ('sinr', 'SINR', ' dB'),
+    )
+    SPARK_CHARS = '▁▂▃▄▅▆▇█'
+    
+    def __init__(self):
+        self.series = {metric: TelemetrySeries() for metric, _, _ in self.METRICS}
+        self.latest = None
+    
+    def record(self, sample):
+        self.latest = sample
+        for metric, _, _ in self.METRICS:
+            value = sample.get(metric)
+            if value is not None:
+                self.series[metric].add(sample['time'], value)
+    
+    def latest_if_fresh(self, max_age):
+        """Latest sample if it is younger than max_age seconds"""
+        if self.latest and time.time() - self.latest['time'] <= max_age:
+            return self.latest
         return None
     
+    def sparkline(self, values, width=HISTORY_SPARK_WIDTH):
+        """Render values as a unicode sparkline, averaged down to width points"""
+        if not values:
+            return ""
+        if len(values) > width:
+            step = len(values) / width
+            values = [
+                statistics.fmean(values[int(i * step):max(int((i + 1) * step), int(i * step) + 1)])
+                for i in range(width)
+            ]
+        lo, hi = min(values), max(values)
+        span = (hi - lo) or 1
+        top = len(self.SPARK_CHARS) - 1
+        return ''.join(self.SPARK_CHARS[round((v - lo) / span * top)] for v in values)
+    
+    def summary(self, seconds):
+        """Min/avg/max and sparkline per metric over the last `seconds`"""
+        lines = []
+        for metric, label, unit in self.METRICS:
+            samples = self.series[metric].window(seconds)
+            if not samples:
+                lines.append(f"{label}: no data")
+                continue
+            avgs = [avg for _, avg, _, _ in samples]
+            lo = min(s[2] for s in samples)
+            hi = max(s[3] for s in samples)
+            lines.append(f"{label}: min {lo:g} / avg {statistics.fmean(avgs):.1f} / max {hi:g}{unit}")
+            lines.append(self.sparkline(avgs))
+        return '\n'.join(lines)
+
+
+class CallMonitor:
+    """Track incoming calls from URCs on the shared modem session.
+    
+    A small state machine (idle -> ringing -> active -> idle) turns the
+    stream of RING / +CLIP / NO CARRIER lines into call lifecycle events:
+    exactly one 'incoming' per call, then 'answered', 'missed', 'rejected'
+    or 'ended'. Calls that stop ringing without NO CARRIER are confirmed
+    with AT+CLCC once the rings stop. Modem commands go through the modem's
+    worker at call priority, so they never wait behind a whole SMS listing.
+    """
+    
+    IDLE = 'idle'
+    RINGING = 'ringing'
+    ACTIVE = 'active'
+    
+    def __init__(self, modem, worker=None, retry_delay=10, ring_timeout=CALL_RING_TIMEOUT):
+        self.modem = modem
+        self.worker = worker
+        self.retry_delay = retry_delay
+        self.ring_timeout = ring_timeout
+        self.monitoring = False
+        self.thread = None
+        self.callback = None
+        self._stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.state = self.IDLE
+        self.caller_id = None
+        self.announced = False
+        self.rings = 0
+        self.started = None
+        self.last_ring = None
+        self.answered_at = None
+        self.call_seq = 0
+    
     def set_callback(self, callback):
-        """Set callback function to call when call is detected"""
+        """Set callback(event, caller_id, details) for call lifecycle events"""
         self.callback = callback
     
     def start(self):
-        """Start monitoring in background thread"""
+        """Subscribe to call URCs and keep the modem session alive"""
         if self.monitoring:
             return
         
         self.monitoring = True
-        self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._stop_event.clear()
+        self.modem.add_init_command('AT+CLIP=1')
+        self.modem.subscribe(('RING', '+CLIP:', 'NO CARRIER'), self._on_urc)
+        self.thread = threading.Thread(target=self._supervise_loop, daemon=True)
         self.thread.start()
-        logger.info("Call monitoring thread started")
+        logger.info("Call monitoring started")
     
     def stop(self):
         """Stop monitoring"""
         self.monitoring = False
-        if self.ser and self.ser.is_open:
-            self.ser.close()
+        self._stop_event.set()
+        self.modem.unsubscribe(self._on_urc)
         logger.info("Call monitoring stopped")
     
-    def _monitor_loop(self):
-        """Background monitoring loop"""
-        retry_delay = 10
-        
+    def _modem_call(self, func, *args, timeout):
+        """Run a modem call on the worker at call priority (directly without a worker)"""
+        if self.worker is None:
+            return func(*args)
+        return self.worker.call(func, *args, priority=PRIORITY_CALL, timeout=timeout)
+    
+    def _supervise_loop(self):
+        """Reopen the shared session after failures so URCs keep flowing"""
         while self.monitoring:
             try:
-                # Find available port
-                if not self.port:
-                    self.port = self.find_available_port()
-                    if not self.port:
-                        logger.error("No port available for call monitoring")
-                        time.sleep(retry_delay)
-                        continue
-                
-                # Connect to modem
-                logger.info(f"Connecting call monitor to {self.port}...")
-                self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
-                time.sleep(0.5)
-                
-                # Enable caller ID
-                self.ser.write(b'AT+CLIP=1\r\n')
-                time.sleep(0.5)
-                response = self.ser.read(self.ser.in_waiting)
-                logger.info(f"CLIP enabled on {self.port}: {repr(response)}")
-                
-                logger.info(f"Call monitor active on {self.port}")
-                
-                # Monitor for RING and CLIP
-                buffer = ""
-                while self.monitoring:
-                    if self.ser.in_waiting:
-                        data = self.ser.read(self.ser.in_waiting).decode('utf-8', errors='ignore')
-                        buffer += data
-                        
-                        # Check for incoming call indicators
-                        if 'RING' in buffer or '+CLIP:' in buffer:
-                            logger.info(f"Call detected: {repr(buffer)}")
-                            self._handle_call(buffer)
-                            buffer = ""  # Clear buffer after handling
-                    
-                    time.sleep(0.5)
-                    
-            except serial.SerialException as e:
-                logger.error(f"Serial error in call monitor: {e}")
-                if self.ser:
-                    try:
-                        self.ser.close()
-                    except:
-                        pass
-                self.ser = None
-                
-                # If port disappeared, reset and try to find again
-                if "could not open port" in str(e) or "device reports readiness" in str(e):
-                    logger.warning("Port lost, will try to find new port")
-                    self.port = None
+                connected = self._modem_call(self.modem.connect, timeout=60)
+            except concurrent.futures.TimeoutError:
+                connected = False
+            if not connected:
+                logger.info(f"Retrying call monitor in {self.retry_delay}s...")
+            self._stop_event.wait(self.retry_delay)
+    
+    def _on_urc(self, line):
+        """Advance the call state machine on RING/+CLIP/NO CARRIER"""
+        events = []
+        with self.lock:
+            if line.startswith('NO CARRIER'):
+                if self.state != self.IDLE:
+                    events.append(self._finish('ended' if self.state == self.ACTIVE else 'missed'))
+            elif self.state != self.ACTIVE:
+                if self.state == self.IDLE:
+                    logger.info("Call detected")
+                    self.state = self.RINGING
+                    self.caller_id = None
+                    self.announced = False
+                    self.rings = 0
+                    self.started = time.monotonic()
+                    self.call_seq += 1
+                    self._arm_timer(CALL_CLIP_WAIT)
+                self.last_ring = time.monotonic()
                 
-                if self.monitoring:
-                    logger.info(f"Retrying call monitor in {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    
-            except Exception as e:
-                logger.error(f"Unexpected error in call monitor: {e}", exc_info=True)
-                if self.ser:
-                    try:
-                        self.ser.close()
-                    except:
-                        pass
+                if line.startswith('RING'):
+                    self.rings += 1
+                else:
+                    self.caller_id = self._parse_caller_id(line)
                 
-                if self.monitoring:
-                    time.sleep(retry_delay)
+                if not self.announced and self.caller_id is not None:
+                    events.append(self._announce())
+        
+        self._emit(events)
+    
+    def notify_local_action(self, action):
+        """Record a successful /answer, /reject or /hangup"""
+        events = []
+        with self.lock:
+            if action == 'answer' and self.state == self.RINGING:
+                self.state = self.ACTIVE
+                self.answered_at = time.monotonic()
+                events.append(('answered', self.caller_id, {}))
+            elif action in ('reject', 'hangup') and self.state != self.IDLE:
+                events.append(self._finish('ended' if self.state == self.ACTIVE else 'rejected'))
+        self._emit(events)
     
-    def _handle_call(self, data):
-        """Parse and handle incoming call"""
-        caller_id = "Unknown"
+    def _announce(self):
+        self.announced = True
+        return ('incoming', self.caller_id or "Unknown", {})
+    
+    def _finish(self, outcome):
+        """Return to idle, producing the call's closing event"""
+        details = {'rings': self.rings}
+        if self.answered_at is not None:
+            details['duration'] = time.monotonic() - self.answered_at
+        event = (outcome, self.caller_id or "Unknown", details)
+        self.state = self.IDLE
+        self.answered_at = None
+        logger.info(f"Call {outcome}: {event[1]} {details}")
+        return event
+    
+    def _arm_timer(self, delay):
+        timer = threading.Timer(delay, self._on_timer, args=(self.call_seq,))
+        timer.daemon = True
+        timer.start()
+    
+    def _on_timer(self, call_seq):
+        """Announce without caller ID if +CLIP never came; detect calls that stopped ringing"""
+        events = []
+        check_clcc = False
+        with self.lock:
+            if self.state != self.RINGING or call_seq != self.call_seq:
+                return
+            if not self.announced:
+                events.append(self._announce())
+            if time.monotonic() - self.last_ring >= self.ring_timeout:
+                check_clcc = True
         
-        # Try to extract caller ID from +CLIP
-        if '+CLIP:' in data:
-            try:
-                # +CLIP: "+34612345678",145,"",0,"",0
-                clip_part = data.split('+CLIP:')[1].split('\r')[0]
-                caller_id = clip_part.split(',')[0].strip().strip('"')
-                logger.info(f"Parsed caller ID: {caller_id}")
-            except Exception as e:
-                logger.error(f"Error parsing caller ID: {e}")
+        if check_clcc:
+            status = self._query_call_status()
+            with self.lock:
+                if self.state == self.RINGING and call_seq == self.call_seq:
+                    if status == self.ACTIVE:
+                        self.state = self.ACTIVE
+                        self.answered_at = time.monotonic()
+                        events.append(('answered', self.caller_id or "Unknown", {}))
+                    elif status != self.RINGING:
+                        events.append(self._finish('missed'))
         
-        # Call the callback if set
-        if self.callback:
+        with self.lock:
+            if self.state == self.RINGING and call_seq == self.call_seq:
+                self._arm_timer(self.ring_timeout)
+        self._emit(events)
+    
+    def _query_call_status(self):
+        """Ask the modem (AT+CLCC) whether the incoming call still exists"""
+        try:
+            response = self._modem_call(self.modem.transact, 'AT+CLCC', timeout=self.ring_timeout)
+        except concurrent.futures.TimeoutError:
+            # Unknown: keep ringing, the next timer asks again
+            logger.warning("AT+CLCC timed out waiting for the modem")
+            return self.RINGING
+        for line in response.lines_with('+CLCC:'):
+            # +CLCC: <id>,<dir>,<stat>,<mode>,<mpty>[,<number>,<type>]
+            fields = line.split(':', 1)[1].split(',')
+            if len(fields) >= 3 and fields[1].strip() == '1':
+                stat = fields[2].strip()
+                if stat == '0':
+                    return self.ACTIVE
+                if stat in ('4', '5'):
+                    return self.RINGING
+        return self.IDLE
+    
+    def _parse_caller_id(self, data):
+        """Extract the number from a +CLIP line"""
+        try:
+            # +CLIP: "+34612345678",145,"",0,"",0
+            clip_part = data.split('+CLIP:')[1].split('\r')[0]
+            caller_id = clip_part.split(',')[0].strip().strip('"')
+            logger.info(f"Parsed caller ID: {caller_id}")
+            return caller_id or "Unknown"
+        except Exception as e:
+            logger.error(f"Error parsing caller ID: {e}")
+            return "Unknown"
+    
+    def _emit(self, events):
+        """Call the callback outside the state lock"""
+        if not self.callback:
+            return
+        for event, caller_id, details in events:
             try:
-                self.callback(caller_id)
+                self.callback(event, caller_id, details)
             except Exception as e:
                 logger.error(f"Error in call callback: {e}")
 
 
-class EC25Modem:
-    """EC25 Modem interface with improved connection handling"""
+class ATResponse:
+    """Structured result of a single AT transaction"""
     
-    def __init__(self, port=MODEM_PORT, baudrate=BAUDRATE, timeout=2):
-        self.port = port
-        self.baudrate = baudrate
+    FINAL_OK = ('OK',)
+    FINAL_ERROR = ('ERROR', '+CME ERROR:', '+CMS ERROR:', 'NO CARRIER',
+                   'BUSY', 'NO ANSWER', 'NO DIALTONE')
+    PROMPT = '> '
+    
+    def __init__(self, command, lines=None, final=None, elapsed=0.0, error=None):
+        self.command = command
+        self.lines = lines or []
+        self.final = final
+        self.elapsed = elapsed
+        self.error = error
+    
+    @classmethod
+    def is_final(cls, line):
+        """Check whether a line is a final result code"""
+        return line in cls.FINAL_OK or line.startswith(cls.FINAL_ERROR)
+    
+    @property
+    def ok(self):
+        return self.final in self.FINAL_OK
+    
+    @property
+    def prompt(self):
+        return self.final == self.PROMPT
+    
+    @property
+    def timed_out(self):
+        return self.final is None and self.error is None
+    
+    def lines_with(self, prefix):
+        """Return information lines starting with prefix"""
+        return [line for line in self.lines if line.startswith(prefix)]
+    
+    @property
+    def text(self):
+        """Response as text, in the same shape the modem sent it"""
+        if self.error:
+            return f"Error: {self.error}"
+        parts = list(self.lines)
+        if self.final and not self.prompt:
+            parts.append(self.final)
+        elif self.timed_out:
+            parts.append(f"Error: timeout after {self.elapsed:.1f}s")
+        return '\r\n'.join(parts)
+    
+    def __str__(self):
+        return self.text
+    
+    def __repr__(self):
+        return f"ATResponse({self.command!r}, final={self.final!r}, lines={len(self.lines)}, {self.elapsed * 1000:.0f}ms)"
+
+
+class ATTransaction:
+    """A command in flight on a SerialMux"""
+    
+    def __init__(self, command, expect_prompt=False):
+        self.command = command
+        self.expect_prompt = expect_prompt
+        match = re.match(r'AT([+&$#%^]\w+)', command)
+        self.info_prefix = match.group(1) if match else None
+        self.call_control = command.startswith(('ATA', 'ATD', 'ATH', 'AT+CHUP'))
+        self.lines = []
+        self.sink = None  # receives response lines instead of self.lines when streaming
+        self.final = None
+        self.error = None
+        self.expect_body = False
+        self.in_body = False
+        self.after_blank = False  # the previous body line was empty
+        self.done = threading.Event()
+    
+    def add(self, line):
+        if self.sink is not None:
+            self.sink(line)
+        else:
+            self.lines.append(line)
+    
+    def finish(self, final=None, error=None):
+        """Complete the transaction with a final code or an error"""
+        self.final = final
+        self.error = error
+        self.done.set()
+        if self.sink is not None:
+            self.sink(None, wait=False)
+    
+    def is_final(self, line):
+        """Final result codes; call progress codes only end call commands"""
+        if line.startswith(('NO CARRIER', 'BUSY', 'NO ANSWER', 'NO DIALTONE')):
+            return self.call_control
+        return ATResponse.is_final(line)
+    
+    def owns(self, line):
+        """Whether a non-final line is part of this command's response"""
+        if self.info_prefix and line.startswith(self.info_prefix):
+            return True
+        return not line.startswith(SerialMux.URC_PREFIXES)
+
+
+class SerialTrace:
+    """Compact binary capture of every byte written to and read from a port.
+    
+    The file starts with MAGIC and the wall-clock capture start; each record
+    is the monotonic offset from the start, a direction byte and the
+    length-prefixed bytes exactly as they crossed the port.
+    """
+    
+    MAGIC = b'EC25TRC1'
+    HEADER = struct.Struct('<d')
+    RECORD = struct.Struct('<dBI')
+    READ = 0
+    WRITE = 1
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'wb')
+        self.file.write(self.MAGIC + self.HEADER.pack(time.time()))
+        self.started = time.monotonic()
+        self.records = 0
+        self.bytes = 0
+    
+    def record(self, direction, data):
+        """Append one read or write"""
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(self.RECORD.pack(time.monotonic() - self.started, direction, len(data)))
+            self.file.write(data)
+            self.records += 1
+            self.bytes += len(data)
+    
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+        logger.info(f"Serial trace {self.path} closed ({self.records} records, {self.bytes} bytes)")
+    
+    @classmethod
+    def load(cls, path):
+        """Read a trace; returns (wall-clock start, [(offset, direction, data), ...])"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is not a serial trace")
+        
+        pos = len(cls.MAGIC)
+        (started,) = cls.HEADER.unpack_from(data, pos)
+        pos += cls.HEADER.size
+        records = []
+        # A capture cut short by a crash simply ends at the last whole header
+        while pos + cls.RECORD.size <= len(data):
+            offset, direction, length = cls.RECORD.unpack_from(data, pos)
+            pos += cls.RECORD.size
+            records.append((offset, direction, data[pos:pos + length]))
+            pos += length
+        return started, records
+
+
+class TraceReplayPort:
+    """Serial port stand-in that plays back the modem side of a trace.
+    
+    Each write advances to the next recorded write and releases the reads
+    that followed it, at their recorded delays divided by speed (0 replays
+    without delays). Reads before the first write start with the replay.
+    """
+    
+    def __init__(self, records, speed=1.0, timeout=READ_POLL_INTERVAL):
+        self.records = records
+        self.scale = 1.0 / speed if speed > 0 else 0.0
         self.timeout = timeout
+        self.is_open = True
+        self.position = 0
+        self.anchor = (time.monotonic(), 0.0)
+        self.scheduled = collections.deque()
+        self.buffer = bytearray()
+        self.cond = threading.Condition()
+        self.matched = 0
+        self.unmatched = 0
+        with self.cond:
+            self._schedule_reads()
+    
+    def _schedule_reads(self):
+        """Queue the recorded reads up to the next recorded write"""
+        started, offset = self.anchor
+        while self.position < len(self.records):
+            at, direction, data = self.records[self.position]
+            if direction != SerialTrace.READ:
+                break
+            self.scheduled.append((started + (at - offset) * self.scale, data))
+            self.position += 1
+        self.cond.notify_all()
+    
+    def _release(self):
+        now = time.monotonic()
+        while self.scheduled and self.scheduled[0][0] <= now:
+            self.buffer += self.scheduled.popleft()[1]
+    
+    @property
+    def done(self):
+        """Whether every recorded read has been delivered"""
+        with self.cond:
+            return self.position >= len(self.records) and not self.scheduled and not self.buffer
+    
+    @property
+    def in_waiting(self):
+        with self.cond:
+            self._release()
+            return len(self.buffer)
+    
+    def write(self, data):
+        with self.cond:
+            if self.position < len(self.records) and self.records[self.position][1] == SerialTrace.WRITE:
+                self.anchor = (time.monotonic(), self.records[self.position][0])
+                self.position += 1
+                self.matched += 1
+                self._schedule_reads()
+            else:
+                self.unmatched += 1
+        return len(data)
+    
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        with self.cond:
+            while self.is_open:
+                self._release()
+                if self.buffer:
+                    data = bytes(self.buffer[:size])
+                    del self.buffer[:size]
+                    return data
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake = self.scheduled[0][0] if self.scheduled else deadline
+                self.cond.wait(max(0.0, min(wake, deadline) - now))
+        return b''
+    
+    def close(self):
+        with self.cond:
+            self.is_open = False
+            self.cond.notify_all()
+
+
+class SerialMux:
+    """Single owner of a modem AT port.
+    
+    One reader thread splits the byte stream into lines, hands command
+    responses to the transaction in flight and queues unsolicited result
+    codes (URCs), which a dispatcher thread delivers to subscribers so
+    they are free to issue commands of their own.
+    """
+    
+    URC_PREFIXES = ('RING', '+CRING:', '+CLIP:', '+CMTI:', '+CDSI:', '+CREG:',
+                    '+CGREG:', '+CEREG:', '+QIND:', '+QUSIM:', '+CPIN:', 'NO CARRIER',
+                    'RDY', 'POWERED DOWN')
+    
+    def __init__(self, baudrate=BAUDRATE, on_failure=None):
+        self.baudrate = baudrate
+        self.on_failure = on_failure
+        self.port = None
         self.ser = None
+        self.lock = threading.RLock()  # held for a whole transaction
+        self.pending = None
+        self.subscribers = []
+        self.urc_queue = queue.Queue()
+        self.reader = None
+        self.dispatcher = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.trace = None  # SerialTrace recording all traffic, when capturing
     
-    def find_working_port(self):
-        """Try to find which ttyUSB port responds to AT commands"""
-        ports_to_try = ['/dev/ttyUSB2', '/dev/ttyUSB3', '/dev/ttyUSB1', '/dev/ttyUSB0']
-        
-        for port in ports_to_try:
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+    
+    def open(self, port):
+        """Open the port and start the reader thread"""
+        self.close()
+        self.attach(serial.Serial(port, self.baudrate, timeout=READ_POLL_INTERVAL), port)
+    
+    def attach(self, ser, port):
+        """Take over an already open serial-like object (a real port or a TraceReplayPort)"""
+        self.close()
+        self.port = port
+        self.ser = ser
+        self.reader = threading.Thread(target=self._reader_loop, args=(self.ser,),
+                                       name=f"mux-reader-{os.path.basename(port)}", daemon=True)
+        self.reader.start()
+        if self.dispatcher is None or not self.dispatcher.is_alive():
+            self.dispatcher = threading.Thread(target=self._dispatch_loop, name="mux-dispatcher", daemon=True)
+            self.dispatcher.start()
+    
+    def close(self):
+        """Close the port; the reader thread exits on its own"""
+        ser, self.ser = self.ser, None
+        if ser is not None:
             try:
-                test_ser = serial.Serial(port, self.baudrate, timeout=1)
-                time.sleep(0.3)
-                test_ser.write(b'AT\r\n')
-                time.sleep(0.5)
-                response = test_ser.read(test_ser.in_waiting).decode('utf-8', errors='ignore')
-                test_ser.close()
-                
-                if 'OK' in response:
-                    logger.info(f"Found working AT port for modem: {port}")
-                    return port
+                ser.close()
             except Exception as e:
-                logger.debug(f"Port {port} failed: {e}")
-                continue
-        
-        return None
+                logger.debug(f"Error closing port {self.port}: {e}")
+        self._fail_pending("port closed")
+        reader = self.reader
+        if reader is not None and reader is not threading.current_thread():
+            reader.join(timeout=1)
     
-    def kill_blocking_processes(self):
-        """Kill processes that might be blocking the port"""
-        try:
-            subprocess.run(['pkill', 'screen'], stderr=subprocess.DEVNULL)
-            time.sleep(0.3)
-        except:
-            pass
+    def subscribe(self, prefixes, callback):
+        """Deliver URC lines starting with any of prefixes to callback(line)"""
+        self.subscribers.append((tuple(prefixes), callback))
     
-    def connect(self):
-        """Connect to modem with auto port detection"""
-        try:
-            self.kill_blocking_processes()
+    def unsubscribe(self, callback):
+        self.subscribers = [(p, cb) for p, cb in self.subscribers if cb != callback]
+    
+    def transact(self, command, timeout, expect_prompt=False):
+        """Write a command and wait for its final result code"""
+        return self._execute(command, (command + '\r\n').encode(), timeout, expect_prompt)
+    
+    def stream(self, command, timeout):
+        """Write a command and yield its response lines as they arrive.
+        
+        The port stays reserved until the generator is exhausted or closed.
+        timeout bounds the silence between lines rather than the whole
+        response, so long listings are not cut short. The generator's
+        return value is the ATResponse (without lines).
+        """
+        with self.lock:
+            if not self.is_open:
+                return ATResponse(command, error="Modem not connected")
             
-            working_port = self.find_working_port()
-            if working_port:
-                self.port = working_port
+            lines = queue.Queue(STREAM_BUFFER_LINES)
+            tx = ATTransaction(command)
             
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
-            time.sleep(0.5)
+            def sink(line, wait=True):
+                # A full buffer stalls the reader, so the port applies backpressure
+                while self.pending is tx:
+                    try:
+                        lines.put(line, timeout=READ_POLL_INTERVAL if wait else None, block=wait)
+                        return
+                    except queue.Full:
+                        if not wait:
+                            return
             
-            self._send_command('AT', wait_time=0.5)
-            self._send_command('AT+CMGF=1', wait_time=0.5)
-            self._send_command('AT+CSCS="GSM"', wait_time=0.5)
+            tx.sink = sink
+            self.pending = tx
+            started = time.monotonic()
+            try:
+                self._write((command + '\r\n').encode())
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        line = lines.get(timeout=READ_POLL_INTERVAL)
+                    except queue.Empty:
+                        # Lines are queued before the final code, so empty + done means finished
+                        if tx.done.is_set() or time.monotonic() >= deadline:
+                            break
+                        continue
+                    if line is None:
+                        break  # queued by finish()
+                    deadline = time.monotonic() + timeout
+                    yield line
+            except (serial.SerialException, OSError) as e:
+                tx.error = str(e)
+                self._handle_failure(e)
+            finally:
+                self.pending = None
             
-            logger.debug(f"Connected to modem on {self.port}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to connect to modem: {e}")
-            return False
+            return ATResponse(command, [], tx.final, time.monotonic() - started, tx.error)
     
-    def disconnect(self):
-        """Disconnect from modem"""
-        if self.ser and self.ser.is_open:
+    def send_payload(self, label, payload, timeout):
+        """Write raw bytes (e.g. an SMS body after '> ') and wait for the result"""
+        return self._execute(label, payload, timeout)
+    
+    def write_raw(self, data):
+        """Write bytes without waiting for a response"""
+        with self.lock:
+            if self.is_open:
+                self._write(data)
+    
+    def _write(self, data):
+        # Traced before writing so a fast reply can never precede it in the trace
+        if self.trace is not None:
+            self.trace.record(SerialTrace.WRITE, data)
+        self.ser.write(data)
+        self.bytes_out += len(data)
+    
+    def _execute(self, command, data, timeout, expect_prompt=False):
+        with self.lock:
+            if not self.is_open:
+                return ATResponse(command, error="Modem not connected")
+            
+            tx = ATTransaction(command, expect_prompt)
+            self.pending = tx
+            started = time.monotonic()
             try:
-                self.ser.close()
-                logger.debug("Disconnected from modem")
-            except Exception as e:
-                logger.error(f"Error disconnecting: {e}")
+                self._write(data)
+                tx.done.wait(timeout)
+            except (serial.SerialException, OSError) as e:
+                tx.error = str(e)
+                self._handle_failure(e)
+            finally:
+                self.pending = None
+            
+            return ATResponse(command, tx.lines, tx.final, time.monotonic() - started, tx.error)
+    
+    def _fail_pending(self, error):
+        tx = self.pending
+        if tx is not None and not tx.done.is_set():
+            tx.finish(error=error)
+    
+    def _handle_failure(self, error):
+        logger.error(f"Serial failure on {self.port}: {error}")
+        self.close()
+        if self.on_failure:
+            self.on_failure(error)
+    
+    def _reader_loop(self, ser):
+        """Read bytes as they arrive and split them into lines"""
+        pending = ''
+        while self.ser is ser:
+            try:
+                chunk = ser.read(ser.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError) as e:
+                if self.ser is ser:
+                    self._handle_failure(e)
+                return
+            if not chunk:
+                continue
+            self.bytes_in += len(chunk)
+            if self.trace is not None:
+                self.trace.record(SerialTrace.READ, chunk)
+            pending += chunk.decode('utf-8', errors='ignore')
+            
+            # A read may end between the '\r' and '\n' of one line ending; the '\r'
+            # waits for the next chunk so it is not taken for an empty line
+            held = '\r' if pending.endswith('\r') else ''
+            text = pending[:len(pending) - len(held)].replace('\r\n', '\n').replace('\r', '\n')
+            *complete, pending = text.split('\n')
+            pending += held
+            for line in complete:
+                if line or self._in_body():
+                    self._handle_line(line)
+            
+            tx = self.pending
+            if tx is not None and tx.expect_prompt and pending.endswith(ATResponse.PROMPT):
+                pending = ''
+                tx.finish(ATResponse.PROMPT)
     
-    def _send_command(self, command, wait_time=1):
-        """Send AT command and return response"""
-        if not self.ser or not self.ser.is_open:
-            logger.error("Serial port not open")
-            return "Error: Modem not connected"
+    def _in_body(self):
+        """Whether the command in flight is inside an SMS body (blank lines matter there)"""
+        tx = self.pending
+        return tx is not None and tx.in_body and not tx.done.is_set()
+    
+    def _handle_line(self, line):
+        """Route a line to the command in flight or to the URC dispatcher"""
+        tx = self.pending
+        if tx is not None and not tx.done.is_set():
+            if line == tx.command:
+                return  # echo, before ATE0 takes effect
+            # The first SMS body line following +CMGL/+CMGR may legitimately read "OK"
+            if tx.expect_body:
+                tx.add(line)
+                tx.expect_body = tx.after_blank = False
+                return
+            # Further body lines run up to the next header or the final code. Inside
+            # a body "OK" or "ERROR..." is text: the final code only counts after the
+            # blank line the modem sends to end the listing. URCs are held back by
+            # the modem while a listing is in progress
+            if tx.in_body:
+                if tx.after_blank and tx.is_final(line):
+                    tx.finish(line)
+                    return
+                tx.add(line)
+                tx.expect_body = line.startswith(('+CMGL:', '+CMGR:'))
+                tx.after_blank = not line
+                return
+            if tx.is_final(line):
+                tx.finish(line)
+                return
+            if tx.owns(line):
+                tx.add(line)
+                if line.startswith(('+CMGL:', '+CMGR:')):
+                    tx.expect_body = tx.in_body = True
+                return
         
-        try:
-            self.ser.reset_input_buffer()
-            self.ser.write((command + '\r\n').encode())
-            time.sleep(wait_time)
-            response = self.ser.read(self.ser.in_waiting).decode('utf-8', errors='ignore')
-            logger.debug(f"Command: {command}, Response: {repr(response[:100])}")
-            return response
-        except Exception as e:
-            logger.error(f"Error sending command '{command}': {e}")
-            return f"Error: {str(e)}"
+        self.urc_queue.put(line)
+    
+    def _dispatch_loop(self):
+        """Deliver queued URCs to subscribers"""
+        while True:
+            line = self.urc_queue.get()
+            delivered = False
+            for prefixes, callback in list(self.subscribers):
+                if line.startswith(prefixes):
+                    delivered = True
+                    try:
+                        callback(line)
+                    except Exception as e:
+                        logger.error(f"Error in URC handler for {line!r}: {e}", exc_info=True)
+            if not delivered:
+                logger.debug(f"Unhandled URC: {repr(line)}")
+
+
+class PortDiscovery:
+    """Locate the EC25 AT port via sysfs, with a cache keyed by USB device path"""
+    
+    def __init__(self, baudrate=BAUDRATE, cache_file=PORT_CACHE_FILE, sysfs_root=USB_SERIAL_SYSFS):
+        self.baudrate = baudrate
+        self.cache_file = cache_file
+        self.sysfs_root = sysfs_root
+        self.cache = self.load_cache()
+        self.lock = threading.Lock()  # modems of a pool share the cache
+    
+    def load_cache(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading port cache: {e}")
+        return {}
+    
+    def save_cache(self):
+        try:
+            with self.lock, open(self.cache_file, 'w') as f:
+                json.dump(self.cache, f)
+        except Exception as e:
+            logger.error(f"Error saving port cache: {e}")
+    
+    def _read_attr(self, directory, name):
+        try:
+            with open(os.path.join(directory, name), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+    
+    def scan_sysfs(self):
+        """Map USB device path (e.g. '1-1.2') to its EC25 serial interfaces"""
+        devices = {}
+        try:
+            entries = os.listdir(self.sysfs_root)
+        except OSError:
+            return devices
+        
+        for tty in entries:
+            # .../1-1.2/1-1.2:1.2/ttyUSB2 -> interface dir, then USB device dir
+            interface_dir = os.path.dirname(os.path.realpath(os.path.join(self.sysfs_root, tty)))
+            usb_dir = os.path.dirname(interface_dir)
+            usb_id = (self._read_attr(usb_dir, 'idVendor'), self._read_attr(usb_dir, 'idProduct'))
+            interface = self._read_attr(interface_dir, 'bInterfaceNumber')
+            if usb_id not in EC25_USB_IDS or interface is None:
+                continue
+            
+            device = devices.setdefault(os.path.basename(usb_dir), {
+                'devnum': self._read_attr(usb_dir, 'devnum'),
+                'interfaces': {},
+            })
+            device['interfaces'][int(interface, 16)] = f"/dev/{tty}"
+        return devices
+    
+    def devices(self):
+        """USB device paths of all EC25s present, in a stable order"""
+        return sorted(self.scan_sysfs())
+    
+    def find_port(self, usb_path=None):
+        """Return the AT port of an EC25, probing only when the cache is stale"""
+        devices = self.scan_sysfs()
+        if not devices and usb_path is None:
+            logger.warning("No EC25 found in sysfs, probing all ttyUSB ports")
+            return self.probe_ports(self._fallback_candidates())
+        
+        if usb_path is None:
+            usb_path = sorted(devices)[0]
+        device = devices.get(usb_path)
+        if device is None:
+            logger.warning(f"EC25 at USB path {usb_path} not present")
+            return None
+        
+        cached = self.cache.get(usb_path)
+        # devnum changes whenever the modem re-enumerates (reset, replug)
+        if (cached and cached.get('devnum') == device['devnum']
+                and cached.get('port') in device['interfaces'].values()):
+            logger.info(f"Using cached AT port {cached['port']} for EC25 at {usb_path}")
+            return cached['port']
+        
+        candidates = [device['interfaces'][i] for i in EC25_AT_INTERFACES if i in device['interfaces']]
+        port = self.probe_ports(candidates)
+        if port:
+            with self.lock:
+                self.cache[usb_path] = {'port': port, 'devnum': device['devnum']}
+            self.save_cache()
+        return port
+    
+    def invalidate(self, usb_path=None):
+        """Forget cached ports (all, or for one device)"""
+        with self.lock:
+            if usb_path is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(usb_path, None)
+        self.save_cache()
+    
+    def _fallback_candidates(self):
+        ports = sorted(glob.glob('/dev/ttyUSB*'))
+        preferred = [p for p in ('/dev/ttyUSB2', '/dev/ttyUSB3') if p in ports]
+        return preferred + [p for p in ports if p not in preferred]
+    
+    def probe(self, port, timeout=1.0):
+        """Check whether a port answers AT with OK"""
+        try:
+            with serial.Serial(port, self.baudrate, timeout=READ_POLL_INTERVAL) as test_ser:
+                test_ser.reset_input_buffer()
+                test_ser.write(b'AT\r\n')
+                response = b''
+                deadline = time.monotonic() + timeout
+                while b'OK' not in response and time.monotonic() < deadline:
+                    response += test_ser.read(test_ser.in_waiting or 1)
+                return b'OK' in response
+        except Exception as e:
+            logger.debug(f"Port {port} failed: {e}")
+            return False
+    
+    def probe_ports(self, ports):
+        """Probe candidates concurrently; return the first responsive one in order"""
+        if not ports:
+            return None
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            results = list(executor.map(self.probe, ports))
+        
+        for port, ok in zip(ports, results):
+            if ok:
+                logger.info(f"Found working AT port for modem: {port}")
+                return port
+        logger.warning(f"No AT response on any of {ports}")
+        return None
+
+
+class SMSParser:
+    """Incremental parser for text-mode +CMGL / +CMGR responses.
+    
+    Lines are fed as they arrive and each message is yielded as soon as the
+    next header (or the end of the response) shows its body is complete, so
+    only one message is held at a time. Header fields are split on commas
+    outside quotes; every line up to the next header belongs to the body.
+    """
+    
+    def __init__(self, storage, index=None, pdu=False, modem=None, id_prefix=''):
+        self.storage = storage
+        self.index = index  # for +CMGR, which does not repeat the index
+        self.pdu = pdu
+        self.modem = modem  # name of the modem the messages come from
+        self.id_prefix = id_prefix
+        self.header = None
+        self.body = []
+    
+    def parse(self, lines):
+        """Yield messages from an iterator of lines; returns the iterator's return value"""
+        while True:
+            try:
+                line = next(lines)
+            except StopIteration as stop:
+                yield from self.flush()
+                return stop.value
+            yield from self.feed(line)
+    
+    def feed(self, line):
+        """Consume one line, yielding the previous message when a new header starts"""
+        if line.startswith(('+CMGL:', '+CMGR:')):
+            yield from self.flush()
+            self.header = line
+        elif self.header is not None:
+            self.body.append(line)
+    
+    def flush(self):
+        """Yield the message in progress, if any"""
+        if self.header is None:
+            return
+        header, body = self.header, self.body
+        self.header, self.body = None, []
+        
+        try:
+            msg = self.build(header, body)
+        except (IndexError, ValueError, KeyError, csv.Error) as e:
+            logger.error(f"Error parsing message header {header!r}: {e}")
+            return
+        yield msg
+    
+    def build(self, header, body):
+        prefix, _, rest = header.partition(':')
+        fields = next(csv.reader([rest.strip()], skipinitialspace=True))
+        if prefix == '+CMGL':
+            # text: +CMGL: <index>,<stat>,<oa>,[<alpha>],<scts>
+            # PDU:  +CMGL: <index>,<stat>,[<alpha>],<length>
+            index, fields = fields[0], fields[1:]
+        else:
+            # text: +CMGR: <stat>,<oa>,[<alpha>],<scts>
+            # PDU:  +CMGR: <stat>,[<alpha>],<length>
+            index = str(self.index)
+        
+        # The response ends with a blank line before the final code
+        while body and not body[-1].strip():
+            body.pop()
+        
+        concat = None
+        if self.pdu:
+            status = SMSPDU.STATUS[int(fields[0])]
+            decoded = SMSPDU.decode(''.join(line.strip() for line in body))
+            sender, timestamp, text = decoded['sender'], decoded['timestamp'], decoded['text']
+            concat = decoded['concat']
+        else:
+            status, sender = fields[0], fields[1]
+            timestamp = fields[3] if len(fields) > 3 else ""
+            text = '\n'.join(body).strip()
+        
+        return {
+            'storage': self.storage,
+            'index': index,
+            'status': status,
+            'sender': sender,
+            'timestamp': timestamp,
+            'text': text,
+            'id': f"{self.id_prefix}{self.storage}_{index}_{sender}_{timestamp}",
+            'legacy_ids': self.legacy_ids(f"{self.storage}_{index}_{sender}_", timestamp),
+            'concat': concat,  # (reference, total, sequence) for a part of a long SMS
+            'modem': self.modem,
+        }
+
+
+    def legacy_ids(self, base, timestamp):
+        """IDs the message may have been seen under by earlier versions"""
+        # IDs used to carry only the date part of the timestamp
+        ids = [f"{self.id_prefix}{base}{timestamp.split(',')[0]}"]
+        if self.id_prefix:
+            # The first modem of a pool used to have no prefix
+            ids += [f"{base}{timestamp}", f"{base}{timestamp.split(',')[0]}"]
+        return ids
+
+
+class SMSPDU:
+    """Decoder for the SMS-DELIVER / SMS-SUBMIT PDUs listed in PDU mode (3GPP TS 23.040).
+    
+    Handles the GSM 7-bit default alphabet (with its extension table),
+    UCS-2 and 8-bit data, and the concatenation elements of the user
+    data header. Senders and timestamps are rendered as text mode shows
+    them, so message IDs do not depend on the mode.
+    """
+    
+    STATUS = {0: 'REC UNREAD', 1: 'REC READ', 2: 'STO UNSENT', 3: 'STO SENT'}
+    GSM7_BASIC = ("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+                  "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+    GSM7_EXTENSION = {0x0A: '\f', 0x14: '^', 0x28: '{', 0x29: '}', 0x2F: '\\', 0x3C: '[',
+                      0x3D: '~', 0x3E: ']', 0x40: '|', 0x65: '€'}
+    GSM7_CODES = {char: code for code, char in enumerate(GSM7_BASIC) if code != 0x1B}
+    GSM7_ESCAPES = {char: code for code, char in GSM7_EXTENSION.items()}
+    VALIDITY_24H = 0xA7  # TP-VP, relative format
+    
+    @classmethod
+    def decode(cls, pdu):
+        """Decode a hex PDU (with its SMSC prefix) into sender, timestamp, text, encoding and concat"""
+        data = bytes.fromhex(pdu)
+        pos = 1 + data[0]  # skip the SMSC address
+        first = data[pos]
+        pos += 1
+        mti = first & 0x03
+        if mti == 1:
+            pos += 1  # TP-MR of a stored outgoing message
+        elif mti != 0:
+            raise ValueError(f"unsupported PDU type {mti}")
+        
+        address, pos = cls.address(data, pos)
+        dcs = data[pos + 1]  # after TP-PID
+        pos += 2
+        timestamp = ""
+        if mti == 0:
+            timestamp = cls.timestamp(data[pos:pos + 7])
+            pos += 7
+        else:
+            # TP-VP: absent, relative (1 octet) or absolute/enhanced (7 octets)
+            pos += {0: 0, 2: 1}.get((first >> 3) & 0x03, 7)
+        
+        length = data[pos]
+        user_data = data[pos + 1:]
+        header = b''
+        if first & 0x40:  # TP-UDHI
+            header = user_data[1:1 + user_data[0]]
+        skip = len(header) + 1 if header else 0
+        
+        encoding = cls.encoding(dcs)
+        if encoding == 'gsm7':
+            # Length counts septets, the header included and padded to a septet boundary
+            septets = cls.unpack_septets(user_data, length)
+            text = cls.gsm7_text(septets[(skip * 8 + 6) // 7:])
+        elif encoding == 'ucs2':
+            text = user_data[skip:length].decode('utf-16-be', errors='replace')
+        else:
+            octets = user_data[skip:length]
+            text = octets.decode('latin-1') if all(32 <= b < 127 or b in (9, 10, 13) for b in octets) \
+                else f"[8-bit data] {octets.hex()}"
+        
+        return {
+            'sender': address,
+            'timestamp': timestamp,
+            'text': text,
+            'encoding': encoding,
+            'concat': cls.concat(header),
+        }
+    
+    @staticmethod
+    def encoding(dcs):
+        """Alphabet of a TP-DCS value: gsm7, 8bit or ucs2"""
+        group = dcs >> 4
+        if group < 0x8:
+            # General data coding (bit 5 = compressed, not supported by the EC25 either)
+            alphabet = (dcs >> 2) & 0x03
+        elif group == 0xF:
+            alphabet = 1 if dcs & 0x04 else 0
+        elif group == 0xE:
+            alphabet = 2
+        else:
+            alphabet = 0  # message waiting indications
+        return ('gsm7', '8bit', 'ucs2', 'gsm7')[alphabet]
+    
+    @staticmethod
+    def unpack_septets(data, count):
+        """Unpack count 7-bit values packed LSB first"""
+        septets = []
+        acc = 0
+        bits = 0
+        for byte in data:
+            acc |= byte << bits
+            bits += 8
+            while bits >= 7 and len(septets) < count:
+                septets.append(acc & 0x7F)
+                acc >>= 7
+                bits -= 7
+            if len(septets) >= count:
+                break
+        return septets
+    
+    @classmethod
+    def gsm7_text(cls, septets):
+        chars = []
+        escape = False
+        for septet in septets:
+            if escape:
+                chars.append(cls.GSM7_EXTENSION.get(septet, cls.GSM7_BASIC[septet]))
+                escape = False
+            elif septet == 0x1B:
+                escape = True
+            else:
+                chars.append(cls.GSM7_BASIC[septet])
+        return ''.join(chars)
+    
+    @classmethod
+    def address(cls, data, pos):
+        """Decode TP-OA/TP-DA; returns (address, position after it)"""
+        digits, toa = data[pos], data[pos + 1]
+        raw = data[pos + 2:pos + 2 + (digits + 1) // 2]
+        end = pos + 2 + len(raw)
+        if toa & 0x70 == 0x50:
+            # Alphanumeric sender ("Bank"), GSM 7-bit packed
+            return cls.gsm7_text(cls.unpack_septets(raw, digits * 4 // 7)), end
+        number = ''.join(f"{b & 0x0F:x}{b >> 4:x}" for b in raw)[:digits]
+        number = number.translate(str.maketrans('abc', '*#p'))
+        return ('+' + number if toa & 0x70 == 0x10 else number), end
+    
+    @staticmethod
+    def timestamp(raw):
+        """TP-SCTS as text mode shows it: yy/MM/dd,hh:mm:ss+zz (zone in quarter hours)"""
+        values = [(b & 0x0F) * 10 + (b >> 4) for b in raw[:6]]
+        zone = raw[6]
+        quarters = (zone & 0x07) * 10 + (zone >> 4)
+        sign = '-' if zone & 0x08 else '+'
+        return "{:02d}/{:02d}/{:02d},{:02d}:{:02d}:{:02d}".format(*values) + f"{sign}{quarters:02d}"
+    
+    @staticmethod
+    def concat(header):
+        """(reference, total, sequence) from a user data header, if it has a concatenation element"""
+        pos = 0
+        while pos + 2 <= len(header):
+            iei, length = header[pos], header[pos + 1]
+            value = header[pos + 2:pos + 2 + length]
+            pos += 2 + length
+            if iei == 0x00 and length == 3:
+                reference, total, sequence = value
+            elif iei == 0x08 and length == 4:
+                reference, total, sequence = (value[0] << 8) | value[1], value[2], value[3]
+            else:
+                continue
+            if total > 1 and 1 <= sequence <= total:
+                return reference, total, sequence
+        return None
+    
+    @classmethod
+    def gsm7_septets(cls, text):
+        """Septets of text in the GSM 7-bit alphabet, or None if it needs UCS-2"""
+        septets = []
+        for char in text:
+            if char in cls.GSM7_CODES:
+                septets.append(cls.GSM7_CODES[char])
+            elif char in cls.GSM7_ESCAPES:
+                septets += (0x1B, cls.GSM7_ESCAPES[char])
+            else:
+                return None
+        return septets
+    
+    @staticmethod
+    def pack_septets(septets, fill_bits=0):
+        """Pack 7-bit values LSB first, after fill_bits of padding"""
+        packed = bytearray()
+        acc = 0
+        bits = fill_bits
+        for septet in septets:
+            acc |= septet << bits
+            bits += 7
+            while bits >= 8:
+                packed.append(acc & 0xFF)
+                acc >>= 8
+                bits -= 8
+        if bits:
+            packed.append(acc & 0xFF)
+        return bytes(packed)
+    
+    @classmethod
+    def split(cls, text):
+        """Parts of text that each fit one SMS of a concatenated message (one part if it fits whole)"""
+        if cls.gsm7_septets(text) is not None:
+            single, limit = 160, 153
+            width = lambda char: 2 if char in cls.GSM7_ESCAPES else 1
+        else:
+            # UTF-16 code units, so surrogate pairs (emoji) are never split
+            single, limit = 70, 67
+            width = lambda char: 2 if ord(char) > 0xFFFF else 1
+        if sum(map(width, text)) <= single:
+            return [text]
+        
+        parts = []
+        current, size = [], 0
+        for char in text:
+            if size + width(char) > limit:
+                parts.append(''.join(current))
+                current, size = [], 0
+            current.append(char)
+            size += width(char)
+        parts.append(''.join(current))
+        return parts
+    
+    @staticmethod
+    def encode_address(number):
+        """TP-DA of a phone number"""
+        digits = number.lstrip('+')
+        padded = digits + 'F' * (len(digits) % 2)
+        swapped = ''.join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+        toa = 0x91 if number.startswith('+') else 0x81
+        return bytes([len(digits), toa]) + bytes.fromhex(swapped)
+    
+    @classmethod
+    def encode_submit(cls, number, text, reference=0):
+        """SMS-SUBMIT PDUs for text, concatenated when it needs several; returns [(hex, TPDU length)]"""
+        parts = cls.split(text)
+        pdus = []
+        for sequence, part in enumerate(parts, 1):
+            header = bytes([5, 0x00, 3, reference & 0xFF, len(parts), sequence]) if len(parts) > 1 else b''
+            septets = cls.gsm7_septets(part)
+            if septets is not None:
+                dcs = 0x00
+                # Septets start on a boundary after the header
+                fill = (7 - len(header) * 8 % 7) % 7
+                length = len(septets) + (len(header) * 8 + fill) // 7
+                user_data = header + cls.pack_septets(septets, fill)
+            else:
+                dcs = 0x08
+                user_data = header + part.encode('utf-16-be')
+                length = len(user_data)
+            first = 0x01 | 0x10 | (0x40 if header else 0)  # SMS-SUBMIT, relative TP-VP, TP-UDHI
+            tpdu = (bytes([first, 0x00]) + cls.encode_address(number)
+                    + bytes([0x00, dcs, cls.VALIDITY_24H, length]) + user_data)
+            # "00": use the SMSC stored on the SIM
+            pdus.append(('00' + tpdu.hex().upper(), len(tpdu)))
+        return pdus
+
+
+class ConcatBuffer:
+    """Hold the parts of long SMS until all have arrived, then merge them.
+    
+    Groups that stay incomplete for longer than timeout are forwarded with
+    the parts that did arrive. The merged message keeps the first part's
+    fields, lists every part under 'parts' and has an ID of its own.
+    """
+    
+    def __init__(self, timeout=CONCAT_TIMEOUT):
+        self.timeout = timeout
+        self.groups = {}  # (modem, storage, sender, reference, total) -> (first seen, {sequence: part})
+    
+    def add(self, msg):
+        """Return the message once complete (itself if not a part), else None"""
+        if not msg.get('concat'):
+            return msg
+        reference, total, sequence = msg['concat']
+        key = (msg.get('modem'), msg['storage'], msg['sender'], reference, total)
+        _, parts = self.groups.setdefault(key, (time.monotonic(), {}))
+        parts[sequence] = msg
+        if len(parts) < total:
+            return None
+        del self.groups[key]
+        return self.merge(parts, reference, total)
+    
+    def expired(self):
+        """Pop and merge the groups that timed out waiting for parts"""
+        now = time.monotonic()
+        keys = [key for key, (since, _) in self.groups.items() if now - since >= self.timeout]
+        return [self.merge(self.groups.pop(key)[1], key[3], key[4]) for key in keys]
+    
+    @property
+    def pending(self):
+        return sum(len(parts) for _, parts in self.groups.values())
+    
+    @staticmethod
+    def merge(parts, reference, total):
+        ordered = [parts[sequence] for sequence in sorted(parts)]
+        first = ordered[0]
+        missing = [sequence for sequence in range(1, total + 1) if sequence not in parts]
+        text = ''.join(parts[sequence]['text'] if sequence in parts else ' […] '
+                       for sequence in range(1, total + 1))
+        return dict(
+            first,
+            index=','.join(part['index'] for part in ordered),
+            text=text,
+            id=f"{first['id']}+{reference}/{total}",
+            legacy_ids=[f"{legacy_id}+{reference}/{total}" for legacy_id in first['legacy_ids']],
+            concat=None,
+            parts=ordered,
+            missing=missing,
+        )
+
+
+class EC25Modem:
+    """EC25 Modem interface with a persistent, self-healing session"""
+    
+    def __init__(self, port=MODEM_PORT, baudrate=BAUDRATE, timeout=2,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, pdu_mode=SMS_PDU_MODE,
+                 usb_path=None, name=None, discovery=None):
+        self.port = port
+        self.usb_path = usb_path  # None: the first EC25 found
+        self.name = name or usb_path or 'ec25'
+        self.id_prefix = ''  # set by ModemPool when pooling modems
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.mux = SerialMux(baudrate, on_failure=self._on_serial_failure)
+        self.discovery = discovery or PortDiscovery(baudrate)
+        self.session_lock = threading.RLock()
+        self.pdu_mode = pdu_mode
+        self.init_commands = ['ATE0', 'AT+CMGF=0' if pdu_mode else 'AT+CMGF=1', 'AT+CSCS="GSM"']
+        self.initialized = False
+        self.needs_probe = True
+        self.last_ok = 0.0
+        self.last_rtt = None
+        self.reconnects = 0
+    
+    def find_working_port(self):
+        """Find the AT port (cached sysfs lookup, parallel probing if stale)"""
+        return self.discovery.find_port(self.usb_path)
+    
+    def kill_blocking_processes(self):
+        """Kill processes that might be blocking the port"""
+        try:
+            subprocess.run(['pkill', 'screen'], stderr=subprocess.DEVNULL)
+            time.sleep(0.3)
+        except:
+            pass
+    
+    def is_connected(self):
+        """Check whether the session is open and initialized"""
+        return self.initialized and self.mux.is_open
+    
+    def connect(self):
+        """Ensure a live modem session, reusing the open port when healthy"""
+        with self.session_lock:
+            if self.is_connected():
+                if time.monotonic() - self.last_ok < self.health_check_interval:
+                    return True
+                if self.health_check():
+                    return True
+                logger.warning("Modem health check failed, reopening session")
+                self._mark_failed()
+            
+            return self._open_session()
+    
+    def _open_session(self):
+        """Open the port and initialize the modem (probing only after a failure)"""
+        try:
+            self._close()
+            
+            if self.needs_probe:
+                self.kill_blocking_processes()
+                working_port = self.find_working_port()
+                if working_port:
+                    self.port = working_port
+            
+            self.mux.open(self.port)
+            
+            # The port may need a moment after open; retry AT until it answers
+            for _ in range(3):
+                if self.transact('AT', timeout=1).ok:
+                    break
+            else:
+                self.discovery.invalidate(self.usb_path)
+                raise serial.SerialException(f"No AT response on {self.port}")
+            
+            for command in self.init_commands:
+                response = self.transact(command)
+                if not response.ok:
+                    raise serial.SerialException(f"{command} failed on {self.port}: {response.text!r}")
+            
+            self.initialized = True
+            self.needs_probe = False
+            self.last_ok = time.monotonic()
+            self.reconnects += 1
+            metrics.inc('ec25_modem_reconnects_total', modem=self.name)
+            logger.info(f"Modem {self.name} session opened on {self.port} (session #{self.reconnects})")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect to modem {self.name}: {e}")
+            self._mark_failed()
+            return False
+    
+    def add_init_command(self, command):
+        """Register a command to run on every session open (and now, if open)"""
+        with self.session_lock:
+            if command in self.init_commands:
+                return
+            self.init_commands.append(command)
+            if self.is_connected():
+                self.transact(command)
+    
+    def subscribe(self, prefixes, callback):
+        """Subscribe callback(line) to unsolicited result codes"""
+        self.mux.subscribe(prefixes, callback)
+    
+    def unsubscribe(self, callback):
+        self.mux.unsubscribe(callback)
+    
+    def health_check(self):
+        """Cheap liveness probe for an idle session"""
+        return self.transact('AT', timeout=1).ok
+    
+    def start_capture(self, path):
+        """Record all traffic of the session, CallMonitor's included, to a SerialTrace"""
+        self.stop_capture()
+        self.mux.trace = SerialTrace(path)
+        logger.info(f"Capturing serial traffic to {path}")
+    
+    def stop_capture(self):
+        trace, self.mux.trace = self.mux.trace, None
+        if trace is not None:
+            trace.close()
+    
+    def _on_serial_failure(self, error):
+        """Called by the mux when the port fails underneath us"""
+        self.initialized = False
+        self.needs_probe = True
+    
+    def _mark_failed(self):
+        """Drop the session and force port re-probing on next connect"""
+        self._close()
+        self.needs_probe = True
+    
+    def _close(self):
+        """Close the serial port without touching probe state"""
+        self.initialized = False
+        self.mux.close()
+    
+    def disconnect(self):
+        """Close the modem session (used on shutdown)"""
+        with self.session_lock:
+            if self.mux.is_open:
+                logger.info(f"Closing modem session on {self.port}")
+            self._close()
+    
+    def _command_timeout(self, command):
+        """Timeout ceiling for a command, by longest matching prefix"""
+        matches = [prefix for prefix in COMMAND_TIMEOUTS if command.startswith(prefix)]
+        if matches:
+            return COMMAND_TIMEOUTS[max(matches, key=len)]
+        return DEFAULT_COMMAND_TIMEOUT
+    
+    def transact(self, command, timeout=None, expect_prompt=False):
+        """Send AT command and wait for its final result code"""
+        if timeout is None:
+            timeout = self._command_timeout(command)
+        
+        response = self.mux.transact(command, timeout, expect_prompt)
+        self._record(response)
+        return response
+    
+    def _record(self, response):
+        """Track liveness, round-trip time and metrics of a finished transaction"""
+        command = self.command_name(response.command)
+        metrics.observe('ec25_at_command_duration_seconds', response.elapsed, command=command)
+        if not response.ok and not response.prompt:
+            result = 'timeout' if response.timed_out else 'error'
+            metrics.inc('ec25_at_command_failures_total', command=command, result=result)
+        
+        if response.final is not None:
+            self.last_ok = time.monotonic()
+            self.last_rtt = response.elapsed
+            logger.debug(f"Command: {response.command}, {response.final} in {response.elapsed * 1000:.0f}ms, "
+                         f"Response: {repr(response.text[:100])}")
+        elif response.timed_out:
+            logger.warning(f"Command '{response.command}' timed out after {response.elapsed:.1f}s "
+                           f"({len(response.lines)} lines)")
+        else:
+            logger.error(f"Command '{response.command}' failed: {response.error}")
+    
+    @staticmethod
+    def command_name(command):
+        """Command without its arguments, e.g. AT+CMGR=3 -> AT+CMGR"""
+        match = re.match(r'AT(?:[+&$#%^][A-Z]+|[A-Z]?)', command, re.IGNORECASE)
+        return match.group(0).upper() if match else command
+    
+    def _send_command(self, command, timeout=None):
+        """Send AT command and return response text"""
+        return self.transact(command, timeout=timeout).text
     
     def get_all_messages_with_status(self):
         """Get ALL messages (read and unread) with full details"""
         messages = []
-        
-        for storage in ["SM", "ME"]:
-            self._send_command(f'AT+CPMS="{storage}","{storage}","{storage}"')
-            response = self._send_command('AT+CMGL="ALL"', wait_time=2)
-            
-            if '+CMGL:' in response:
-                lines = response.split('\r\n')
-                i = 0
-                while i < len(lines):
-                    if lines[i].startswith('+CMGL:'):
-                        try:
-                            parts = lines[i].split(',')
-                            if len(parts) >= 3:
-                                index = parts[0].split(':')[1].strip()
-                                status = parts[1].strip('"')
-                                sender = parts[2].strip('"')
-                                
-                                timestamp = ""
-                                if len(parts) >= 5:
-                                    timestamp = parts[4].strip('"')
-                                
-                                if i + 1 < len(lines) and lines[i + 1].strip():
-                                    text = lines[i + 1].strip()
-                                    
-                                    messages.append({
-                                        'storage': storage,
-                                        'index': index,
-                                        'status': status,
-                                        'sender': sender,
-                                        'timestamp': timestamp,
-                                        'text': text,
-                                        'id': f"{storage}_{index}_{sender}_{timestamp}"
-                                    })
-                        except Exception as e:
-                            logger.error(f"Error parsing message line: {e}")
-                    i += 1
+        for storage in MESSAGE_STORAGES:
+            messages += self.get_messages_with_status(storage)
         
         logger.info(f"Found {len(messages)} total messages")
         return messages
     
+    def get_messages_with_status(self, storage):
+        """Get all messages of one storage with full details"""
+        messages = list(self.iter_messages(storage))
+        logger.debug(f"Found {len(messages)} messages in {storage}")
+        return messages
+    
+    def iter_messages(self, storage):
+        """Yield the messages of one storage while the AT+CMGL listing is still arriving"""
+        self._send_command(f'AT+CPMS="{storage}","{storage}","{storage}"')
+        parser = SMSParser(storage, pdu=self.pdu_mode, modem=self.name, id_prefix=self.id_prefix)
+        lines = self.mux.stream(self._list_command(), self._command_timeout('AT+CMGL'))
+        response = yield from parser.parse(lines)
+        self._record(response)
+    
+    def scan_messages(self, storage, callback):
+        """Call callback(msg) for each message of storage as it is parsed; returns the count"""
+        count = 0
+        for msg in self.iter_messages(storage):
+            callback(msg)
+            count += 1
+        return count
+    
+    def read_message(self, index, storage="SM"):
+        """Read a single message by storage index"""
+        self._send_command(f'AT+CPMS="{storage}"')
+        return self.parse_message(storage, index, self.transact(f'AT+CMGR={index}'))
+    
+    def parse_message(self, storage, index, response):
+        """Parse an AT+CMGR response into a message dict"""
+        if not response.ok or not response.lines or not response.lines[0].startswith('+CMGR:'):
+            logger.warning(f"Could not read message {storage}[{index}]: {response.text!r}")
+            return None
+        
+        parser = SMSParser(storage, index, self.pdu_mode, self.name, self.id_prefix)
+        messages = list(parser.parse(iter(response.lines)))
+        return messages[0] if messages else None
+    
+    def _list_command(self):
+        """AT+CMGL for every message, in the current message format"""
+        return 'AT+CMGL=4' if self.pdu_mode else 'AT+CMGL="ALL"'
+    
     def list_all_messages(self):
         """List all messages (formatted for display)"""
         result = ""
-        for storage in ["SM", "ME"]:
+        for storage in MESSAGE_STORAGES:
             self._send_command(f'AT+CPMS="{storage}","{storage}","{storage}"')
             result += f"=== {storage} Storage ===\n"
-            response = self._send_command('AT+CMGL="ALL"', wait_time=2)
+            if self.pdu_mode:
+                # Shown the way text mode lists them; the raw PDUs are unreadable
+                for msg in self.iter_messages(storage):
+                    result += f'+CMGL: {msg["index"]},"{msg["status"]}","{msg["sender"]}",,"{msg["timestamp"]}"\n'
+                    result += msg['text'] + "\n"
+                result += "\n"
+                continue
+            response = self._send_command('AT+CMGL="ALL"')
             result += response + "\n\n"
         return result if result.strip() else "No messages found"
     
     def send_sms(self, number, message):
-        """Send SMS"""
-        self._send_command(f'AT+CMGS="{number}"', wait_time=0.5)
-        self.ser.write((message + '\x1A').encode())
-        time.sleep(2)
-        response = self.ser.read(self.ser.in_waiting).decode('utf-8', errors='ignore')
-        return response
+        """Send SMS right away, in as many parts as it needs (the outbox queues and retries instead)"""
+        with self.mux.lock:
+            return '\n'.join(self.send_segment(number, segment).text
+                             for segment in self.segments(number, message))
+    
+    def segments(self, number, message, reference=0):
+        """What send_segment() sends for message: SMS-SUBMIT PDUs, or text parts in text mode"""
+        if self.pdu_mode:
+            return SMSPDU.encode_submit(number, message, reference)
+        # Text mode cannot link parts, so a long message goes out as separate SMS
+        return SMSPDU.split(message)
+    
+    def send_segment(self, number, segment):
+        """Send one SMS with AT+CMGS, waiting for the prompt and then +CMGS: <mr>"""
+        if isinstance(segment, str):
+            command, payload = f'AT+CMGS="{number}"', segment
+        else:
+            payload, length = segment
+            command = f'AT+CMGS={length}'
+        # Hold the port across prompt and body so nothing interleaves
+        with self.mux.lock:
+            response = self.transact(command, expect_prompt=True)
+            if not response.prompt:
+                if response.timed_out:
+                    # Abort a half-open CMGS so the modem does not wait for a body
+                    self.mux.write_raw(b'\x1B')
+                return response
+            
+            response = self.mux.send_payload('AT+CMGS', (payload + '\x1A').encode(),
+                                             self._command_timeout('AT+CMGS'))
+            self._record(response)
+            return response
     
     def delete_message(self, index, storage="SM"):
         """Delete message"""
         self._send_command(f'AT+CPMS="{storage}","{storage}","{storage}"')
         return self._send_command(f'AT+CMGD={index}')
     
+    def get_storage_usage(self, storage):
+        """Select storage and return its (used, total), or None if the modem did not answer"""
+        response = self.transact(f'AT+CPMS="{storage}","{storage}","{storage}"')
+        match = re.search(r'\+CPMS:\s*(\d+),\s*(\d+)', response.text)
+        return (int(match.group(1)), int(match.group(2))) if response.ok and match else None
+    
     def answer_call(self):
         """Answer incoming call"""
         return self._send_command('ATA')
     
-    def hangup_call(self):
-        """Hangup call"""
-        return self._send_command('ATH')
+    def hangup_call(self):
+        """Hangup call"""
+        return self._send_command('ATH')
+    
+    def reject_call(self):
+        """Reject incoming call"""
+        return self._send_command('AT+CHUP')
+    
+    def get_signal_strength(self):
+        """Get signal strength"""
+        response = self._send_command('AT+CSQ')
+        
+        if '+CSQ:' in response:
+            try:
+                rssi_part = response.split('+CSQ:')[1].split('\r')[0].strip()
+                rssi = int(rssi_part.split(',')[0].strip())
+                return self.describe_rssi(rssi)
+            except Exception as e:
+                logger.error(f"Error parsing signal: {e}")
+                return f"Raw response: {response}"
+        
+        return f"No signal data (raw: {response})"
+    
+    @staticmethod
+    def describe_rssi(rssi):
+        """Human readable quality for a CSQ RSSI value"""
+        if rssi is None or rssi == 99:
+            return "No signal"
+        elif rssi >= 20:
+            return f"Excellent (RSSI: {rssi})"
+        elif rssi >= 15:
+            return f"Good (RSSI: {rssi})"
+        elif rssi >= 10:
+            return f"Fair (RSSI: {rssi})"
+        else:
+            return f"Poor (RSSI: {rssi})"
+    
+    def get_serving_cell(self):
+        """Get LTE serving cell details (AT+QENG="servingcell")"""
+        response = self.transact('AT+QENG="servingcell"')
+        for line in response.lines_with('+QENG:'):
+            # +QENG: "servingcell",<state>,"LTE",<is_tdd>,<MCC>,<MNC>,<cellID>,<PCID>,<earfcn>,
+            #        <band>,<UL_bw>,<DL_bw>,<TAC>,<RSRP>,<RSRQ>,<RSSI>,<SINR>,...
+            fields = [f.strip().strip('"') for f in line.split(':', 1)[1].split(',')]
+            if len(fields) < 17 or fields[2] != 'LTE':
+                return {'rat': fields[2] if len(fields) > 2 else None}
+            try:
+                return {
+                    'rat': 'LTE',
+                    'state': fields[1],
+                    'cell_id': fields[6],
+                    'band': int(fields[9]),
+                    'rsrp': int(fields[13]),
+                    'rsrq': int(fields[14]),
+                    # Reported as 0-250; SINR (dB) = value / 5 - 20
+                    'sinr': int(fields[16]) / 5 - 20,
+                }
+            except ValueError as e:
+                logger.debug(f"Unparseable serving cell line {line!r}: {e}")
+        return {}
+    
+    def sample_telemetry(self):
+        """Take one signal/network sample (CSQ, serving cell, registration, operator)"""
+        sample = {'time': time.time(), 'rssi': None}
+        response = self.transact('AT+CSQ')
+        for line in response.lines_with('+CSQ:'):
+            try:
+                rssi = int(line.split(':', 1)[1].split(',')[0])
+                sample['rssi'] = None if rssi == 99 else rssi
+            except ValueError as e:
+                logger.error(f"Error parsing signal: {e}")
+        sample.update(self.get_serving_cell())
+        sample['registration'] = self.get_registration()
+        sample['operator'] = self.get_operator()
+        return sample
+    
+    def get_storage_info(self):
+        """Get message storage usage (AT+CPMS?)"""
+        return self._send_command('AT+CPMS?')
+    
+    def get_registration(self):
+        """Get network registration"""
+        response = self.transact('AT+CREG?')
+        lines = response.lines_with('+CREG:')
+        if lines:
+            return lines[0]
+        return response.text
+    
+    def get_operator(self):
+        """Get current operator"""
+        response = self.transact('AT+COPS?')
+        lines = response.lines_with('+COPS:')
+        if lines:
+            return lines[0]
+        return response.text
+
+
+class ModemWorker:
+    """Run blocking modem calls on a dedicated thread, awaitable from asyncio.
+    
+    Coroutines submit callables and await a future that the worker thread
+    resolves on the caller's event loop, so serial I/O never blocks the bot.
+    Requests are served by priority class (call control, sending, status,
+    background polling) and FIFO within a class. A running request is never
+    interrupted, so long jobs are submitted as several short requests and
+    higher classes get the port at the next request boundary.
+    """
+    
+    PRIORITY_NAMES = {
+        PRIORITY_CALL: 'call',
+        PRIORITY_SEND: 'send',
+        PRIORITY_STATUS: 'status',
+        PRIORITY_BACKGROUND: 'background',
+    }
+    
+    def __init__(self, name="modem-worker"):
+        self.name = name
+        self.requests = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.thread = None
+        self.depth = {priority: 0 for priority in self.PRIORITY_NAMES}
+        self.max_depth = {priority: 0 for priority in self.PRIORITY_NAMES}
+        self.served = {priority: 0 for priority in self.PRIORITY_NAMES}
+        self.wait_time = {priority: 0.0 for priority in self.PRIORITY_NAMES}
+        self.stats_lock = threading.Lock()
+    
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run_loop, name=self.name, daemon=True)
+        self.thread.start()
+        logger.info(f"Modem worker {self.name} started")
+    
+    def stop(self):
+        """Stop after the requests already queued"""
+        if self.thread is not None:
+            self.requests.put((len(self.PRIORITY_NAMES), next(self.sequence), None))
+            self.thread.join(timeout=5)
+            self.thread = None
+    
+    async def run(self, func, *args, priority=PRIORITY_STATUS, **kwargs):
+        """Queue func(*args, **kwargs) for the worker and await its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.stats_lock:
+            self.depth[priority] += 1
+            self.max_depth[priority] = max(self.max_depth[priority], self.depth[priority])
+        request = (func, args, kwargs, loop, future, time.monotonic())
+        self.requests.put((priority, next(self.sequence), request))
+        return await future
+    
+    def call(self, func, *args, priority=PRIORITY_STATUS, timeout=None, **kwargs):
+        """Queue func for the worker from another thread and block until it ran.
+        
+        Runs func right away when the worker is not running (startup,
+        shutdown) or when called from the worker thread itself. Raises
+        concurrent.futures.TimeoutError after timeout seconds.
+        """
+        if self.thread is None or not self.thread.is_alive() or threading.current_thread() is self.thread:
+            return func(*args, **kwargs)
+        future = concurrent.futures.Future()
+        with self.stats_lock:
+            self.depth[priority] += 1
+            self.max_depth[priority] = max(self.max_depth[priority], self.depth[priority])
+        request = (func, args, kwargs, None, future, time.monotonic())
+        self.requests.put((priority, next(self.sequence), request))
+        return future.result(timeout)
+    
+    def stats(self):
+        """Per-class queue depth, peak depth, served count and mean wait"""
+        with self.stats_lock:
+            return {
+                name: {
+                    'depth': self.depth[priority],
+                    'max_depth': self.max_depth[priority],
+                    'served': self.served[priority],
+                    'avg_wait': self.wait_time[priority] / self.served[priority] if self.served[priority] else 0.0,
+                }
+                for priority, name in self.PRIORITY_NAMES.items()
+            }
+    
+    def _run_loop(self):
+        while True:
+            priority, _, request = self.requests.get()
+            if request is None:
+                return
+            func, args, kwargs, loop, future, queued_at = request
+            waited = time.monotonic() - queued_at
+            with self.stats_lock:
+                self.depth[priority] -= 1
+                self.served[priority] += 1
+                self.wait_time[priority] += waited
+            if waited > 1:
+                logger.info(f"{self.PRIORITY_NAMES[priority]} request {getattr(func, '__name__', func)} "
+                            f"waited {waited:.1f}s for the modem")
+            if future.cancelled():
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                result, error = None, e
+            else:
+                error = None
+            if loop is None:
+                # Submitted with call() from another thread
+                self._resolve(future, result, error)
+                continue
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, result, error)
+            except RuntimeError:
+                # The loop closed on shutdown; nobody is waiting for this result
+                pass
+    
+    @staticmethod
+    def _resolve(future, result, error):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class ModemPool:
+    """All EC25s of the gateway, each with its own session, worker thread and call monitor.
+    
+    Modems are named by USB device path, so a modem keeps its name across
+    resets and re-enumeration. With MODEM_POOL, message IDs carry the
+    modem name, so they stay the same whichever modems are found at
+    startup. The first one is the primary: status queries go to it.
+    Outgoing SMS go to the connected modem with
+    the fewest sends in flight, ties broken by signal quality, so a modem
+    that drops is skipped until its session is back.
+    """
+    
+    def __init__(self):
+        self.modems = []
+        self.workers = {}  # modem name -> ModemWorker
+        self.monitors = {}  # modem name -> CallMonitor
+        self.sending = collections.Counter()  # modem name -> SMS parts in flight
+        self.rssi = {}  # modem name -> latest RSSI
+    
+    def __len__(self):
+        return len(self.modems)
+    
+    @property
+    def primary(self):
+        return self.modems[0]
+    
+    def add(self, modem, worker=None):
+        """Add a modem, with a worker of its own unless one is given"""
+        # Not the position in the pool: a missing modem would shift every other one
+        modem.id_prefix = f"{modem.name}:" if MODEM_POOL else ''
+        self.modems.append(modem)
+        self.workers[modem.name] = worker or ModemWorker(f"modem-worker-{modem.name}")
+        return modem
+    
+    def discover(self, discovery=None):
+        """Add a modem for every EC25 on USB (only the first unless MODEM_POOL)"""
+        discovery = discovery or PortDiscovery(cache_file=PORT_CACHE_FILE, sysfs_root=USB_SERIAL_SYSFS)
+        usb_paths = discovery.devices()
+        if not MODEM_POOL:
+            usb_paths = usb_paths[:1]
+        if not usb_paths:
+            # No sysfs entry: probe ttyUSB ports for a single modem, as before
+            self.add(EC25Modem(port=MODEM_PORT, discovery=discovery))
+        for usb_path in usb_paths:
+            self.add(EC25Modem(usb_path=usb_path, name=MODEM_NAMES.get(usb_path), discovery=discovery))
+        logger.info(f"Modem pool: {', '.join(modem.name for modem in self.modems)}")
+        return self.modems
+    
+    def get(self, name):
+        """Modem by name; None or an unknown name gives the primary"""
+        for modem in self.modems:
+            if modem.name == name:
+                return modem
+        return self.primary
+    
+    def worker(self, modem):
+        return self.workers[modem.name]
+    
+    def run(self, modem, func, *args, **kwargs):
+        """Run func on the worker of modem and await its result"""
+        return self.workers[modem.name].run(func, *args, **kwargs)
+    
+    def tag(self, modem_name):
+        """Suffix naming the modem in notifications, empty with a single modem"""
+        return f" ({modem_name})" if len(self.modems) > 1 else ""
+    
+    def pick_sender(self, pinned=None):
+        """Modem to send the next SMS with.
+        
+        A modem that sent part of a long SMS sends the rest too, or the
+        parts would arrive from different numbers. While no session is
+        open any modem is returned, so the send attempt reconnects it.
+        """
+        names = [modem.name for modem in self.modems]
+        if pinned in names:
+            return self.modems[names.index(pinned)]
+        candidates = [modem for modem in self.modems if modem.is_connected()] or self.modems
+        return min(candidates, key=lambda modem: (self.sending[modem.name], -(self.rssi.get(modem.name) or 0)))
+    
+    def call_modem(self):
+        """Modem with a call in progress (answered before ringing), else the primary"""
+        for state in (CallMonitor.ACTIVE, CallMonitor.RINGING):
+            for modem in self.modems:
+                monitor = self.monitors.get(modem.name)
+                if monitor and monitor.state == state:
+                    return modem
+        return self.primary
+    
+    def capture(self, trace_file):
+        """Record each modem's serial traffic, to trace_file for the primary and trace_file-<name> otherwise"""
+        root, ext = os.path.splitext(trace_file)
+        for modem in self.modems:
+            modem.start_capture(trace_file if modem is self.primary else f"{root}-{modem.name}{ext}")
+    
+    def connect_all(self):
+        """Open every session at once (before the workers run); returns the modems that failed"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.modems)) as executor:
+            results = list(executor.map(lambda modem: modem.connect(), self.modems))
+        return [modem for modem, ok in zip(self.modems, results) if not ok]
+    
+    def start(self, on_call=None, on_sms=None):
+        """Start workers, +CMTI subscriptions and call monitors of every modem"""
+        for modem in self.modems:
+            self.workers[modem.name].start()
+            if on_sms:
+                modem.add_init_command('AT+CNMI=2,1,0,0,0')
+                modem.subscribe(('+CMTI:',), functools.partial(on_sms, modem_name=modem.name))
+            if on_call:
+                monitor = CallMonitor(modem, self.workers[modem.name])
+                monitor.set_callback(functools.partial(on_call, modem_name=modem.name))
+                monitor.start()
+                self.monitors[modem.name] = monitor
+    
+    def stop(self):
+        for modem in self.modems:
+            monitor = self.monitors.pop(modem.name, None)
+            if monitor:
+                monitor.stop()
+            self.workers[modem.name].stop()
+            modem.disconnect()
+            modem.stop_capture()
+
+
+class TokenBucket:
+    """Token bucket rate limiter"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def reserve(self):
+        """Take a token, returning how long the caller must wait for it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class NotificationDispatcher:
+    """Deliver Telegram notifications concurrently across chats, within rate limits.
+    
+    Each chat has its own sender task, so a slow or throttled chat does not
+    hold up the others. Sends pass a global and a per-chat token bucket, a
+    429 pauses all sending for retry_after, and SMS notifications queued for
+    a chat while it is busy are coalesced into one message.
+    """
+    
+    def __init__(self, bot, global_rate=NOTIFY_GLOBAL_RATE, chat_rate=NOTIFY_CHAT_RATE,
+                 chat_burst=NOTIFY_CHAT_BURST, max_attempts=NOTIFY_MAX_ATTEMPTS):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.chat_buckets = {}
+        self.pending = {}
+        self.tasks = {}
+        self.paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.coalesced = 0
+    
+    def submit(self, chat_id, text, kind='sms'):
+        """Queue a notification for one chat; returns a future resolved with success"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(chat_id, []).append((kind, text, future))
+        if chat_id not in self.tasks:
+            self.tasks[chat_id] = asyncio.create_task(self._chat_loop(chat_id))
+        return future
+    
+    def broadcast(self, text, kind='sms'):
+        """Queue a notification for every authorized user"""
+        return [self.submit(chat_id, text, kind) for chat_id in user_manager.get_all_users()]
+    
+    async def _chat_loop(self, chat_id):
+        """Drain one chat's queue, coalescing whatever piled up meanwhile"""
+        pending = self.pending[chat_id]
+        try:
+            while pending:
+                batch = pending[:]
+                pending.clear()
+                for kind, text, futures in self._coalesce(batch):
+                    ok = await self._send(chat_id, text, kind)
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(ok)
+        finally:
+            del self.tasks[chat_id]
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_result(False)
+            pending.clear()
+    
+    def _coalesce(self, batch):
+        """Group consecutive SMS notifications into messages under Telegram's size limit"""
+        groups = []
+        texts, futures = [], []
+        
+        def flush(kind='sms'):
+            if texts:
+                if len(texts) > 1:
+                    self.coalesced += len(texts) - 1
+                groups.append((kind, NOTIFY_SEPARATOR.join(texts), list(futures)))
+                texts.clear()
+                futures.clear()
+        
+        for kind, text, future in batch:
+            size = sum(len(t) + len(NOTIFY_SEPARATOR) for t in texts) + len(text)
+            if kind != 'sms' or size > TELEGRAM_MAX_MESSAGE:
+                flush()
+            texts.append(text)
+            futures.append(future)
+            if kind != 'sms':
+                flush(kind)
+        flush()
+        return groups
+    
+    def _chat_bucket(self, chat_id):
+        if chat_id not in self.chat_buckets:
+            self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self.chat_buckets[chat_id]
+    
+    async def _send(self, chat_id, text, kind):
+        from telegram.error import RetryAfter
+        for attempt in range(self.max_attempts):
+            delay = max(self.global_bucket.reserve(), self._chat_bucket(chat_id).reserve(),
+                        self.paused_until - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = time.monotonic()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                metrics.observe('ec25_telegram_send_duration_seconds', time.monotonic() - started)
+                metrics.inc('ec25_telegram_sends_total', kind=kind, result='ok')
+                self.sent += 1
+                logger.info(f"Sent notification to user {chat_id}")
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                metrics.inc('ec25_telegram_throttled_total')
+                self.throttled += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                logger.warning(f"Telegram flood limit hit sending to {chat_id}, "
+                               f"retrying in {retry_after}s (attempt {attempt + 1})")
+            except Exception as e:
+                logger.error(f"Error sending notification to {chat_id}: {e}")
+                break
+        
+        metrics.inc('ec25_telegram_sends_total', kind=kind, result='failed')
+        self.failed += 1
+        return False
+
+
+class StatusCache:
+    """TTL cache for modem status queries with single-flight coalescing.
+    
+    Concurrent requests for the same key while a query is in flight await
+    that query instead of issuing another, so the modem sees at most one
+    query per key per TTL window.
+    """
+    
+    def __init__(self, ttls=STATUS_CACHE_TTLS, default_ttl=10):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.entries = {}
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+    
+    async def get(self, key, fetch, refresh=False, cache_if=None):
+        """Return a cached value for key, or await fetch() once for all callers"""
+        if not refresh:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+        
+        if key in self.inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self.inflight[key])
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Waiters may be gone; avoid "exception was never retrieved" warnings
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.inflight[key] = future
+        try:
+            value = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            if cache_if is None or cache_if(value):
+                ttl = self.ttls.get(key[0] if isinstance(key, tuple) else key, self.default_ttl)
+                self.entries[key] = (time.monotonic() + ttl, value)
+            future.set_result(value)
+            return value
+        finally:
+            if not future.done():
+                # The leader was cancelled; its followers get an error instead of waiting forever
+                future.set_exception(RuntimeError(f"Status query {key!r} was cancelled"))
+            self.inflight.pop(key, None)
+    
+    def invalidate(self, key=None):
+        """Drop one cached entry, or all of them"""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+
+class EventBridge:
+    """Hand events from modem threads to the bot's event loop.
+    
+    Threads post (key, callable, args); pending events live in a bounded
+    queue and a single drain callback is scheduled on the loop per burst,
+    so a flapping modem cannot flood the loop. Events with the same key
+    still pending are coalesced, and when the queue is full the oldest
+    event is dropped. Callables run on the loop; coroutines they return
+    are started as tasks.
+    """
+    
+    def __init__(self, max_pending=BRIDGE_MAX_PENDING):
+        self.max_pending = max_pending
+        self.loop = None
+        self.pending = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.drain_scheduled = False
+        self.tasks = set()
+        self.sequence = itertools.count()
+        self.posted = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+    
+    def attach(self, loop):
+        """Bind to the running event loop and deliver anything queued before it"""
+        self.loop = loop
+        with self.lock:
+            if self.pending and not self.drain_scheduled:
+                self.drain_scheduled = True
+                loop.call_soon_threadsafe(self._drain)
+    
+    def post(self, key, func, *args):
+        """Queue func(*args) for the event loop (thread-safe, never blocks)"""
+        if key is None:
+            key = next(self.sequence)
+        with self.lock:
+            self.posted += 1
+            if key in self.pending:
+                self.coalesced += 1
+            elif len(self.pending) >= self.max_pending:
+                dropped_key, _ = self.pending.popitem(last=False)
+                self.dropped += 1
+                logger.warning(f"Event bridge full, dropped {dropped_key}")
+            self.pending[key] = (func, args, time.monotonic())
+            
+            if self.loop is not None and not self.drain_scheduled:
+                self.drain_scheduled = True
+                self.loop.call_soon_threadsafe(self._drain)
+    
+    def _drain(self):
+        """Run every pending event (on the event loop)"""
+        with self.lock:
+            events = list(self.pending.values())
+            self.pending.clear()
+            self.drain_scheduled = False
+        
+        for func, args, posted_at in events:
+            try:
+                result = func(*args)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.ensure_future(result)
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+                self.delivered += 1
+            except Exception as e:
+                logger.error(f"Error handling bridged event {getattr(func, '__name__', func)}: {e}", exc_info=True)
+            latency = time.monotonic() - posted_at
+            if latency > 0.5:
+                logger.warning(f"Bridged event delivered after {latency:.2f}s")
+
+
+class StorageManager:
+    """Delete forwarded SMS from the modem and keep storage occupancy in check.
+    
+    A message becomes deletable once it reached at least one user, its
+    seen ID is on disk marked forwarded and its archive row is committed. By default it is deleted right after; with
+    keep_forwarded, forwarded messages stay until a storage fills past the
+    high watermark and the oldest are deleted down to the low watermark.
+    A storage holding nothing but forwarded messages is emptied with one
+    AT+CMGD=1,1 instead of a command per message.
+    """
+    
+    def __init__(self, auto_delete=STORAGE_AUTO_DELETE, keep_forwarded=STORAGE_KEEP_FORWARDED,
+                 high_watermark=STORAGE_HIGH_WATERMARK, low_watermark=STORAGE_LOW_WATERMARK):
+        self.auto_delete = auto_delete
+        self.keep_forwarded = keep_forwarded
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # Keyed by (modem name, storage)
+        self.forwarded = {}  # key -> {index: (seen ID, archive ID)}, oldest first
+        self.usage = {}  # key -> (used, total) at the last check
+        self.alerted = set()
+        self.deleted = 0
+        self.bulk_deletes = 0
+        self.running = False
+        self.rerun = False
+    
+    def mark_forwarded(self, msg):
+        """Record a delivered message (every part of a long one) as deletable"""
+        parts = msg.get('parts')
+        for part in parts or [msg]:
+            # Seen ID to drop once deleted; a long SMS keeps its merged ID until it ages out
+            seen_id = None if parts else msg['id']
+            key = (part.get('modem'), part['storage'])
+            self.forwarded.setdefault(key, collections.OrderedDict())[int(part['index'])] = (seen_id, msg['id'])
+    
+    def candidates(self, key, archived):
+        """Forwarded indexes of a storage whose message is archived (archived(IDs) -> committed IDs)"""
+        indexes = self.forwarded.get(key, {})
+        committed = archived({archive_id for _, archive_id in indexes.values()})
+        return [index for index, (_, archive_id) in indexes.items() if archive_id in committed]
+    
+    def forget(self, key, index):
+        """Drop an index deleted by other means so it is not deleted again"""
+        self.forwarded.get(key, {}).pop(int(index), None)
+    
+    @property
+    def pending(self):
+        return sum(len(indexes) for indexes in self.forwarded.values())
+    
+    def select(self, candidates, used, total):
+        """Indexes to delete at this occupancy, oldest forwarded first"""
+        if not self.auto_delete:
+            return []
+        if not self.keep_forwarded:
+            return list(candidates)
+        if used < total * self.high_watermark:
+            return []
+        return list(candidates)[:max(0, used - int(total * self.low_watermark))]
+    
+    def delete_all(self, modem, storage, expected):
+        """Empty a storage with one AT+CMGD=1,1 if it still holds expected messages (modem thread)"""
+        with modem.mux.lock:
+            usage = modem.get_storage_usage(storage)
+            # A message that arrived since the plan was made is not forwarded yet
+            if usage is None or usage[0] != expected:
+                return False
+            return modem.transact('AT+CMGD=1,1').ok
+    
+    def delete_batch(self, modem, storage, indexes):
+        """Delete a few indexes of a storage (modem thread); returns (settled indexes, deleted)"""
+        settled = []
+        deleted = 0
+        with modem.mux.lock:
+            if modem.get_storage_usage(storage) is None:
+                return settled, deleted
+            for index in indexes:
+                response = modem.transact(f'AT+CMGD={index}')
+                if response.ok:
+                    deleted += 1
+                    settled.append(index)
+                else:
+                    # The SMS may still be stored; it stays pending for the next pass
+                    logger.warning(f"Could not delete {storage} index {index} on {modem.name}: {response.final}")
+        return settled, deleted
+    
+    def settle(self, key, settled, deleted):
+        """Apply a purge result; returns the seen IDs of the messages now gone"""
+        self.deleted += deleted
+        indexes = self.forwarded.get(key, {})
+        return [seen_id for seen_id, _ in (indexes.pop(index, (None, None)) for index in settled) if seen_id]
+    
+    def check_usage(self, key, usage, where=""):
+        """Record occupancy; returns a warning when a storage is left nearly full"""
+        self.usage[key] = usage
+        used, total = usage
+        if used >= total * self.high_watermark:
+            if key not in self.alerted:
+                self.alerted.add(key)
+                return f"⚠️ {key[1]} storage{where} is {used}/{total} full. New SMS are rejected once it is full."
+        elif used < total * self.low_watermark:
+            self.alerted.discard(key)
+        return None
+
+
+class SMSOutbox:
+    """Persistent queue of outgoing SMS with retries and per-batch reports.
+    
+    Every change (queued, part sent, retry scheduled, finished) is one line
+    appended to a journal, so queued messages survive a restart and resume
+    with the part that was not sent yet. Once enough lines pile up the
+    journal is rewritten atomically with only the unfinished jobs. Like the
+    seen-messages journal, writes run on a thread while the event loop
+    runs, so sending is never held up by an fsync. A job is
+    one message to one number; jobs queued together form a batch whose
+    throughput and latency are reported when its last job finishes.
+    """
+    
+    def __init__(self, filepath=OUTBOX_FILE, max_attempts=OUTBOX_MAX_ATTEMPTS, retry_base=OUTBOX_RETRY_BASE,
+                 retry_max=OUTBOX_RETRY_MAX, compact_every=OUTBOX_COMPACT_EVERY):
+        self.filepath = filepath
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.compact_every = compact_every
+        self.jobs = collections.OrderedDict()  # unfinished jobs by ID, in queue order
+        self.batches = {}
+        self.active = set()  # job IDs being sent
+        self.history = collections.deque(maxlen=1000)  # (finished at, ok, seconds queued)
+        self.sequence = itertools.count()
+        self.references = itertools.count(int(time.time()))
+        self.journal = None
+        self.journal_entries = 0
+        self.pending = []  # journal lines not written yet
+        self.write_lock = asyncio.Lock()  # one write on the thread at a time, in order
+        self.flushes = set()  # writes scheduled by changes
+        self.wakeup = None  # asyncio.Event of the sending loop
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.load()
+    
+    def load(self):
+        """Replay the journal: queued jobs come back with their progress"""
+        if not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping corrupt outbox journal entry")
+                        continue
+                    self._apply(entry)
+                    self.journal_entries += 1
+        except Exception as e:
+            logger.error(f"Error loading outbox: {e}")
+        for job in self.jobs.values():
+            self._batch(job)
+        if self.jobs:
+            logger.info(f"Outbox resumed with {len(self.jobs)} queued SMS")
+    
+    def _apply(self, entry):
+        op = entry[0]
+        job_id = entry[1]['id'] if op == 'add' else entry[1]
+        if op == 'add':
+            self.jobs[job_id] = entry[1]
+        elif job_id not in self.jobs:
+            return
+        elif op == 'sent':
+            self.jobs[job_id]['sent'] += 1
+            self.jobs[job_id]['refs'].append(entry[2])
+            if len(entry) > 3:
+                self.jobs[job_id]['modem'] = entry[3]
+        elif op == 'retry':
+            self.jobs[job_id].update(attempts=entry[2], next_at=entry[3], error=entry[4])
+        elif op == 'done':
+            del self.jobs[job_id]
+    
+    def _append(self, entries):
+        """Apply entries and queue them for the journal"""
+        for entry in entries:
+            self._apply(entry)
+        # Serialized now: the jobs keep changing while a thread writes
+        self.pending.extend(json.dumps(entry) + '\n' for entry in entries)
+        self._schedule()
+    
+    def _schedule(self):
+        """Write queued lines: on a thread while the event loop runs, right away otherwise"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.commit()
+            return
+        task = loop.create_task(self.flush())
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+    
+    def _take(self):
+        """Claim the queued lines, and the unfinished jobs when compaction is due"""
+        lines, self.pending = self.pending, []
+        snapshot = None
+        # With nothing left to resume, the next batch starts from an empty journal
+        if self.journal_entries + len(lines) >= self.compact_every or (lines and not self.jobs):
+            snapshot = [json.dumps(['add', job]) + '\n' for job in self.jobs.values()]
+        return lines, snapshot
+    
+    def commit(self):
+        """Write queued lines (and a due compaction) from the calling thread"""
+        self._write_lines(*self._take())
+    
+    async def flush(self):
+        """Write queued lines (and a due compaction) on a thread"""
+        async with self.write_lock:
+            lines, snapshot = self._take()
+            if lines or snapshot is not None:
+                await asyncio.to_thread(self._write_lines, lines, snapshot)
+    
+    def _write_lines(self, lines, snapshot):
+        """Append lines to the journal with one write and fsync, then rewrite it if a snapshot is given"""
+        if lines:
+            try:
+                if self.journal is None:
+                    self.journal = open(self.filepath, 'a')
+                self.journal.write(''.join(lines))
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.journal_entries += len(lines)
+            except Exception as e:
+                logger.error(f"Error appending to outbox journal: {e}")
+        if snapshot is not None:
+            self._compact(snapshot)
+    
+    def _compact(self, snapshot):
+        """Rewrite the journal with just the unfinished jobs"""
+        tmp_path = self.filepath + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(''.join(snapshot))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = open(self.filepath, 'a')
+            self.journal_entries = len(snapshot)
+        except Exception as e:
+            logger.error(f"Error compacting outbox: {e}")
+    
+    def _batch(self, job):
+        batch = self.batches.setdefault(job['batch'], {
+            'chat_id': job['chat_id'], 'size': job['batch_size'], 'started': job['created'],
+            'jobs': set(), 'sent': 0, 'failed': 0, 'parts': 0, 'retries': 0, 'latencies': [], 'errors': [],
+        })
+        batch['jobs'].add(job['id'])
+        return batch
+    
+    def add(self, messages, chat_id=None):
+        """Queue (number, text) pairs as one batch; returns the jobs"""
+        now = time.time()
+        batch_id = f"{int(now * 1000):x}"
+        jobs = [{
+            'id': f"{batch_id}-{next(self.sequence)}",
+            'number': number,
+            'text': text,
+            'chat_id': chat_id,
+            'batch': batch_id,
+            'batch_size': len(messages),
+            'reference': next(self.references) & 0xFF,
+            'created': now,
+            'attempts': 0,
+            'next_at': 0,
+            'sent': 0,
+            'refs': [],
+            'error': None,
+            'modem': None,  # set by the first part sent; the rest go out the same way
+        } for number, text in messages]
+        self._append([['add', job] for job in jobs])
+        for job in jobs:
+            self._batch(job)
+        self.notify()
+        return jobs
+    
+    def notify(self):
+        """Wake the sending loop"""
+        if self.wakeup is not None:
+            self.wakeup.set()
+    
+    def due(self, limit):
+        """Claim up to limit jobs ready to send, oldest first"""
+        now = time.time()
+        jobs = []
+        for job in self.jobs.values():
+            if len(jobs) >= limit:
+                break
+            if job['id'] not in self.active and job['next_at'] <= now:
+                self.active.add(job['id'])
+                jobs.append(job)
+        return jobs
+    
+    def next_retry(self):
+        """Seconds until the next waiting job is due, or None"""
+        waiting = [job['next_at'] for job in self.jobs.values() if job['id'] not in self.active]
+        return max(0.0, min(waiting) - time.time()) if waiting else None
+    
+    def part_sent(self, job, reference, modem_name=None):
+        self._append([['sent', job['id'], reference, modem_name]])
+        self.batches[job['batch']]['parts'] += 1
+    
+    def part_failed(self, job, error):
+        """Schedule a retry with backoff; returns False once the job is given up"""
+        code = re.search(r'\+CMS ERROR:\s*(\d+)', error)
+        attempts = job['attempts'] + 1
+        if attempts >= self.max_attempts or (code and int(code.group(1)) in OUTBOX_PERMANENT_ERRORS):
+            return False
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        self._append([['retry', job['id'], attempts, time.time() + delay, error]])
+        self.retried += 1
+        self.batches[job['batch']]['retries'] += 1
+        logger.warning(f"SMS to {job['number']} failed ({error}), retry {attempts} in {delay}s")
+        return True
+    
+    def finish(self, job, ok, error=None):
+        """Record a finished job; returns its batch once every job of it is done"""
+        self._append([['done', job['id'], ok, error]])
+        self.active.discard(job['id'])
+        now = time.time()
+        self.history.append((now, ok, now - job['created']))
+        batch = self.batches[job['batch']]
+        batch['jobs'].discard(job['id'])
+        batch['latencies'].append(now - job['created'])
+        if ok:
+            self.sent += 1
+            batch['sent'] += 1
+        else:
+            self.failed += 1
+            batch['failed'] += 1
+            batch['errors'].append((job['number'], error))
+        if batch['jobs']:
+            return None
+        batch['finished'] = now
+        return self.batches.pop(job['batch'])
+    
+    def release(self, job):
+        """Give a claimed job back to the queue"""
+        self.active.discard(job['id'])
+    
+    def recent(self, seconds=3600):
+        """(sent, failed, queue latencies) of jobs finished in the last seconds"""
+        since = time.time() - seconds
+        window = [entry for entry in self.history if entry[0] >= since]
+        return (sum(1 for _, ok, _ in window if ok), sum(1 for _, ok, _ in window if not ok),
+                [latency for _, _, latency in window])
+
+
+class SMSArchive:
+    """Every SMS received or sent, in SQLite with an FTS5 full-text index.
+    
+    Rows are keyed by message ID, so rescanning the modem never archives a
+    message twice and messages stay searchable after they are deleted from
+    it. The FTS5 table indexes the number and text of each row (external
+    content, filled by a trigger); numbers are also indexed by their last
+    digits, so /from finds +491701234567 when asked for 01701234567. Like
+    mark_seen(), add() commits right away unless called inside batch(), on
+    a thread with a connection of its own while the event loop runs;
+    queries use the main connection.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            msg_id TEXT NOT NULL UNIQUE,
+            direction TEXT NOT NULL,
+            number TEXT NOT NULL,
+            number_key TEXT NOT NULL,
+            text TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            at REAL NOT NULL,
+            storage TEXT,
+            idx TEXT,
+            modem TEXT
+        );
+        CREATE INDEX IF NOT EXISTS messages_at ON messages (at);
+        CREATE INDEX IF NOT EXISTS messages_number ON messages (number_key, at);
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            number, text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, number, text) VALUES (new.id, new.number, new.text);
+        END;
+    """
+    COLUMNS = "m.direction, m.number, m.text, m.timestamp, m.at, m.storage, m.idx, m.modem"
+    NUMBER_DIGITS = 9  # trailing digits that identify a number with or without its country code
+    
+    def __init__(self, filepath=ARCHIVE_FILE, page_size=ARCHIVE_PAGE_SIZE):
+        self.filepath = filepath
+        self.page_size = page_size
+        self.pending = []
+        self.renames = []  # (msg ID, previous ID) of rows to rename
+        self.batch_depth = 0
+        self.size = 0
+        self.write_lock = asyncio.Lock()  # one commit on the thread at a time
+        self.flushes = set()  # commits scheduled outside a batch
+        self.writer = None  # connection for commits, used by one thread at a time
+        self.db = self.open()
+    
+    def open(self):
+        """Open (or create) the database and its writer connection; None if it cannot be used"""
+        try:
+            db = self.connect()
+            db.executescript(self.SCHEMA)
+            self.size = db.execute("SELECT count(*) FROM messages").fetchone()[0]
+            self.writer = self.connect(check_same_thread=False)
+            logger.info(f"SMS archive has {self.size} messages")
+            return db
+        except sqlite3.Error as e:
+            logger.error(f"Error opening SMS archive {self.filepath}: {e}")
+            return None
+    
+    def connect(self, **kwargs):
+        """New connection to the database with the archive's settings"""
+        db = sqlite3.connect(self.filepath, **kwargs)
+        db.row_factory = sqlite3.Row
+        # WAL: commits append to the log without rewriting pages, and queries
+        # read alongside them. FULL syncs the log on every commit: an SMS is
+        # deleted from the modem only once its row is committed, so that
+        # commit must survive a power cut
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        return db
+    
+    @classmethod
+    def number_key(cls, number):
+        """Last digits of a phone number, or the lowercased sender name"""
+        digits = re.sub(r'\D', '', number)
+        return digits[-cls.NUMBER_DIGITS:] if digits else number.strip().lower()
+    
+    @staticmethod
+    def sent_at(timestamp):
+        """Epoch seconds of an SCTS timestamp (yy/MM/dd,hh:mm:ss+zz), or None"""
+        match = re.fullmatch(r'(\d\d)/(\d\d)/(\d\d),(\d\d):(\d\d):(\d\d)([+-])(\d\d)', timestamp.strip('"'))
+        if not match:
+            return None
+        year, month, day, hour, minute, second, sign, quarters = match.groups()
+        zone = datetime.timezone(datetime.timedelta(minutes=int(quarters) * 15 * (-1 if sign == '-' else 1)))
+        try:
+            return datetime.datetime(2000 + int(year), int(month), int(day), int(hour), int(minute), int(second),
+                                     tzinfo=zone).timestamp()
+        except ValueError:
+            return None
+    
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Buffer add() calls and commit them in one transaction"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                await self.flush()
+    
+    def add(self, msg):
+        """Archive a received SMS (ignored if it is already archived)"""
+        if msg.get('previous_id'):
+            # Seen under an earlier ID: its row takes the current one
+            self.renames.append((msg['id'], msg['previous_id']))
+        at = self.sent_at(msg['timestamp']) or time.time()
+        self.pending.append((msg['id'], 'in', msg['sender'], self.number_key(msg['sender']), msg['text'],
+                             msg['timestamp'], at, msg['storage'], msg['index'], msg.get('modem')))
+        self._schedule()
+    
+    def add_sent(self, job, modem_name=None):
+        """Archive an SMS the outbox sent"""
+        self.pending.append((f"out:{job['id']}", 'out', job['number'], self.number_key(job['number']),
+                             job['text'], "", time.time(), None, None, modem_name))
+        self._schedule()
+    
+    def _schedule(self):
+        """Commit outside a batch: on a thread while the event loop runs, right away otherwise"""
+        if self.batch_depth:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.commit()
+            return
+        task = loop.create_task(self.flush())
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+    
+    def commit(self):
+        """Insert buffered messages in one transaction from the calling thread"""
+        rows, self.pending = self.pending, []
+        renames, self.renames = self.renames, []
+        self.size += self._insert(rows, renames)
+    
+    async def flush(self):
+        """Insert buffered messages in one transaction on a thread"""
+        async with self.write_lock:
+            rows, self.pending = self.pending, []
+            renames, self.renames = self.renames, []
+            if rows:
+                self.size += await asyncio.to_thread(self._insert, rows, renames)
+    
+    def _insert(self, rows, renames=()):
+        """Rename rows, then insert rows on the writer connection; returns how many were new"""
+        if not rows or self.writer is None:
+            return 0
+        try:
+            with self.writer:
+                self.writer.executemany("UPDATE OR IGNORE messages SET msg_id = ? WHERE msg_id = ?", renames)
+                return self.writer.executemany(
+                    "INSERT OR IGNORE INTO messages (msg_id, direction, number, number_key, text, timestamp, at, "
+                    "storage, idx, modem) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error archiving {len(rows)} SMS: {e}")
+            return 0
+    
+    @property
+    def available(self):
+        return self.db is not None
+    
+    def archived(self, msg_ids):
+        """The IDs among msg_ids whose rows are committed"""
+        if self.db is None:
+            return set()
+        msg_ids = list(msg_ids)
+        found = set()
+        try:
+            for i in range(0, len(msg_ids), 500):
+                chunk = msg_ids[i:i + 500]
+                found.update(row[0] for row in self.db.execute(
+                    f"SELECT msg_id FROM messages WHERE msg_id IN ({','.join('?' * len(chunk))})", chunk))
+        except sqlite3.Error as e:
+            logger.error(f"Error reading SMS archive: {e}")
+        return found
+    
+    @staticmethod
+    def match_query(terms):
+        """FTS5 query matching all terms as plain words; a trailing * matches a prefix"""
+        words = []
+        for term in terms.split():
+            prefix = term.endswith('*')
+            term = term.rstrip('*')
+            if term:
+                words.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+        return ' '.join(words)
+    
+    def _page(self, kind, count_sql, rows_sql, params, page, order="m.at DESC, m.id DESC"):
+        """(rows, total, pages) of one page of a query, newest first"""
+        if self.db is None:
+            return [], 0, 0
+        started = time.monotonic()
+        total = self.db.execute(count_sql, params).fetchone()[0]
+        rows = self.db.execute(f"{rows_sql} ORDER BY {order} LIMIT ? OFFSET ?",
+                               params + (self.page_size, (page - 1) * self.page_size)).fetchall()
+        metrics.observe('ec25_archive_query_duration_seconds', time.monotonic() - started, kind=kind)
+        return rows, total, -(-total // self.page_size)
+    
+    def recent(self, page=1):
+        """All archived SMS"""
+        return self._page('list', "SELECT count(*) FROM messages",
+                          f"SELECT {self.COLUMNS}, NULL AS snippet FROM messages m", (), page)
+    
+    def from_number(self, number, page=1):
+        """SMS from or to a number"""
+        return self._page('from', "SELECT count(*) FROM messages WHERE number_key = ?",
+                          f"SELECT {self.COLUMNS}, NULL AS snippet FROM messages m WHERE m.number_key = ?",
+                          (self.number_key(number),), page)
+    
+    def search(self, terms, page=1):
+        """SMS whose text or number contains every term, with the matches marked (latest archived first)"""
+        query = self.match_query(terms)
+        if not query:
+            return [], 0, 0
+        # FTS5 walks its matches in rowid order, so the page is read without
+        # sorting (and snippeting) every match of a common word by time
+        return self._page('search', "SELECT count(*) FROM messages_fts WHERE messages_fts MATCH ?",
+                          f"SELECT {self.COLUMNS}, snippet(messages_fts, 1, '«', '»', '…', 16) AS snippet "
+                          f"FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                          f"WHERE messages_fts MATCH ?", (query,), page, order="messages_fts.rowid DESC")
+    
+    def close(self):
+        self.commit()
+        for db in (self.writer, self.db):
+            if db is not None:
+                db.close()
+        self.db = self.writer = None
+
+
+class StartupTimer:
+    """Break down the time from process start to the bot being ready.
+    
+    Phases are timed back to back from process start (read from /proc, so
+    interpreter startup and imports count too); work running alongside
+    them, like opening the modems, is recorded separately. The first SMS
+    forwarded after startup is timed as well.
+    """
+    
+    def __init__(self):
+        self.origin = time.monotonic() - self.process_age()
+        self.last = self.origin
+        self.phases = []  # (name, seconds), back to back
+        self.background = []  # (name, seconds), concurrent with the phases
+        self.ready = None
+        self.first_forward = None
+    
+    @staticmethod
+    def process_age():
+        """Seconds since this process started (0 without /proc)"""
+        try:
+            with open('/proc/self/stat', 'r') as f:
+                # Fields after the command name; starttime is field 22, in clock ticks since boot
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/uptime', 'r') as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+        except (OSError, ValueError, IndexError):
+            return 0.0
     
-    def reject_call(self):
-        """Reject incoming call"""
-        return self._send_command('AT+CHUP')
+    def elapsed(self):
+        return time.monotonic() - self.origin
     
-    def get_signal_strength(self):
-        """Get signal strength"""
-        response = self._send_command('AT+CSQ', wait_time=1)
-        
-        if '+CSQ:' in response:
-            try:
-                rssi_part = response.split('+CSQ:')[1].split('\r')[0].strip()
-                rssi = int(rssi_part.split(',')[0].strip())
-                
-                if rssi == 99:
-                    return "No signal"
-                elif rssi >= 20:
-                    return f"Excellent (RSSI: {rssi})"
-                elif rssi >= 15:
-                    return f"Good (RSSI: {rssi})"
-                elif rssi >= 10:
-                    return f"Fair (RSSI: {rssi})"
-                else:
-                    return f"Poor (RSSI: {rssi})"
-            except Exception as e:
-                logger.error(f"Error parsing signal: {e}")
-                return f"Raw response: {response}"
-        
-        return f"No signal data (raw: {response})"
+    def mark(self, phase):
+        """Close a phase that ran since the previous mark"""
+        now = time.monotonic()
+        self.phases.append((phase, now - self.last))
+        self.last = now
     
-    def get_registration(self):
-        """Get network registration"""
-        response = self._send_command('AT+CREG?', wait_time=1)
-        if '+CREG:' in response:
-            return response.split('\r\n')[0]
-        return response
+    def record(self, phase, seconds):
+        """Add work that ran concurrently with the phases"""
+        self.background.append((phase, seconds))
     
-    def get_operator(self):
-        """Get current operator"""
-        response = self._send_command('AT+COPS?', wait_time=1)
-        if '+COPS:' in response:
-            return response.split('\r\n')[0]
-        return response
+    def finish(self):
+        """Mark the bot ready and log the breakdown"""
+        self.ready = self.elapsed()
+        text = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        if self.background:
+            text += " (concurrently: " + ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.background) + ")"
+        logger.info(f"Ready {self.ready:.2f}s after process start: {text}")
+    
+    def forwarded(self):
+        """Note an SMS delivered to Telegram; the first one is logged"""
+        if self.first_forward is None:
+            self.first_forward = self.elapsed()
+            logger.info(f"First SMS forwarded {self.first_forward:.2f}s after process start")
 
 
 # Global instances
-modem = EC25Modem()
-user_manager = UserManager()
-seen_manager = SeenMessagesManager()
-call_monitor = None
+# Instances that load files or touch hardware are created on startup (load_state, open_modems)
+metrics = Metrics()
+startup = StartupTimer()
+modem_pool = None
+modem = None  # primary modem
+modem_worker = None
+user_manager = None
+seen_manager = None
+archive = None
+event_bridge = EventBridge()
+telemetry = TelemetryHistory()
+status_cache = StatusCache()
+concat_buffer = ConcatBuffer()
+storage_manager = StorageManager()
+outbox = None
 telegram_app = None
+notifier = None
+outbox_task = None
+modems_ready = None  # future of open_modems() while startup runs
 
 
 def authorized_only(func):
@@ -537,9 +3699,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     welcome_msg = """EC25 Modem Telegram Bot
 
 📨 SMS Commands:
-/list - List all SMS
+/list [page] - Archived SMS, newest first
+/list modem - SMS stored on the modem now
+/search <words> - Search archived SMS
+/from <number> [page] - SMS from/to a number
+/more - Next page of the last list or search
 /send <number> <message> - Send SMS
-/delete <storage> <index> - Delete SMS
+/sendbulk <numbers> <message> - Send SMS to many numbers
+/outbox - Queued SMS and send rate
+/delete <storage> <index> [modem] - Delete SMS
   Storage: SM (SIM) or ME (Modem)
 
 📞 Call Commands:
@@ -551,6 +3719,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /signal - Signal strength
 /network - Network info
 /storage - Storage info
+/history [hour|day] - Signal history
+/refresh - Query status live (skip caches)
 
 🔧 Other:
 /clear - Clear seen messages cache
@@ -563,28 +3733,110 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @authorized_only
 async def list_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """List all messages"""
-    await update.message.reply_text("Fetching messages...")
-    
-    if not modem.connect():
-        await update.message.reply_text("Failed to connect to modem")
+    """List archived messages, newest first (/list modem: what is stored on the modems now)"""
+    if context.args and context.args[0].lower() == 'modem':
+        await list_modem_messages(update)
         return
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    await reply_archive_page(update, context, 'list', None, page)
+
+
+async def list_modem_messages(update: Update):
+    """Dump the messages stored on every modem"""
+    await update.message.reply_text("Fetching messages...")
     
     try:
-        result = modem.list_all_messages()
-        modem.disconnect()
-        
-        if len(result) > 4000:
-            chunks = [result[i:i+4000] for i in range(0, len(result), 4000)]
-            for chunk in chunks:
-                await update.message.reply_text(chunk)
-        else:
-            await update.message.reply_text(result)
+        result = ""
+        for source in modem_pool.modems:
+            if len(modem_pool) > 1:
+                result += f"📟 {source.name}\n"
+            if not await modem_pool.run(source, source.connect):
+                result += "Failed to connect to modem\n\n"
+                continue
+            result += await modem_pool.run(source, source.list_all_messages)
+            result += "\n"
+        await reply_chunked(update, result)
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
 
 
+@authorized_only
+async def search_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Full-text search of the archive"""
+    if not context.args:
+        await update.message.reply_text("Usage: /search <words>\nEvery word must match; end a word with * to match its beginning")
+        return
+    await reply_archive_page(update, context, 'search', ' '.join(context.args), 1)
+
+
+@authorized_only
+async def messages_from(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Archived messages from and to one number"""
+    if not context.args:
+        await update.message.reply_text("Usage: /from <number> [page]")
+        return
+    page = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else 1
+    await reply_archive_page(update, context, 'from', context.args[0], page)
+
+
+@authorized_only
+async def more_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Next page of the last /list, /search or /from"""
+    last = context.chat_data.get('archive_query')
+    if last is None:
+        await update.message.reply_text("Nothing to continue. Use /list, /search or /from first.")
+        return
+    kind, argument, page = last
+    await reply_archive_page(update, context, kind, argument, page + 1)
+
+
+async def reply_archive_page(update, context, kind, argument, page):
+    """Answer with one page of an archive query and remember it for /more"""
+    if kind == 'search':
+        rows, total, pages = archive.search(argument, page)
+        title = f"🔎 \"{argument}\""
+    elif kind == 'from':
+        rows, total, pages = archive.from_number(argument, page)
+        title = f"👤 {argument}"
+    else:
+        rows, total, pages = archive.recent(page)
+        title = "📨 Archive"
+    
+    if not total:
+        await update.message.reply_text(f"{title}: no messages")
+        return
+    if not rows:
+        await update.message.reply_text(f"{title}: no more messages ({total} on {pages} page(s))")
+        return
+    context.chat_data['archive_query'] = (kind, argument, page)
+    
+    text = f"{title}: {total} message(s), page {page}/{pages}\n\n"
+    text += "\n\n".join(format_archived(row) for row in rows)
+    if page < pages:
+        text += "\n\n/more for older messages"
+    await reply_chunked(update, text)
+
+
+def format_archived(row):
+    """One archived SMS for a /list, /search or /from reply"""
+    when = datetime.datetime.fromtimestamp(row['at']).strftime('%Y-%m-%d %H:%M')
+    if row['direction'] == 'in':
+        header = f"📩 {when} from {row['number']}"
+        if row['storage']:
+            header += f" · {row['storage']}[{row['idx']}]"
+    else:
+        header = f"📤 {when} to {row['number']}"
+    if row['modem']:
+        header += modem_pool.tag(row['modem'])
+    return header + "\n" + (row['snippet'] or row['text'])
+
+
+async def reply_chunked(update: Update, text):
+    """Reply with text split into messages Telegram accepts"""
+    for i in range(0, len(text), 4000):
+        await update.message.reply_text(text[i:i+4000])
+
+
 @authorized_only
 async def send_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send SMS"""
@@ -594,35 +3846,63 @@ async def send_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     number = context.args[0]
     message = ' '.join(context.args[1:])
+    if not PHONE_NUMBER.fullmatch(number):
+        await update.message.reply_text(f"Invalid number: {number}")
+        return
     
-    await update.message.reply_text(f"Sending SMS to {number}...")
-    logger.info(f"User {update.effective_chat.id} sending SMS to {number}")
+    # Queued and retried by the outbox; the result is reported when it is sent
+    outbox.add([(number, message)], update.effective_chat.id)
+    parts = len(SMSPDU.split(message))
+    await update.message.reply_text(f"Sending SMS to {number}" + (f" ({parts} parts)..." if parts > 1 else "..."))
+    logger.info(f"User {update.effective_chat.id} queued SMS to {number}")
+
+
+@authorized_only
+async def send_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue one SMS for many numbers, or one SMS per line"""
+    usage = ("Usage:\n/sendbulk <number>,<number>,... <message>\n"
+             "or one SMS per line:\n/sendbulk\n<number> <message>\n<number> <message>")
+    command, _, rest = update.message.text.partition('\n')
+    if context.args and len(command.split()) > 2:
+        numbers, message = context.args[0], update.message.text.split(None, 2)[2]
+        messages = [(number, message) for number in re.split(r'[,;]', numbers) if number]
+    else:
+        messages = [tuple(line.strip().split(None, 1)) for line in rest.splitlines() if line.strip()]
     
-    if not modem.connect():
-        await update.message.reply_text("Failed to connect to modem")
+    invalid = [entry[0] for entry in messages if len(entry) < 2 or not PHONE_NUMBER.fullmatch(entry[0])]
+    if not messages or invalid:
+        await update.message.reply_text(usage + (f"\n\nInvalid: {', '.join(invalid[:10])}" if invalid else ""))
         return
     
-    try:
-        result = modem.send_sms(number, message)
-        modem.disconnect()
-        
-        if 'OK' in result:
-            await update.message.reply_text(f"SMS sent to {number}")
-            logger.info(f"SMS sent successfully to {number}")
-        else:
-            await update.message.reply_text(f"Failed to send:\n{result}")
-            logger.error(f"Failed to send SMS to {number}: {result}")
-    except Exception as e:
-        modem.disconnect()
-        await update.message.reply_text(f"Error: {str(e)}")
-        logger.error(f"Exception sending SMS: {e}")
+    outbox.add(messages, update.effective_chat.id)
+    parts = sum(len(SMSPDU.split(message)) for _, message in messages)
+    logger.info(f"User {update.effective_chat.id} queued {len(messages)} SMS ({parts} parts)")
+    await update.message.reply_text(f"Queued {len(messages)} SMS ({parts} parts). "
+                                    f"You'll get a report when they have been sent.")
+
+
+@authorized_only
+async def outbox_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show queued SMS and recent send throughput"""
+    sent, failed, latencies = outbox.recent()
+    retrying = sum(1 for job in outbox.jobs.values() if job['attempts'])
+    text = f"""📤 Outbox
+
+Queued: {len(outbox.jobs)} ({retrying} waiting to retry)
+Last hour: {sent} sent, {failed} failed ({sent / 60:.1f} SMS/min)
+Retries since start: {outbox.retried}
+"""
+    if latencies:
+        latencies.sort()
+        text += f"Latency: p50 {latencies[len(latencies) // 2]:.1f}s, p90 {latencies[int(len(latencies) * 0.9)]:.1f}s\n"
+    await update.message.reply_text(text)
 
 
 @authorized_only
 async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Delete message"""
     if len(context.args) < 2:
-        await update.message.reply_text("Usage: /delete <storage> <index>\nStorage: SM or ME")
+        await update.message.reply_text("Usage: /delete <storage> <index> [modem]\nStorage: SM or ME")
         return
     
     storage = context.args[0].upper()
@@ -632,24 +3912,28 @@ async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Storage must be SM (SIM) or ME (Modem)")
         return
     
-    logger.info(f"User {update.effective_chat.id} deleting message {storage}[{index}]")
+    target = modem_pool.get(context.args[2]) if len(context.args) > 2 else modem_pool.primary
+    if len(context.args) > 2 and target.name != context.args[2]:
+        await update.message.reply_text(f"Unknown modem. Modems: {', '.join(m.name for m in modem_pool.modems)}")
+        return
+    
+    logger.info(f"User {update.effective_chat.id} deleting message {storage}[{index}] on {target.name}")
     
-    if not modem.connect():
+    if not await modem_pool.run(target, target.connect, priority=PRIORITY_SEND):
         await update.message.reply_text("Failed to connect to modem")
         return
     
     try:
-        result = modem.delete_message(index, storage)
-        modem.disconnect()
+        result = await modem_pool.run(target, target.delete_message, index, storage, priority=PRIORITY_SEND)
         
         if 'OK' in result:
+            storage_manager.forget((target.name, storage), index)
             await update.message.reply_text(f"Deleted from {storage}[{index}]")
             logger.info(f"Message {storage}[{index}] deleted successfully")
         else:
             await update.message.reply_text(f"Failed to delete:\n{result}")
             logger.error(f"Failed to delete {storage}[{index}]: {result}")
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
         logger.error(f"Exception deleting message: {e}")
 
@@ -657,24 +3941,25 @@ async def delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized_only
 async def answer_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Answer incoming call"""
-    logger.info(f"User {update.effective_chat.id} answering call")
+    target = modem_pool.call_modem()
+    logger.info(f"User {update.effective_chat.id} answering call on {target.name}")
     
-    if not modem.connect():
+    if not await modem_pool.run(target, target.connect, priority=PRIORITY_CALL):
         await update.message.reply_text("Failed to connect to modem")
         return
     
     try:
-        result = modem.answer_call()
-        modem.disconnect()
+        result = await modem_pool.run(target, target.answer_call, priority=PRIORITY_CALL)
         
         if 'OK' in result:
             await update.message.reply_text("Call answered")
             logger.info("Call answered successfully")
+            if target.name in modem_pool.monitors:
+                modem_pool.monitors[target.name].notify_local_action('answer')
         else:
             await update.message.reply_text(f"Answer result:\n{result}")
             logger.warning(f"Answer call result: {result}")
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
         logger.error(f"Exception answering call: {e}")
 
@@ -682,24 +3967,25 @@ async def answer_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized_only
 async def hangup_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Hangup current call"""
-    logger.info(f"User {update.effective_chat.id} hanging up call")
+    target = modem_pool.call_modem()
+    logger.info(f"User {update.effective_chat.id} hanging up call on {target.name}")
     
-    if not modem.connect():
+    if not await modem_pool.run(target, target.connect, priority=PRIORITY_CALL):
         await update.message.reply_text("Failed to connect to modem")
         return
     
     try:
-        result = modem.hangup_call()
-        modem.disconnect()
+        result = await modem_pool.run(target, target.hangup_call, priority=PRIORITY_CALL)
         
         if 'OK' in result:
             await update.message.reply_text("Call ended")
             logger.info("Call ended successfully")
+            if target.name in modem_pool.monitors:
+                modem_pool.monitors[target.name].notify_local_action('hangup')
         else:
             await update.message.reply_text(f"Hangup result:\n{result}")
             logger.warning(f"Hangup call result: {result}")
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
         logger.error(f"Exception hanging up call: {e}")
 
@@ -707,24 +3993,25 @@ async def hangup_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized_only
 async def reject_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Reject incoming call"""
-    logger.info(f"User {update.effective_chat.id} rejecting call")
+    target = modem_pool.call_modem()
+    logger.info(f"User {update.effective_chat.id} rejecting call on {target.name}")
     
-    if not modem.connect():
+    if not await modem_pool.run(target, target.connect, priority=PRIORITY_CALL):
         await update.message.reply_text("Failed to connect to modem")
         return
     
     try:
-        result = modem.reject_call()
-        modem.disconnect()
+        result = await modem_pool.run(target, target.reject_call, priority=PRIORITY_CALL)
         
         if 'OK' in result:
             await update.message.reply_text("Call rejected")
             logger.info("Call rejected successfully")
+            if target.name in modem_pool.monitors:
+                modem_pool.monitors[target.name].notify_local_action('reject')
         else:
             await update.message.reply_text(f"Reject result:\n{result}")
             logger.warning(f"Reject call result: {result}")
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
         logger.error(f"Exception rejecting call: {e}")
 
@@ -732,54 +4019,90 @@ async def reject_call(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @authorized_only
 async def signal_strength(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check signal strength"""
-    if not modem.connect():
-        await update.message.reply_text("Failed to connect to modem")
+    sample = telemetry.latest_if_fresh(TELEMETRY_INTERVAL * 3)
+    if sample:
+        await update.message.reply_text(format_signal(sample) + format_pool_signal())
         return
     
     try:
-        result = modem.get_signal_strength()
-        modem.disconnect()
+        result = await cached_status('signal', modem.get_signal_strength)
         await update.message.reply_text(f"Signal: {result}")
+    except ConnectionError as e:
+        await update.message.reply_text(str(e))
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
 
 
 @authorized_only
 async def network_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get network information"""
-    await update.message.reply_text("Fetching network info...")
-    
-    if not modem.connect():
-        await update.message.reply_text("Failed to connect to modem")
+    sample = telemetry.latest_if_fresh(TELEMETRY_INTERVAL * 3)
+    if sample:
+        result = "Network Information:\n\n"
+        result += sample['registration'] + "\n"
+        result += sample['operator'] + "\n"
+        result += format_signal(sample)
+        await update.message.reply_text(result)
         return
     
     try:
         result = "Network Information:\n\n"
-        result += modem.get_registration() + "\n"
-        result += modem.get_operator() + "\n"
-        result += "Signal: " + modem.get_signal_strength()
-        modem.disconnect()
+        result += await cached_status('registration', modem.get_registration) + "\n"
+        result += await cached_status('operator', modem.get_operator) + "\n"
+        result += "Signal: " + await cached_status('signal', modem.get_signal_strength)
         
         await update.message.reply_text(result)
+    except ConnectionError as e:
+        await update.message.reply_text(str(e))
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
 
 
 @authorized_only
-async def storage_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Get storage information"""
-    if not modem.connect():
-        await update.message.reply_text("Failed to connect to modem")
+async def signal_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Signal history over the last hour or day"""
+    periods = {'hour': 3600, '1h': 3600, 'day': 86400, '24h': 86400}
+    period = context.args[0].lower() if context.args else 'hour'
+    if period not in periods:
+        await update.message.reply_text("Usage: /history [hour|day]")
         return
     
+    await update.message.reply_text(f"Signal history (last {period}):\n\n{telemetry.summary(periods[period])}")
+
+
+@authorized_only
+async def storage_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Get storage information"""
     try:
-        result = modem._send_command('AT+CPMS?')
-        modem.disconnect()
+        result = await cached_status('storage', modem.get_storage_info)
         await update.message.reply_text(f"Storage Info:\n{result}")
+    except ConnectionError as e:
+        await update.message.reply_text(str(e))
+    except Exception as e:
+        await update.message.reply_text(f"Error: {str(e)}")
+
+
+@authorized_only
+async def refresh_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Query signal, network and storage live, bypassing caches"""
+    await update.message.reply_text("Refreshing status from modem...")
+    status_cache.invalidate()
+    
+    try:
+        if not await modem_worker.run(modem.connect):
+            await update.message.reply_text("Failed to connect to modem")
+            return
+        sample = await modem_worker.run(modem.sample_telemetry)
+        telemetry.record(sample)
+        storage = await cached_status('storage', modem.get_storage_info, refresh=True)
+        
+        result = "Network Information:\n\n"
+        result += sample['registration'] + "\n"
+        result += sample['operator'] + "\n"
+        result += format_signal(sample) + "\n\n"
+        result += f"Storage Info:\n{storage}"
+        await update.message.reply_text(result)
     except Exception as e:
-        modem.disconnect()
         await update.message.reply_text(f"Error: {str(e)}")
 
 
@@ -788,104 +4111,698 @@ async def clear_seen(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Clear seen messages cache"""
     seen_manager.clear()
     logger.info(f"User {update.effective_chat.id} cleared seen messages cache")
-    await update.message.reply_text("Cleared seen messages cache. You'll be notified about all existing messages on next check.")
+    await update.message.reply_text("Cleared seen messages cache. Messages still stored on the modem will be "
+                                    "notified again on the next check.")
+
+
+def collect_runtime_metrics():
+    """Metrics read from live objects at scrape time"""
+    # The modems join once startup finishes; a scrape may come before that
+    for source in modem_pool.modems if modem_pool is not None else ():
+        labels = {'modem': source.name}
+        yield ('ec25_serial_bytes_total', 'counter', 'Bytes on the modem AT port', dict(labels, direction='in'),
+               source.mux.bytes_in)
+        yield ('ec25_serial_bytes_total', 'counter', 'Bytes on the modem AT port', dict(labels, direction='out'),
+               source.mux.bytes_out)
+        yield ('ec25_modem_connected', 'gauge', 'Whether the modem session is open', labels, int(source.is_connected()))
+        yield ('ec25_modem_sending', 'gauge', 'Outgoing SMS being sent per modem', labels, modem_pool.sending[source.name])
+        for name, stats in modem_pool.worker(source).stats().items():
+            yield ('ec25_modem_queue_depth', 'gauge', 'Modem requests waiting per priority class',
+                   dict(labels, **{'class': name}), stats['depth'])
+            yield ('ec25_modem_requests_total', 'counter', 'Modem requests served per priority class',
+                   dict(labels, **{'class': name}), stats['served'])
+    yield ('ec25_seen_store_writes_total', 'counter', 'Writes to the seen-messages store', {}, seen_manager.total_writes)
+    yield ('ec25_seen_store_bytes_total', 'counter', 'Bytes written to the seen-messages store', {}, seen_manager.total_bytes)
+    yield ('ec25_log_lines_suppressed_total', 'counter', 'Repetitive log lines dropped by the sampler', {},
+           log_sampler.dropped)
+    yield ('ec25_event_bridge_dropped_total', 'counter', 'Modem events dropped by the bridge', {}, event_bridge.dropped)
+    yield ('ec25_event_bridge_coalesced_total', 'counter', 'Modem events coalesced by the bridge', {}, event_bridge.coalesced)
+    yield ('ec25_status_cache_hits_total', 'counter', 'Status queries served from cache', {}, status_cache.hits)
+    yield ('ec25_status_cache_misses_total', 'counter', 'Status queries sent to the modem', {}, status_cache.misses)
+    yield ('ec25_concat_pending_parts', 'gauge', 'Parts of long SMS awaiting the rest', {}, concat_buffer.pending)
+    yield ('ec25_outbox_queued', 'gauge', 'Outgoing SMS waiting to be sent', {}, len(outbox.jobs))
+    yield ('ec25_outbox_retries_total', 'counter', 'Outgoing SMS parts retried', {}, outbox.retried)
+    yield ('ec25_archive_messages', 'gauge', 'SMS in the local archive', {}, archive.size)
+    yield ('ec25_storage_deleted_total', 'counter', 'Forwarded SMS deleted from the modem', {}, storage_manager.deleted)
+    yield ('ec25_storage_pending_deletes', 'gauge', 'Forwarded SMS still on the modem', {}, storage_manager.pending)
+    for (name, storage), (used, total) in storage_manager.usage.items():
+        labels = {'modem': name, 'storage': storage}
+        yield ('ec25_storage_used_messages', 'gauge', 'Messages in modem storage', labels, used)
+        yield ('ec25_storage_capacity_messages', 'gauge', 'Modem storage capacity', labels, total)
+    
+    for phase, seconds in startup.phases + startup.background + [('ready', startup.ready),
+                                                                ('first_forward', startup.first_forward)]:
+        yield ('ec25_startup_seconds', 'gauge', 'Startup phase durations and milestones after process start',
+               {'phase': phase}, seconds)
+    
+    sample = telemetry.latest
+    if sample:
+        for metric, label, _ in TelemetryHistory.METRICS:
+            yield (f'ec25_signal_{metric}', 'gauge', f'Latest {label}', {}, sample.get(metric))
+
+
+async def cached_status(key, func, refresh=False):
+    """Run a modem status query through the TTL cache"""
+    async def fetch():
+        if not await modem_worker.run(modem.connect):
+            raise ConnectionError("Failed to connect to modem")
+        return await modem_worker.run(func)
+    
+    # Never cache a failed or timed-out query
+    return await status_cache.get(key, fetch, refresh, cache_if=lambda value: 'Error' not in value)
+
+
+def format_signal(sample):
+    """Format a telemetry sample for /signal"""
+    text = f"Signal: {EC25Modem.describe_rssi(sample['rssi'])}"
+    if sample.get('rsrp') is not None:
+        text += f"\nRSRP {sample['rsrp']} dBm, RSRQ {sample['rsrq']} dB, SINR {sample['sinr']:.1f} dB"
+        text += f"\nBand {sample['band']}, cell {sample['cell_id']}"
+    elif sample.get('rat'):
+        text += f"\nRAT: {sample['rat']}"
+    text += f"\n(sampled {time.time() - sample['time']:.0f}s ago)"
+    return text
+
 
+def format_pool_signal():
+    """Latest signal of the other pooled modems, appended to /signal"""
+    return ''.join(f"\n{source.name}: {EC25Modem.describe_rssi(modem_pool.rssi.get(source.name))}"
+                   for source in modem_pool.modems[1:])
 
-def handle_incoming_call(caller_id):
-    """Handle incoming call notification"""
-    logger.info(f"Incoming call from: {caller_id}")
+
+async def sample_telemetry(context: ContextTypes.DEFAULT_TYPE):
+    """Background task recording signal and network state (history of the primary modem)"""
+    async def sample(source):
+        modem_pool.rssi.pop(source.name, None)
+        if not await modem_pool.run(source, source.connect, priority=PRIORITY_BACKGROUND):
+            return
+        try:
+            result = await modem_pool.run(source, source.sample_telemetry, priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.error(f"Error sampling telemetry of {source.name}: {e}", exc_info=True)
+            return
+        # Sending prefers the modem with the better signal
+        modem_pool.rssi[source.name] = result['rssi']
+        if source is modem_pool.primary:
+            telemetry.record(result)
+    
+    await asyncio.gather(*(sample(source) for source in modem_pool.modems))
+
+
+def handle_call_event(event, caller_id, details, modem_name=None):
+    """Handle call lifecycle notification"""
+    logger.info(f"Call event '{event}' from: {caller_id} on {modem_name}")
+    metrics.inc('ec25_call_events_total', event=event)
     
-    text = f"""📞 Incoming Call
+    caller = f"{caller_id}{modem_pool.tag(modem_name)}"
+    if event == 'incoming':
+        text = f"""📞 Incoming Call
 
-From: {caller_id}
+From: {caller}
 
 Use /answer to answer
 Use /reject to reject
 Use /hangup to hangup
 """
+    elif event == 'missed':
+        text = f"📵 Missed Call\n\nFrom: {caller}\nRings: {details.get('rings', 0)}"
+    elif event == 'answered':
+        text = f"✅ Call Answered\n\nFrom: {caller}"
+    elif event == 'rejected':
+        text = f"🚫 Call Rejected\n\nFrom: {caller}"
+    else:
+        text = f"📴 Call Ended\n\nFrom: {caller}"
+        if 'duration' in details:
+            text += f"\nDuration: {int(details['duration'])}s"
     
-    # Send notification to all authorized users
-    if telegram_app:
-        for chat_id in user_manager.get_all_users():
-            try:
-                import asyncio
-                # Create task in the event loop
-                asyncio.create_task(
-                    telegram_app.bot.send_message(chat_id=chat_id, text=text)
-                )
-                logger.info(f"Sent call notification to user {chat_id}")
-            except Exception as e:
-                logger.error(f"Error sending call notification to {chat_id}: {e}")
+    # Send notification to all authorized users (from the bot's event loop)
+    event_bridge.post(('call', modem_name, event, caller_id), notifier.broadcast, text, 'call')
 
 
-async def check_new_messages(context: ContextTypes.DEFAULT_TYPE):
-    """Background task to check for new messages"""
-    logger.info("=== Checking for new SMS ===")
-    
-    if not modem.connect():
-        logger.warning("Failed to connect for message check")
+def handle_new_message_indication(line, modem_name=None):
+    """Schedule a fetch of the message announced by +CMTI"""
+    # +CMTI: "SM",3
+    match = re.match(r'\+CMTI:\s*"(\w+)",\s*(\d+)', line)
+    if not match:
+        logger.warning(f"Unparseable new message indication: {repr(line)}")
         return
     
-    try:
-        messages = modem.get_all_messages_with_status()
-        logger.info(f"Retrieved {len(messages)} messages from modem")
-        
-        new_count = 0
-        for msg in messages:
-            msg_id = msg['id']
-            
-            if not seen_manager.is_seen(msg_id):
-                logger.info(f"New message detected: {msg_id}")
-                new_count += 1
-                
-                text = f"""📩 New SMS
+    storage, index = match.groups()
+    logger.info(f"New SMS indicated at {storage}[{index}] on {modem_name}")
+    event_bridge.post(('cmti', modem_name, storage, index), fetch_new_message, storage, index, modem_name)
+
+
+def notify_new_message(msg):
+    """Queue a new SMS for all users and archive it; returns a future that marks it seen once delivered"""
+    text = f"""📩 New SMS
 
 From: {msg['sender']}
-Storage: {msg['storage']} [{msg['index']}]
+Storage: {msg['storage']} [{msg['index']}]{modem_pool.tag(msg.get('modem'))}
 Status: {msg['status']}
 Time: {msg['timestamp']}
 
 {msg['text']}
 """
-                for chat_id in user_manager.get_all_users():
-                    try:
-                        await context.bot.send_message(chat_id=chat_id, text=text)
-                        logger.info(f"Sent SMS notification to user {chat_id}")
-                    except Exception as e:
-                        logger.error(f"Error sending SMS notification to {chat_id}: {e}")
+    if msg.get('missing'):
+        text += f"\n⚠️ Part(s) {', '.join(map(str, msg['missing']))} of {len(msg['parts']) + len(msg['missing'])} never arrived\n"
+    deliveries = notifier.broadcast(text)
+    metrics.inc('ec25_messages_new_total')
+    archive.add(msg)
+    seen_manager.delivering.add(msg['id'])
+    return [asyncio.ensure_future(await_delivery(msg, deliveries))]
+
+
+async def await_delivery(msg, deliveries):
+    """Wait for the notifications of an SMS, then record the outcome"""
+    message_delivered(msg, await asyncio.gather(*deliveries))
+
+
+def message_delivered(msg, results):
+    """Mark an SMS that reached at least one user seen and forwarded, letting it be deleted from the modem"""
+    seen_manager.delivering.discard(msg['id'])
+    if any(results):
+        seen_manager.mark_seen(msg['id'], forwarded=True)
+        metrics.inc('ec25_messages_forwarded_total')
+        storage_manager.mark_forwarded(msg)
+        startup.forwarded()
+    else:
+        # Left unseen and on the modem: the next check notifies it again
+        logger.warning(f"SMS {msg['id']} reached no chat, keeping it for the next check")
+
+
+async def fetch_new_message(storage, index, modem_name=None):
+    """Fetch and forward the single message announced by +CMTI"""
+    source = modem_pool.get(modem_name)
+    if not await modem_pool.run(source, source.connect):
+        logger.warning(f"Failed to connect to fetch {storage}[{index}] from {source.name}")
+        return
+    
+    try:
+        msg = await modem_pool.run(source, source.read_message, index, storage)
+        if msg is None:
+            return
+        msg = concat_buffer.add(msg)
+        if msg is None:
+            logger.info(f"{storage}[{index}] is part of a long SMS, waiting for the rest")
+            return
+        if seen_manager.is_message_seen(msg):
+            logger.debug(f"Indicated message already seen: {msg['id']}")
+            return
+        
+        logger.info(f"New message received: {msg['id']}")
+        async with seen_manager.batch():
+            await asyncio.gather(*notify_new_message(msg))
+        await manage_storage()
+    except Exception as e:
+        logger.error(f"Error fetching message {storage}[{index}]: {e}", exc_info=True)
+
+
+async def check_new_messages(context: ContextTypes.DEFAULT_TYPE):
+    """Background task to check for new messages (reconciliation in event mode)"""
+    logger.info("=== Checking for new SMS ===", extra=ROUTINE)
+    
+    # Each modem is scanned on its own worker, all at the same time
+    connected = await asyncio.gather(*(modem_pool.run(source, source.connect, priority=PRIORITY_BACKGROUND)
+                                       for source in modem_pool.modems))
+    sources = [source for source, ok in zip(modem_pool.modems, connected) if ok]
+    for source, ok in zip(modem_pool.modems, connected):
+        if not ok:
+            logger.warning(f"Failed to connect to {source.name} for message check")
+    if not sources:
+        return
+    
+    try:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        total = 0
+        new_count = 0
+        deliveries = []
+        
+        async def scan(source):
+            nonlocal total, new_count, deliveries
+            # One request per storage so call control can run between them. Messages
+            # are handed over as the listing streams in, so notifying starts right away
+            for storage in MESSAGE_STORAGES:
+                parsed = asyncio.Queue()
+                listing = asyncio.ensure_future(modem_pool.run(
+                    source, source.scan_messages, storage,
+                    lambda msg: loop.call_soon_threadsafe(parsed.put_nowait, msg),
+                    priority=PRIORITY_BACKGROUND))
+                # Runs after every message queued by the scan
+                listing.add_done_callback(lambda _: parsed.put_nowait(None))
+                
+                while (msg := await parsed.get()) is not None:
+                    total += 1
+                    msg = concat_buffer.add(msg)
+                    if msg is None:
+                        continue
+                    if seen_manager.is_message_seen(msg):
+                        # Delivered before (possibly by an earlier run): may be deleted.
+                        # Archived already, unless it came before the archive did
+                        if seen_manager.is_forwarded(msg['id']):
+                            storage_manager.mark_forwarded(msg)
+                        archive.add(msg)
+                    else:
+                        logger.info(f"New message detected: {msg['id']}")
+                        new_count += 1
+                        deliveries += notify_new_message(msg)
+                await listing
+        
+        # One durable journal write and one archive transaction per cycle, however
+        # many messages are new; committed only after the whole burst has been delivered
+        async with seen_manager.batch():
+            async with archive.batch():
+                await asyncio.gather(*(scan(source) for source in sources))
+                
+                for msg in expired_long_messages():
+                    new_count += 1
+                    deliveries += notify_new_message(msg)
                 
-                seen_manager.mark_seen(msg_id)
+                metrics.observe('ec25_poll_cycle_duration_seconds', time.monotonic() - started)
+                logger.info(f"Retrieved {total} messages from {len(sources)} modem(s)", extra=ROUTINE)
+                await asyncio.gather(*deliveries)
         
         if new_count == 0:
             logger.debug("No new messages")
         else:
             logger.info(f"Notified about {new_count} new messages")
+        await manage_storage()
             
     except Exception as e:
         logger.error(f"Error in message check: {e}", exc_info=True)
+
+
+def expired_long_messages():
+    """Long SMS that gave up waiting for missing parts and are not yet notified"""
+    messages = []
+    for msg in concat_buffer.expired():
+        if seen_manager.is_message_seen(msg):
+            continue
+        logger.warning(f"Forwarding long SMS {msg['id']} without part(s) {msg['missing']}")
+        metrics.inc('ec25_messages_incomplete_total')
+        messages.append(msg)
+    return messages
+
+
+async def flush_partial_messages(context: ContextTypes.DEFAULT_TYPE):
+    """Forward long SMS still missing parts after CONCAT_TIMEOUT"""
+    messages = expired_long_messages()
+    if messages:
+        async with seen_manager.batch():
+            deliveries = []
+            for msg in messages:
+                deliveries += notify_new_message(msg)
+            await asyncio.gather(*deliveries)
+        await manage_storage()
+
+
+async def manage_storage(context: ContextTypes.DEFAULT_TYPE = None):
+    """Delete forwarded SMS from the modem and warn users when a storage nears full"""
+    if storage_manager.running:
+        # Deletions requested meanwhile are picked up by the running pass
+        storage_manager.rerun = True
+        return
+    if not seen_manager.durable:
+        logger.warning("Seen messages not on disk yet, keeping forwarded SMS on the modem")
+        return
+    if not archive.available:
+        logger.warning("SMS archive unavailable, keeping forwarded SMS on the modem")
+        return
+    
+    storage_manager.running = True
+    try:
+        sources = []
+        for source in modem_pool.modems:
+            if await modem_pool.run(source, source.connect, priority=PRIORITY_BACKGROUND):
+                sources.append(source)
+            else:
+                logger.warning(f"Failed to connect to {source.name} for storage check")
+        storage_manager.rerun = True
+        while storage_manager.rerun:
+            storage_manager.rerun = False
+            await asyncio.gather(*(purge_storage(source) for source in sources))
+    except Exception as e:
+        logger.error(f"Error managing message storage: {e}", exc_info=True)
     finally:
-        modem.disconnect()
+        storage_manager.running = False
 
 
-def main():
-    """Start the bot"""
-    global telegram_app, call_monitor
+async def purge_storage(source):
+    """Delete the forwarded SMS of one modem and check its storage occupancy.
     
-    logger.info("=" * 60)
-    logger.info("EC25 Telegram Bot Starting")
-    logger.info(f"Log file: {LOG_FILE}")
-    logger.info(f"Authorized users file: {AUTHORIZED_USERS_FILE}")
-    logger.info(f"Seen messages file: {SEEN_MESSAGES_FILE}")
-    logger.info("=" * 60)
+    Deletes are submitted STORAGE_DELETE_BATCH at a time, each batch a
+    background request of its own, so call control and sends are not held
+    up by a long cleanup of a full storage.
+    """
+    for storage in MESSAGE_STORAGES:
+        key = (source.name, storage)
+        # Only messages whose archive row is committed; the rest wait for the next pass
+        candidates = storage_manager.candidates(key, archive.archived)
+        usage = await modem_pool.run(source, source.get_storage_usage, storage, priority=PRIORITY_BACKGROUND)
+        settled, deleted = [], 0
+        if usage is not None:
+            used, total = usage
+            doomed = storage_manager.select(candidates, used, total)
+            if len(doomed) > 1 and len(doomed) == used and await modem_pool.run(
+                    source, storage_manager.delete_all, source, storage, used, priority=PRIORITY_BACKGROUND):
+                # Everything stored is forwarded, and so already read
+                settled, deleted = doomed, len(doomed)
+                storage_manager.bulk_deletes += 1
+            else:
+                for i in range(0, len(doomed), STORAGE_DELETE_BATCH):
+                    batch_settled, batch_deleted = await modem_pool.run(
+                        source, storage_manager.delete_batch, source, storage, doomed[i:i + STORAGE_DELETE_BATCH],
+                        priority=PRIORITY_BACKGROUND)
+                    settled += batch_settled
+                    deleted += batch_deleted
+            usage = (used - deleted, total)
+        # A deleted message's index and timestamp may come back with a new SMS
+        async with seen_manager.batch():
+            for msg_id in storage_manager.settle(key, settled, deleted):
+                seen_manager.forget(msg_id)
+        if usage is None:
+            continue
+        if deleted:
+            status_cache.invalidate('storage')
+            logger.info(f"Deleted {deleted} forwarded SMS from {storage} of {source.name} "
+                        f"({usage[0]}/{usage[1]} used)")
+        warning = storage_manager.check_usage(key, usage, modem_pool.tag(source.name))
+        if warning:
+            logger.warning(warning)
+            notifier.broadcast(warning, 'storage')
+
+
+async def bind_event_loop(application):
+    """Route events raised on modem threads to the bot's event loop and start sending queued SMS.
+    
+    On startup this also waits for open_modems(), starts the modems and
+    runs the first SMS check right away, forwarding what arrived while the
+    bot was down.
+    """
+    global outbox_task, modem_pool, modem, modem_worker
+    event_bridge.attach(asyncio.get_running_loop())
+    if modems_ready is not None:
+        startup.mark('telegram bootstrap')
+        modem_pool = await asyncio.wrap_future(modems_ready)
+        modem, modem_worker = modem_pool.primary, modem_pool.worker(modem_pool.primary)
+        # Start the modems, with call monitoring on each shared session
+        modem_pool.start(on_call=handle_call_event,
+                         on_sms=handle_new_message_indication if SMS_EVENT_MODE else None)
+        startup.mark('waiting for modems')
+        startup.finish()
+        # Runs on the loop once polling starts, like the SMS events of the modems
+        event_bridge.post(('check',), check_new_messages, None)
+    outbox_task = asyncio.ensure_future(run_outbox())
+
+
+async def stop_outbox(application):
+    """Stop the outbox loop and let queued store writes finish; unsent SMS stay queued on disk"""
+    if outbox_task is not None:
+        outbox_task.cancel()
+    for store in (seen_manager, archive, outbox):
+        if store is not None:
+            await store.flush()
+
+
+async def run_outbox():
+    """Send queued SMS, keeping OUTBOX_PIPELINE of them on each modem's worker at once"""
+    outbox.wakeup = asyncio.Event()
+    sending = set()
+    
+    def sent(task):
+        sending.discard(task)
+        outbox.notify()
+    
+    while True:
+        outbox.wakeup.clear()
+        pipeline = OUTBOX_PIPELINE * len(modem_pool)
+        for job in outbox.due(pipeline - len(sending)):
+            task = asyncio.ensure_future(send_queued_sms(job))
+            sending.add(task)
+            task.add_done_callback(sent)
+        # With every slot busy, only a finished send frees one
+        timeout = None if len(sending) >= pipeline else outbox.next_retry()
+        try:
+            await asyncio.wait_for(outbox.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def send_queued_sms(job):
+    """Send the parts of a queued SMS not sent yet; failures go back to the queue with backoff"""
+    error = None
+    source = modem_pool.pick_sender(job.get('modem'))
+    modem_pool.sending[source.name] += 1
+    try:
+        if not await modem_pool.run(source, source.connect, priority=PRIORITY_SEND):
+            # Not the message's fault: try later without using up an attempt
+            job['next_at'] = time.time() + outbox.retry_base
+            outbox.release(job)
+            return
+        
+        parts = source.segments(job['number'], job['text'], job['reference'])
+        while job['sent'] < len(parts):
+            started = time.monotonic()
+            response = await modem_pool.run(source, source.send_segment, job['number'], parts[job['sent']],
+                                            priority=PRIORITY_SEND)
+            metrics.observe('ec25_sms_send_duration_seconds', time.monotonic() - started, modem=source.name)
+            if not response.ok:
+                error = response.final or response.error or "no response from modem"
+                break
+            match = re.search(r'\+CMGS:\s*(\d+)', response.text)
+            outbox.part_sent(job, int(match.group(1)) if match else None, source.name)
+    except Exception as e:
+        logger.error(f"Error sending SMS to {job['number']}: {e}", exc_info=True)
+        error = str(e)
+    finally:
+        modem_pool.sending[source.name] -= 1
+    
+    if error is not None and outbox.part_failed(job, error):
+        outbox.release(job)
+        return
+    
+    metrics.inc('ec25_sms_sent_total', result='ok' if error is None else 'failed', modem=source.name)
+    if error is None:
+        logger.info(f"SMS sent to {job['number']} via {source.name} ({job['sent']} part(s))")
+        archive.add_sent(job, source.name)
+    else:
+        logger.error(f"Giving up on SMS to {job['number']} after {job['attempts'] + 1} attempt(s): {error}")
+    batch = outbox.finish(job, error is None, error)
+    if batch and batch['chat_id'] is not None:
+        notifier.submit(batch['chat_id'], outbox_report(job, batch, error), 'outbox')
+
+
+def outbox_report(job, batch, error=None):
+    """Result of a finished send for the user who queued it"""
+    if batch['size'] == 1:
+        if error is None:
+            parts = f" ({job['sent']} parts)" if job['sent'] > 1 else ""
+            return f"✅ SMS sent to {job['number']}{parts}"
+        return f"❌ Failed to send SMS to {job['number']}:\n{error}"
+    
+    elapsed = batch['finished'] - batch['started']
+    latencies = sorted(batch['latencies'])
+    text = f"""📤 Bulk SMS finished
+
+Sent: {batch['sent']}/{batch['size']} ({batch['parts']} parts)
+Failed: {batch['failed']}
+Retries: {batch['retries']}
+Time: {elapsed:.1f}s ({batch['sent'] / elapsed * 60 if elapsed else 0:.1f} SMS/min)
+Latency: p50 {latencies[len(latencies) // 2]:.1f}s, p90 {latencies[int(len(latencies) * 0.9)]:.1f}s, max {latencies[-1]:.1f}s
+"""
+    if batch['errors']:
+        text += "\nFailed numbers:\n" + "\n".join(f"{number}: {error}" for number, error in batch['errors'][:20])
+        if len(batch['errors']) > 20:
+            text += f"\n... and {len(batch['errors']) - 20} more"
+    return text
+
+
+def recorded_latencies(records):
+    """Time from each recorded write to its final result code (None if never seen)"""
+    final = re.compile(r'(?:^|\n)(?:OK|ERROR|\+CM[ES] ERROR:[^\n]*)\r?\n|> $')
+    latencies = []
+    for i, (offset, direction, _) in enumerate(records):
+        if direction != SerialTrace.WRITE:
+            continue
+        text = ''
+        latency = None
+        for at, later_direction, data in records[i + 1:]:
+            if later_direction == SerialTrace.WRITE:
+                break
+            text += data.decode('utf-8', errors='ignore')
+            if final.search(text):
+                latency = at - offset
+                break
+        latencies.append(latency)
+    return latencies
+
+
+def classify_command(command):
+    """Worker priority class a command would have been submitted with"""
+    if command.startswith(('ATA', 'ATD', 'ATH', 'AT+CHUP')):
+        return PRIORITY_CALL
+    if command.startswith(('AT+CMGS', 'AT+CMGD')):
+        return PRIORITY_SEND
+    if command.startswith(('AT+CMGL', 'AT+CMGR')):
+        return PRIORITY_BACKGROUND
+    return PRIORITY_STATUS
+
+
+async def replay_commands(replay_modem, worker, writes, latencies, scale):
+    """Re-issue recorded writes through the worker at their recorded offsets"""
+    stats = collections.defaultdict(lambda: {'count': 0, 'recorded': [], 'replayed': [], 'failures': 0})
+    parsed = {'messages': 0, 'seconds': 0.0}
+    storage = MESSAGE_STORAGES[0]
+    origin = time.monotonic()
+    
+    for (offset, _, data), recorded in zip(writes, latencies):
+        delay = origin + offset * scale - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        text = data.decode('utf-8', errors='ignore')
+        if text == '\x1b':
+            # CMGS abort after a missing prompt
+            await worker.run(replay_modem.mux.write_raw, data, priority=PRIORITY_SEND)
+            continue
+        if text.upper().startswith('AT'):
+            command = text.strip()
+            name = replay_modem.command_name(command)
+            response = await worker.run(replay_modem.transact, command,
+                                        expect_prompt=command.startswith('AT+CMGS'),
+                                        priority=classify_command(command))
+        else:
+            # SMS body after the '> ' prompt
+            name = 'AT+CMGS body'
+            response = await worker.run(replay_modem.mux.send_payload, 'AT+CMGS', data,
+                                        replay_modem._command_timeout('AT+CMGS'), priority=PRIORITY_SEND)
+            replay_modem._record(response)
+            command = ''
+        
+        entry = stats[name]
+        entry['count'] += 1
+        entry['replayed'].append(response.elapsed)
+        if recorded is not None:
+            entry['recorded'].append(recorded)
+        if not response.ok and not response.prompt:
+            entry['failures'] += 1
+        
+        # Profile the message parsers on the replayed responses
+        started = time.perf_counter()
+        if command.startswith('AT+CMGF='):
+            replay_modem.pdu_mode = command == 'AT+CMGF=0'
+        elif command.startswith('AT+CPMS="'):
+            storage = command.split('"')[1]
+        elif command.startswith('AT+CMGL'):
+            parsed['messages'] += sum(1 for _ in SMSParser(storage, pdu=replay_modem.pdu_mode).parse(iter(response.lines)))
+        elif command.startswith('AT+CMGR=') and response.ok:
+            parsed['messages'] += replay_modem.parse_message(storage, command[8:], response) is not None
+        parsed['seconds'] += time.perf_counter() - started
+    
+    return stats, parsed
+
+
+def replay_trace(path, speed=1.0):
+    """Feed a captured trace through the AT parser and modem worker and report timings"""
+    started, records = SerialTrace.load(path)
+    writes = [record for record in records if record[1] == SerialTrace.WRITE]
+    duration = records[-1][0] if records else 0.0
+    captured = datetime.datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"Trace {path}: captured {captured}, {duration:.1f}s, {len(records)} records, "
+          f"{len(writes)} writes; replaying at {'full speed' if speed <= 0 else f'{speed:g}x'}")
+    
+    port = TraceReplayPort(records, speed)
+    replay_modem = EC25Modem(port=path)
+    urcs = collections.Counter()
+    replay_modem.subscribe(SerialMux.URC_PREFIXES, lambda line: urcs.update([line.split(':')[0]]))
+    replay_modem.mux.attach(port, path)
+    worker = ModemWorker()
+    worker.start()
+    
+    began = time.monotonic()
+    try:
+        stats, parsed = asyncio.run(replay_commands(replay_modem, worker, writes, recorded_latencies(records),
+                                                    port.scale))
+        # Let trailing URCs play out
+        while not port.done and time.monotonic() - began < duration * port.scale + 5:
+            time.sleep(READ_POLL_INTERVAL)
+    finally:
+        worker.stop()
+        replay_modem.disconnect()
+    elapsed = time.monotonic() - began
+    
+    def ms(values):
+        return f"{statistics.mean(values) * 1000:.1f}/{max(values) * 1000:.1f}" if values else "-"
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    print(f"\n{'command':<16}{'count':>6}{'recorded ms':>16}{'replayed ms':>16}{'failed':>8}")
+    print(f"{'':<16}{'':>6}{'(mean/max)':>16}{'(mean/max)':>16}")
+    for name, entry in sorted(stats.items()):
+        print(f"{name:<16}{entry['count']:>6}{ms(entry['recorded']):>16}{ms(entry['replayed']):>16}"
+              f"{entry['failures']:>8}")
+    
+    print(f"\nURCs: {', '.join(f'{name} x{count}' for name, count in urcs.most_common()) or 'none'}")
+    print(f"Parsed {parsed['messages']} messages in {parsed['seconds'] * 1000:.1f}ms")
+    for name, entry in worker.stats().items():
+        if entry['served']:
+            print(f"Worker {name}: {entry['served']} requests, avg wait {entry['avg_wait'] * 1000:.1f}ms")
+    print(f"Writes matched {port.matched}, unmatched {port.unmatched}; "
+          f"replayed in {elapsed:.1f}s ({duration / elapsed if elapsed else 0:.1f}x recorded speed)")
+
+
+def load_state():
+    """Create the state directory and load users, seen messages, the outbox and the SMS archive"""
+    global user_manager, seen_manager, outbox, archive
+    os.makedirs(os.path.dirname(AUTHORIZED_USERS_FILE), exist_ok=True)
+    user_manager = UserManager(AUTHORIZED_USERS_FILE)
+    seen_manager = SeenMessagesManager(SEEN_MESSAGES_FILE)
+    outbox = SMSOutbox(OUTBOX_FILE)
+    archive = SMSArchive(ARCHIVE_FILE)
+
+
+def open_modems(trace_file=None):
+    """Discover the EC25s and open their sessions (runs on a thread during startup)"""
+    started = time.monotonic()
+    # One session, worker and call monitor per EC25; the first is the primary
+    pool = ModemPool()
+    pool.discover()
+    if trace_file:
+        pool.capture(trace_file)
+    for failed in pool.connect_all():
+        # Its call monitor keeps retrying once started
+        logger.warning(f"Modem {failed.name} not ready at startup")
+    startup.record('modem discovery and sessions', time.monotonic() - started)
+    return pool
+
+
+def create_application(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL):
+    """Build the Telegram application with its handlers and background jobs"""
+    global telegram_app, notifier
+    from telegram.ext import Application, CommandHandler
+    
+    # Handlers only await the modem worker, so updates can be processed concurrently
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(True)
+        .post_init(bind_event_loop)
+        .post_stop(stop_outbox)
+    )
+    if base_url:
+        builder.base_url(base_url)
+    application = builder.build()
     telegram_app = application
+    notifier = NotificationDispatcher(application.bot)
     
     # Register command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", start))
     application.add_handler(CommandHandler("list", list_messages))
+    application.add_handler(CommandHandler("search", search_messages))
+    application.add_handler(CommandHandler("from", messages_from))
+    application.add_handler(CommandHandler("more", more_messages))
     application.add_handler(CommandHandler("send", send_message))
+    application.add_handler(CommandHandler("sendbulk", send_bulk))
+    application.add_handler(CommandHandler("outbox", outbox_status))
     application.add_handler(CommandHandler("delete", delete_message))
     application.add_handler(CommandHandler("answer", answer_call))
     application.add_handler(CommandHandler("hangup", hangup_call))
@@ -893,36 +4810,122 @@ def main():
     application.add_handler(CommandHandler("signal", signal_strength))
     application.add_handler(CommandHandler("network", network_info))
     application.add_handler(CommandHandler("storage", storage_info))
+    application.add_handler(CommandHandler("history", signal_history))
+    application.add_handler(CommandHandler("refresh", refresh_status))
     application.add_handler(CommandHandler("clear", clear_seen))
     
     logger.info("Registered all command handlers")
     
-    # Background job for checking messages
+    # New SMS are announced by +CMTI; the periodic scan then only reconciles
+    check_interval = CHECK_INTERVAL
+    if SMS_EVENT_MODE:
+        check_interval = RECONCILE_INTERVAL
+        logger.info("SMS event mode enabled (+CMTI)")
+    
+    # Background job for checking messages (the first check runs on startup)
     application.job_queue.run_repeating(
         check_new_messages,
-        interval=CHECK_INTERVAL,
-        first=10
+        interval=check_interval,
+        first=check_interval
+    )
+    logger.info(f"Started SMS check job (interval: {check_interval}s)")
+    
+    # Long SMS announced part by part are forwarded once complete or timed out
+    if SMS_PDU_MODE:
+        application.job_queue.run_repeating(
+            flush_partial_messages,
+            interval=30,
+            first=30
+        )
+    
+    # Forwarded SMS are deleted after every check; this also watches occupancy
+    application.job_queue.run_repeating(
+        manage_storage,
+        interval=STORAGE_CHECK_INTERVAL,
+        first=60
+    )
+    logger.info(f"Started storage manager (interval: {STORAGE_CHECK_INTERVAL}s)")
+    
+    # Background signal/network sampling feeds /signal, /network and /history
+    application.job_queue.run_repeating(
+        sample_telemetry,
+        interval=TELEMETRY_INTERVAL,
+        first=5
     )
-    logger.info(f"Started SMS check job (interval: {CHECK_INTERVAL}s)")
+    logger.info(f"Started telemetry sampler (interval: {TELEMETRY_INTERVAL}s)")
+    return application
+
+
+def main(trace_file=TRACE_FILE):
+    """Start the bot"""
+    global modems_ready
+    metrics_server = None
+    setup_logging()
+    startup.mark('python and imports')
+    
+    logger.info("=" * 60)
+    logger.info("EC25 Telegram Bot Starting")
+    logger.info(f"Log file: {LOG_FILE}")
+    logger.info(f"Authorized users file: {AUTHORIZED_USERS_FILE}")
+    logger.info(f"Seen messages file: {SEEN_MESSAGES_FILE}")
+    logger.info(f"Outbox file: {OUTBOX_FILE}")
+    logger.info(f"Archive file: {ARCHIVE_FILE}")
+    logger.info("=" * 60)
+    
+    # Before the startup thread, which may write the port cache there
+    for path in (AUTHORIZED_USERS_FILE, PORT_CACHE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
     
-    # Start call monitoring with auto port detection
-    call_monitor = CallMonitor()
-    call_monitor.set_callback(handle_incoming_call)
-    call_monitor.start()
+    # Port discovery and session setup are the slowest part of startup; they
+    # run on their own thread while state is loaded and Telegram boots
+    startup_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="modem-startup")
+    modems_ready = startup_executor.submit(open_modems, trace_file)
+    startup_executor.shutdown(wait=False)
+    
+    load_state()
+    startup.mark('state')
+    
+    application = create_application(TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL)
+    startup.mark('telegram setup')
+    
+    if METRICS_ENABLED:
+        metrics.add_collector(collect_runtime_metrics)
+        metrics_server = MetricsServer(metrics)
+        metrics_server.start()
     
     logger.info("Starting EC25 Telegram Bot with SMS and call detection...")
     
     try:
+        from telegram import Update
         application.run_polling(allowed_updates=Update.ALL_TYPES)
     except KeyboardInterrupt:
         logger.info("Bot stopped by user (Ctrl+C)")
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
     finally:
-        if call_monitor:
-            call_monitor.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if modem_pool is not None:
+            modem_pool.stop()
+        elif modems_ready.done() and not modems_ready.exception():
+            modems_ready.result().stop()
+        if archive is not None:
+            archive.close()
         logger.info("EC25 Telegram Bot stopped")
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="EC25 Telegram SMS and call bot")
+    parser.add_argument('--trace', metavar='FILE', default=TRACE_FILE,
+                        help="record all serial traffic to FILE")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay a recorded trace offline and report timings instead of running the bot")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed multiplier (0 = no delays)")
+    args = parser.parse_args()
+    
+    if args.replay:
+        setup_logging()
+        replay_trace(args.replay, args.speed)
+    else:
+        main(args.trace)
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+EC25 Bot Benchmark Suite
+Runs advanced_sms_forwarder.py against ec25_simulator.py and a stub
+Telegram Bot API server, reporting SMS-to-notification latency, poll
+cycle time vs stored messages, AT command latency percentiles,
+outgoing SMS throughput (spread over several simulated modems with
+--modems), the time from a cold start of the bot process to the
+first SMS forwarded and query times of the SMS archive
+"""
+
+import os
+import sys
+import json
+import random
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.server
+import urllib.parse
+from telegram import Bot
+
+import advanced_sms_forwarder as forwarder
+from ec25_simulator import EC25Simulator
+
+# Configuration
+BOT_TOKEN = '123456:BENCHMARK'
+CHAT_ID = 1000
+POLL_COUNTS = (10, 100, 1000, 5000)
+COMMANDS = ('AT', 'AT+CSQ', 'AT+CREG?', 'AT+COPS?', 'AT+CPMS?')
+COMMAND_ITERATIONS = 200
+SMS_SAMPLES = 50
+SMS_INTERVAL = 0.05  # seconds between injected SMS
+OUTBOX_MESSAGES = 100  # SMS queued for the send throughput test
+OUTBOX_LONG_EVERY = 10  # every Nth queued SMS needs two parts
+SEND_DELAY = 0.02  # simulated network time per AT+CMGS step (s)
+STARTUP_TIMEOUT = 30  # seconds for a fresh bot process to forward its first SMS
+ARCHIVE_MESSAGES = 100000  # archived SMS queried by the archive test (~3 years at 100 a day)
+ARCHIVE_QUERIES = 20  # runs of each archive query
+ARCHIVE_WORDS = ('code', 'your', 'delivery', 'invoice', 'meeting', 'tomorrow', 'payment', 'balance', 'alert',
+                 'account', 'verification', 'parcel', 'confirmed', 'cancelled', 'reminder', 'appointment')
+# Runs the bot's real main() in a fresh process, with its state and the
+# simulated modem in the benchmark's work directory
+STARTUP_SCRIPT = """
+import os, sys
+import advanced_sms_forwarder as forwarder
+token, api_url, port, workdir = sys.argv[1:5]
+forwarder.TELEGRAM_BOT_TOKEN, forwarder.TELEGRAM_API_URL, forwarder.MODEM_PORT = token, api_url, port
+forwarder.AUTHORIZED_USERS_FILE = os.path.join(workdir, 'users.json')
+forwarder.SEEN_MESSAGES_FILE = os.path.join(workdir, 'startup-seen.json')
+forwarder.OUTBOX_FILE = os.path.join(workdir, 'startup-outbox.jsonl')
+forwarder.ARCHIVE_FILE = os.path.join(workdir, 'startup-archive.db')
+forwarder.PORT_CACHE_FILE = os.path.join(workdir, 'port_cache.json')
+forwarder.LOG_FILE = os.path.join(workdir, 'startup.log')
+forwarder.USB_SERIAL_SYSFS = os.path.join(workdir, 'no-sysfs')
+forwarder.METRICS_ENABLED = False
+# Probe only the simulator, never a real modem on this machine
+forwarder.PortDiscovery._fallback_candidates = lambda self: [port]
+forwarder.main()
+"""
+REGRESSION_TOLERANCE = 0.2  # allowed slowdown vs baseline (fraction)
+REGRESSION_MIN_DELTA = 0.002  # seconds; smaller differences are noise
+
+logger = logging.getLogger('benchmark')
+
+
+class StubTelegramServer:
+    """Minimal Bot API stand-in that records sendMessage calls.
+    
+    Optionally adds a fixed latency to every call and answers every Nth
+    sendMessage with 429 so the flood-control path is exercised too.
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, flood_every=0):
+        self.latency = latency
+        self.flood_every = flood_every
+        self.messages = []  # (monotonic time, chat_id, text)
+        self.calls = 0
+        self.floods = 0
+        self.cond = threading.Condition()
+        self.server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-telegram", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def wait_for(self, marker, timeout):
+        """Block until a sent message contains marker; returns its arrival time"""
+        deadline = time.monotonic() + timeout
+        seen = 0
+        with self.cond:
+            while True:
+                for received, _, text in self.messages[seen:]:
+                    if marker in text:
+                        return received
+                seen = len(self.messages)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+    
+    def call(self, method, params):
+        """Result of one Bot API call as (HTTP status, JSON body)"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.cond:
+            self.calls += 1
+            if method == 'getMe':
+                return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Benchmark',
+                                                    'username': 'benchmark_bot'}}
+            if method == 'sendMessage':
+                if self.flood_every and self.calls % self.flood_every == 0:
+                    self.floods += 1
+                    return 429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1},
+                                 'description': 'Too Many Requests: retry after 1'}
+                chat_id = int(params.get('chat_id', 0))
+                self.messages.append((time.monotonic(), chat_id, params.get('text', '')))
+                self.cond.notify_all()
+                return 200, {'ok': True, 'result': {
+                    'message_id': len(self.messages),
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'text': params.get('text', ''),
+                }}
+        if method == 'getUpdates':
+            time.sleep(min(float(params.get('timeout', 0)), 1.0))
+            return 200, {'ok': True, 'result': []}
+        return 200, {'ok': True, 'result': True}
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(body or '{}')
+                else:
+                    params = {k: v[0] for k, v in urllib.parse.parse_qs(body).items()}
+                status, result = stub.call(method, params)
+                payload = json.dumps(result).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # A bot stopped mid long poll (startup benchmark)
+                    pass
+            
+            do_GET = do_POST
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+
+def summarize(samples):
+    """Percentiles (seconds) of a list of samples"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    
+    return {
+        'count': len(ordered),
+        'mean': statistics.mean(ordered),
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': ordered[-1],
+    }
+
+
+async def bench_commands(iterations):
+    """AT command round trips through the modem worker"""
+    results = {}
+    for command in COMMANDS:
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = await forwarder.modem_worker.run(forwarder.modem.transact, command)
+            samples.append(time.perf_counter() - started)
+            if not response.ok:
+                logger.warning(f"{command} failed during benchmark: {response.text!r}")
+        results[command] = summarize(samples)
+    return results
+
+
+async def bench_poll_cycle(sim, api, counts, workdir):
+    """Full check_new_messages cycles: first with every message new, then steady state"""
+    results = {}
+    for count in counts:
+        sim.clear()
+        sim.populate(count, 'ME')
+        forwarder.seen_manager = forwarder.SeenMessagesManager(os.path.join(workdir, f'seen-{count}.json'))
+        sent_before = len(api.messages)
+        
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            await forwarder.check_new_messages(None)
+            timings.append(time.perf_counter() - started)
+        
+        results[str(count)] = {
+            'messages': count,
+            'first': timings[0],
+            'steady': timings[1],
+            'notifications': len(api.messages) - sent_before,
+        }
+    sim.clear()
+    return results
+
+
+async def bench_sms_latency(sim, api, samples, interval):
+    """Time from an SMS arriving at the modem to its notification reaching Telegram"""
+    loop = asyncio.get_running_loop()
+    latencies = []
+    missed = 0
+    for i in range(samples):
+        marker = f"bench-{i}-{time.monotonic_ns()}"
+        started = time.monotonic()
+        if sim.deliver_sms('+34600000000', marker) is None:
+            sim.clear()
+            sim.deliver_sms('+34600000000', marker)
+        received = await loop.run_in_executor(None, api.wait_for, marker, 10)
+        if received is None:
+            missed += 1
+        else:
+            latencies.append(received - started)
+        await asyncio.sleep(interval)
+    return dict(summarize(latencies), missed=missed)
+
+
+async def bench_outbox(sims, count):
+    """Queue count SMS at once and time how fast the outbox gets them out of all modems"""
+    sent_before = [len(sim.sent) for sim in sims]
+    messages = [(f"+3460{i:07d}", f"Alert {i}" + (" details" * 30 if i % OUTBOX_LONG_EVERY == 0 else ""))
+                for i in range(count)]
+    started = time.perf_counter()
+    jobs = forwarder.outbox.add(messages)
+    while any(job['id'] in forwarder.outbox.jobs for job in jobs):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    sent, failed, latencies = forwarder.outbox.recent(elapsed + 1)
+    parts = [len(sim.sent) - before for sim, before in zip(sims, sent_before)]
+    return dict(summarize(latencies), messages=count, parts=sum(parts), per_modem=parts,
+                failed=failed, seconds=elapsed, rate=count / elapsed * 3600)
+
+
+async def bench_archive(workdir, size):
+    """Fill an archive with years of synthetic SMS and time /list, /from and /search queries on it"""
+    rng = random.Random(1)
+    archive = forwarder.SMSArchive(os.path.join(workdir, 'archive-bench.db'))
+    numbers = [f"+34600{i:06d}" for i in range(500)]
+    now = time.time()
+    started = time.perf_counter()
+    async with archive.batch():
+        for i in range(size):
+            at = now - (size - i) * 3 * 365 * 86400 / size
+            sender = rng.choice(numbers)
+            archive.add({
+                'id': f"ME_{i}_{sender}", 'sender': sender, 'storage': 'ME', 'index': str(i % 255), 'modem': None,
+                'timestamp': time.strftime('%y/%m/%d,%H:%M:%S+00', time.gmtime(at)),
+                'text': ' '.join(rng.choice(ARCHIVE_WORDS) for _ in range(8)) + f" #{i}",
+            })
+    fill = time.perf_counter() - started
+    
+    queries = {
+        'list': lambda: archive.recent(1),
+        'list_deep': lambda: archive.recent(max(1, size // archive.page_size // 2)),
+        'from': lambda: archive.from_number('00' + numbers[7][1:]),
+        'search': lambda: archive.search('invoice payment'),
+        'search_rare': lambda: archive.search(f"#{size // 3}"),
+        'search_prefix': lambda: archive.search('verif*'),
+    }
+    results = {'messages': archive.size, 'fill': fill}
+    for name, query in queries.items():
+        samples = []
+        for _ in range(ARCHIVE_QUERIES):
+            started = time.perf_counter()
+            query()
+            samples.append(time.perf_counter() - started)
+        results[name] = summarize(samples)
+    archive.close()
+    return results
+
+
+async def bench_startup(sim, api, port, workdir):
+    """Start the bot in a new process with an SMS waiting on the modem; time until it is forwarded"""
+    marker = f"startup-{time.monotonic_ns()}"
+    sim.deliver_sms('+34600000000', marker)
+    loop = asyncio.get_running_loop()
+    here = os.path.dirname(os.path.abspath(__file__))
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT, BOT_TOKEN, api.base_url, port, workdir],
+                               cwd=here, env=dict(os.environ, PYTHONPATH=here),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        received = await loop.run_in_executor(None, api.wait_for, marker, STARTUP_TIMEOUT)
+    finally:
+        process.terminate()
+        await loop.run_in_executor(None, process.wait)
+    sim.clear()
+    
+    # The bot's own breakdown, from its log
+    breakdown = None
+    with open(os.path.join(workdir, 'startup.log'), errors='replace') as f:
+        for line in f:
+            if ' - Ready ' in line:
+                breakdown = line.split(' - Ready ', 1)[1].strip()
+    return {'first_forward': received - started if received else None, 'breakdown': breakdown}
+
+
+async def run(args, workdir):
+    # The first simulator is the primary modem every other test talks to
+    sims = [EC25Simulator(delay=args.delay, delays={'AT+CMGS': args.send_delay},
+                          per_message_delay=args.per_message_delay, capacity={'SM': 1000}, seed=i + 1)
+            for i in range(args.modems)]
+    sim = sims[0]
+    api = StubTelegramServer(latency=args.api_latency, flood_every=args.flood_every)
+    ports = [simulator.start() for simulator in sims]
+    api.start()
+    
+    bot = Bot(BOT_TOKEN, base_url=api.base_url)
+    await bot.initialize()
+    
+    forwarder.modem_pool = forwarder.ModemPool()
+    for i, port in enumerate(ports):
+        modem = forwarder.modem_pool.add(forwarder.EC25Modem(port=port, name=f"sim{i + 1}"))
+        modem.needs_probe = False
+    forwarder.modem = forwarder.modem_pool.primary
+    forwarder.modem_worker = forwarder.modem_pool.worker(forwarder.modem)
+    forwarder.user_manager = forwarder.UserManager(os.path.join(workdir, 'users.json'))
+    forwarder.user_manager.add_user(CHAT_ID)
+    # Before this process opens the modem, so the cold-started bot has it to itself
+    startup = await bench_startup(sim, api, ports[0], workdir)
+    forwarder.seen_manager = forwarder.SeenMessagesManager(os.path.join(workdir, 'seen.json'))
+    forwarder.outbox = forwarder.SMSOutbox(os.path.join(workdir, 'outbox.jsonl'))
+    forwarder.archive = forwarder.SMSArchive(os.path.join(workdir, 'archive.db'))
+    if args.telegram_limits:
+        forwarder.notifier = forwarder.NotificationDispatcher(bot)
+    else:
+        # Measure the bot itself, not Telegram's per-chat rate limit
+        forwarder.notifier = forwarder.NotificationDispatcher(bot, global_rate=1e6, chat_rate=1e6,
+                                                              chat_burst=1e6)
+    forwarder.modem_pool.start(on_sms=forwarder.handle_new_message_indication)
+    await forwarder.bind_event_loop(None)
+    
+    results = {'config': {
+        'delay': args.delay,
+        'per_message_delay': args.per_message_delay,
+        'api_latency': args.api_latency,
+        'telegram_limits': args.telegram_limits,
+        'send_delay': args.send_delay,
+        'modems': args.modems,
+    }}
+    try:
+        for modem in forwarder.modem_pool.modems:
+            if not await forwarder.modem_pool.run(modem, modem.connect):
+                raise RuntimeError(f"Could not open simulated modem on {modem.port}")
+        
+        print(f"Simulated modem(s) on {', '.join(ports)}, stub Telegram API at {api.base_url}")
+        results['startup'] = startup
+        results['commands'] = await bench_commands(args.iterations)
+        results['poll_cycle'] = await bench_poll_cycle(sim, api, args.counts, workdir)
+        results['sms_latency'] = await bench_sms_latency(sim, api, args.samples, SMS_INTERVAL)
+        results['outbox'] = await bench_outbox(sims, args.outbox)
+        results['archive'] = await bench_archive(workdir, args.archive)
+        results['telegram'] = {'calls': api.calls, 'floods': api.floods, 'sent': forwarder.notifier.sent,
+                               'failed': forwarder.notifier.failed}
+    finally:
+        await forwarder.stop_outbox(None)
+        forwarder.modem_pool.stop()
+        forwarder.archive.close()
+        await bot.shutdown()
+        api.stop()
+        for simulator in sims:
+            simulator.stop()
+    return results
+
+
+def report(results):
+    def ms(value):
+        return f"{value * 1000:.2f}"
+    
+    rounds = max((stats['count'] for stats in results['commands'].values()), default=0)
+    print(f"\nAT command latency (ms, {rounds} round trips each)")
+    print(f"{'command':<12}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for command, stats in results['commands'].items():
+        print(f"{command:<12}" + ''.join(f"{ms(stats[k]):>9}" for k in ('mean', 'p50', 'p90', 'p99', 'max')))
+    
+    print("\nPoll cycle vs stored messages (s)")
+    print(f"{'messages':>10}{'first':>10}{'steady':>10}{'msg/s':>10}{'notifications':>15}")
+    for stats in results['poll_cycle'].values():
+        rate = stats['messages'] / stats['steady'] if stats['steady'] else 0
+        print(f"{stats['messages']:>10}{stats['first']:>10.3f}{stats['steady']:>10.3f}{rate:>10.0f}"
+              f"{stats['notifications']:>15}")
+    
+    stats = results['sms_latency']
+    print(f"\nSMS-to-notification latency (ms, {stats.get('count', 0)} samples, {stats['missed']} missed)")
+    if stats.get('count'):
+        print('  '.join(f"{k} {ms(stats[k])}" for k in ('mean', 'p50', 'p90', 'p99', 'max')))
+    
+    stats = results['outbox']
+    print(f"\nOutgoing SMS ({stats['messages']} queued, {stats['parts']} parts, {stats['failed']} failed)")
+    if len(stats.get('per_modem', ())) > 1:
+        print(f"Parts per modem: {', '.join(map(str, stats['per_modem']))}")
+    print(f"{stats['seconds']:.2f}s, {stats['rate']:.0f} SMS/hour; queue-to-sent latency (ms): "
+          + '  '.join(f"{k} {ms(stats[k])}" for k in ('p50', 'p90', 'max')))
+    
+    stats = results['archive']
+    print(f"\nSMS archive queries (ms, {stats['messages']} messages, filled in {stats['fill']:.1f}s)")
+    print(f"{'query':<16}{'p50':>9}{'p90':>9}{'max':>9}")
+    for name in ('list', 'list_deep', 'from', 'search', 'search_rare', 'search_prefix'):
+        print(f"{name:<16}" + ''.join(f"{ms(stats[name][k]):>9}" for k in ('p50', 'p90', 'max')))
+    
+    stats = results['startup']
+    if stats['first_forward'] is None:
+        print(f"\nStartup: no SMS forwarded within {STARTUP_TIMEOUT}s")
+    else:
+        print(f"\nStartup: first SMS forwarded {stats['first_forward']:.2f}s after process start")
+    if stats['breakdown']:
+        print(f"Ready {stats['breakdown']}")
+    
+    telegram = results['telegram']
+    print(f"\nTelegram API: {telegram['calls']} calls, {telegram['floods']} flood replies, "
+          f"{telegram['sent']} notifications sent, {telegram['failed']} failed")
+
+
+def flatten(results):
+    """Lower-is-better timings keyed by a stable name"""
+    metrics = {}
+    for command, stats in results.get('commands', {}).items():
+        for k in ('p50', 'p90', 'p99'):
+            metrics[f"commands.{command}.{k}"] = stats[k]
+    for count, stats in results.get('poll_cycle', {}).items():
+        metrics[f"poll_cycle.{count}.first"] = stats['first']
+        metrics[f"poll_cycle.{count}.steady"] = stats['steady']
+    for k in ('p50', 'p90', 'p99'):
+        if k in results.get('sms_latency', {}):
+            metrics[f"sms_latency.{k}"] = results['sms_latency'][k]
+    if 'outbox' in results:
+        metrics['outbox.seconds'] = results['outbox']['seconds']
+    for name, stats in results.get('archive', {}).items():
+        if isinstance(stats, dict):
+            metrics[f"archive.{name}.p50"] = stats['p50']
+    if results.get('startup', {}).get('first_forward') is not None:
+        metrics['startup.first_forward'] = results['startup']['first_forward']
+    return metrics
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Print timings that regressed beyond tolerance; returns their number"""
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = 0
+    for name in sorted(current.keys() & previous.keys()):
+        before, after = previous[name], current[name]
+        if after > before * (1 + tolerance) and after - before > min_delta:
+            regressions += 1
+            print(f"REGRESSION {name}: {before * 1000:.2f}ms -> {after * 1000:.2f}ms "
+                  f"(+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    if baseline.get('sms_latency', {}).get('missed', 0) < results['sms_latency']['missed']:
+        regressions += 1
+        print(f"REGRESSION sms_latency.missed: {baseline['sms_latency']['missed']} -> "
+              f"{results['sms_latency']['missed']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EC25 bot against a simulated modem")
+    parser.add_argument('--delay', type=float, default=0.005, help="simulated modem response delay (s)")
+    parser.add_argument('--per-message-delay', type=float, default=0.0,
+                        help="simulated delay between AT+CMGL entries (s)")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="stub Telegram API latency (s)")
+    parser.add_argument('--flood-every', type=int, default=0,
+                        help="answer every Nth sendMessage with 429")
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="keep the bot's Telegram rate limits (NOTIFY_*) instead of lifting them")
+    parser.add_argument('--counts', type=lambda v: [int(c) for c in v.split(',')], default=list(POLL_COUNTS),
+                        help="comma-separated stored message counts for the poll benchmark")
+    parser.add_argument('--iterations', type=int, default=COMMAND_ITERATIONS, help="round trips per command")
+    parser.add_argument('--samples', type=int, default=SMS_SAMPLES, help="SMS injected for the latency test")
+    parser.add_argument('--outbox', type=int, default=OUTBOX_MESSAGES, help="SMS queued for the send test")
+    parser.add_argument('--send-delay', type=float, default=SEND_DELAY,
+                        help="simulated network time per AT+CMGS step (s)")
+    parser.add_argument('--modems', type=int, default=1, help="simulated modems in the pool")
+    parser.add_argument('--archive', type=int, default=ARCHIVE_MESSAGES, help="SMS in the archive query test")
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="fail if slower than these saved results")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument('--min-delta', type=float, default=REGRESSION_MIN_DELTA)
+    args = parser.parse_args()
+    
+    # The bot logs every message at INFO; keep the report readable
+    forwarder.setup_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    forwarder.logger.setLevel(logging.WARNING)
+    
+    with tempfile.TemporaryDirectory(prefix='ec25-bench-') as workdir:
+        results = asyncio.run(run(args, workdir))
+    report(results)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        print(f"\n{regressions} regressions against {args.baseline}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
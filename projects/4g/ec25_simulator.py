@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+EC25 LTE Modem Simulator
+Serves the AT command set used by advanced_sms_forwarder.py over a
+pseudo-terminal, so the bot can be run and benchmarked without hardware
+"""
+
+import os
+import pty
+import tty
+import time
+import random
+import logging
+import argparse
+import threading
+import collections
+
+# Configuration
+DEFAULT_DELAY = 0.01  # seconds before answering any command
+DEFAULT_CAPACITY = {'SM': 50, 'ME': 255}
+DEFAULT_OPERATOR = 'Movistar'
+DEFAULT_CSQ = 21
+RING_INTERVAL = 3  # seconds between RING URCs of an incoming call
+
+logger = logging.getLogger('ec25_simulator')
+
+CMGL_FILTERS = {
+    '"ALL"': None,
+    '"REC UNREAD"': 'REC UNREAD',
+    '"REC READ"': 'REC READ',
+    '"STO UNSENT"': 'STO UNSENT',
+    '"STO SENT"': 'STO SENT',
+}
+PDU_STATUS = ['REC UNREAD', 'REC READ', 'STO UNSENT', 'STO SENT']  # <stat> 0-3, 4 = all
+
+GSM7_BASIC = ("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+              "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+GSM7_EXTENSION = {'\f': 0x0A, '^': 0x14, '{': 0x28, '}': 0x29, '\\': 0x2F, '[': 0x3C,
+                  '~': 0x3D, ']': 0x3E, '|': 0x40, '€': 0x65}
+GSM7_CODES = {char: code for code, char in enumerate(GSM7_BASIC) if code != 0x1B}
+
+
+def gsm7_septets(text):
+    """Septets of text in the GSM 7-bit alphabet, or None if it needs UCS-2"""
+    septets = []
+    for char in text:
+        if char in GSM7_CODES:
+            septets.append(GSM7_CODES[char])
+        elif char in GSM7_EXTENSION:
+            septets.extend((0x1B, GSM7_EXTENSION[char]))
+        else:
+            return None
+    return septets
+
+
+def pack_septets(septets, fill_bits=0):
+    """Pack 7-bit values LSB first, after fill_bits of padding"""
+    packed = bytearray()
+    acc = 0
+    bits = fill_bits
+    for septet in septets:
+        acc |= septet << bits
+        bits += 7
+        while bits >= 8:
+            packed.append(acc & 0xFF)
+            acc >>= 8
+            bits -= 8
+    if bits:
+        packed.append(acc & 0xFF)
+    return bytes(packed)
+
+
+def encode_address(number):
+    """TP-OA: international, national or alphanumeric sender"""
+    digits = number.lstrip('+')
+    if digits.isdigit():
+        padded = digits + 'F' * (len(digits) % 2)
+        swapped = ''.join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+        return bytes([len(digits), 0x91 if number.startswith('+') else 0x81]) + bytes.fromhex(swapped)
+    septets = gsm7_septets(number) or gsm7_septets('?' * len(number))
+    packed = pack_septets(septets)
+    return bytes([(len(septets) * 7 + 3) // 4, 0xD0]) + packed
+
+
+def encode_timestamp(timestamp):
+    """TP-SCTS from the text mode form yy/MM/dd,hh:mm:ss+zz"""
+    values = [int(timestamp[i:i + 2]) for i in range(0, 18, 3)]
+    quarters = int(timestamp[18:20])
+    octets = [(value % 10) << 4 | value // 10 for value in values]
+    octets.append((quarters % 10) << 4 | quarters // 10 | (0x08 if timestamp[17] == '-' else 0))
+    return bytes(octets)
+
+
+def encode_deliver(number, timestamp, text, concat=None):
+    """SMS-DELIVER PDU (hex, without SMSC) and its TPDU length for +CMGL/+CMGR"""
+    header = bytes([5, 0x00, 3, *concat]) if concat else b''
+    septets = gsm7_septets(text)
+    if septets is not None:
+        dcs = 0x00
+        fill = (7 - len(header) * 8 % 7) % 7
+        length = len(septets) + (len(header) * 8 + fill) // 7
+        user_data = header + pack_septets(septets, fill)
+    else:
+        dcs = 0x08
+        user_data = header + text.encode('utf-16-be')
+        length = len(user_data)
+    first = 0x04 | (0x40 if header else 0)  # TP-MMS, TP-UDHI
+    tpdu = (bytes([first]) + encode_address(number) + bytes([0x00, dcs])
+            + encode_timestamp(timestamp) + bytes([length]) + user_data)
+    return '00' + tpdu.hex().upper(), len(tpdu)
+
+
+def split_message(text):
+    """Parts of a long SMS: 153 GSM 7-bit septets or 67 UCS-2 characters each"""
+    septets = gsm7_septets(text)
+    if septets is None:
+        if len(text.encode('utf-16-be')) <= 140:
+            return [text]
+        parts, current = [], ''
+        for char in text:
+            if len((current + char).encode('utf-16-be')) > 134:
+                parts.append(current)
+                current = ''
+            current += char
+        return parts + [current]
+    if len(septets) <= 160:
+        return [text]
+    parts, current, size = [], '', 0
+    for char in text:
+        width = 2 if char in GSM7_EXTENSION else 1
+        if size + width > 153:
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += width
+    return parts + [current]
+
+
+class EC25Simulator:
+    """Simulated EC25 on a pty: text-mode SMS, status queries and voice calls.
+    
+    Commands are answered after a configurable delay (per command prefix,
+    plus a per-message delay while streaming listings). Incoming SMS, calls
+    and arbitrary URCs are injected from other threads and never split a
+    response in progress.
+    """
+    
+    def __init__(self, delay=DEFAULT_DELAY, delays=None, per_message_delay=0.0,
+                 capacity=None, seed=None):
+        self.delay = delay
+        self.delays = dict(delays or {})
+        self.per_message_delay = per_message_delay
+        self.capacity = dict(DEFAULT_CAPACITY, **(capacity or {}))
+        self.random = random.Random(seed)
+        self.stores = {storage: collections.OrderedDict() for storage in self.capacity}
+        self.memories = ['SM', 'SM', 'SM']  # read/delete, write/send, receive
+        self.echo = True
+        self.cmgf = 1
+        self.concat_reference = 0
+        self.cscs = 'GSM'
+        self.clip = False
+        self.cnmi = None
+        self.creg = 0
+        self.csq = DEFAULT_CSQ
+        self.operator = DEFAULT_OPERATOR
+        self.call_state = None  # None, 'ringing' or 'active'
+        self.caller = None
+        self.call_seq = 0
+        self.message_ref = 0
+        self.send_failures = collections.deque()  # +CMS ERROR codes for the next sends
+        self.sent = []  # (number, text) in text mode, (TPDU length, hex PDU) in PDU mode
+        self.commands = collections.Counter()
+        self.lock = threading.RLock()  # state
+        self.write_lock = threading.RLock()  # keeps URCs out of responses
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+    
+    def start(self):
+        """Open the pty and start answering; returns the port path"""
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.thread = threading.Thread(target=self._serve, name="ec25-sim", daemon=True)
+        self.thread.start()
+        logger.info(f"Simulated EC25 listening on {self.port}")
+        return self.port
+    
+    def stop(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master = self.slave = None
+    
+    # Storage
+    
+    def _free_index(self, storage):
+        store = self.stores[storage]
+        # Stores usually fill contiguously from 1
+        if len(store) < self.capacity[storage] and len(store) + 1 not in store:
+            return len(store) + 1
+        for index in range(1, self.capacity[storage] + 1):
+            if index not in store:
+                return index
+        return None
+    
+    def store_message(self, storage, status, number, text, timestamp=None, concat=None):
+        """Put a message in storage; returns its index (None if full)"""
+        if timestamp is None:
+            timestamp = time.strftime('%y/%m/%d,%H:%M:%S') + '+04'
+        with self.lock:
+            index = self._free_index(storage)
+            if index is not None:
+                self.stores[storage][index] = [status, number, timestamp, text, concat]
+            return index
+    
+    def populate(self, count, storage='ME', status='REC READ'):
+        """Fill storage with count synthetic messages, growing it if needed"""
+        with self.lock:
+            self.capacity[storage] = max(self.capacity[storage], len(self.stores[storage]) + count)
+            for n in range(count):
+                number = f"+3460{self.random.randrange(10 ** 7):07d}"
+                day = 1 + n % 28
+                timestamp = f"24/01/{day:02d},{n // 3600 % 24:02d}:{n // 60 % 60:02d}:{n % 60:02d}+04"
+                words = self.random.randint(3, 25)
+                text = ' '.join(self.random.choice(('hello', 'code', 'your', 'is', 'bank', 'delivery',
+                                                    'today', 'call', 'me', '1234', 'ok'))
+                                for _ in range(words))
+                self.store_message(storage, status, number, f"#{n} {text}", timestamp)
+    
+    def clear(self, storage=None):
+        with self.lock:
+            for name, store in self.stores.items():
+                if storage in (None, name):
+                    store.clear()
+    
+    def deliver_sms(self, sender, text, timestamp=None):
+        """Receive an SMS into the receive storage and announce it with +CMTI.
+        
+        Texts too long for one SMS arrive as concatenated parts, each stored
+        and announced on its own; returns the index of the last part.
+        """
+        storage = self.memories[2]
+        parts = split_message(text)
+        if len(parts) > 1:
+            self.concat_reference = (self.concat_reference + 1) % 256
+        index = None
+        for sequence, part in enumerate(parts, 1):
+            concat = (self.concat_reference, len(parts), sequence) if len(parts) > 1 else None
+            index = self.store_message(storage, 'REC UNREAD', sender, part, timestamp, concat)
+            if index is None:
+                logger.warning(f"{storage} full, SMS from {sender} dropped")
+                return None
+            # AT+CNMI=<mode>,<mt>: mt=1 reports the storage index
+            if self.cnmi and len(self.cnmi) > 1 and self.cnmi[1] == '1':
+                self.inject(f'+CMTI: "{storage}",{index}')
+        return index
+    
+    def fail_sends(self, count=1, code=500):
+        """Make the next count AT+CMGS fail with +CMS ERROR: code"""
+        self.send_failures.extend([code] * count)
+    
+    # Calls
+    
+    def ring(self, caller, rings=3, interval=RING_INTERVAL):
+        """Start an incoming call; the caller hangs up after rings unanswered RINGs"""
+        with self.lock:
+            self.call_seq += 1
+            call_seq = self.call_seq
+            self.call_state = 'ringing'
+            self.caller = caller
+        threading.Thread(target=self._ring_loop, args=(call_seq, rings, interval),
+                         name="ec25-sim-ring", daemon=True).start()
+    
+    def _ring_loop(self, call_seq, rings, interval):
+        for _ in range(rings):
+            with self.lock:
+                if self.call_seq != call_seq or self.call_state != 'ringing':
+                    return
+                clip = self.clip
+            self.inject('RING')
+            if clip:
+                self.inject(f'+CLIP: "{self.caller}",145,,,,0')
+            time.sleep(interval)
+        self.remote_hangup(call_seq)
+    
+    def remote_hangup(self, call_seq=None):
+        """The other party ends the call (or gives up ringing)"""
+        with self.lock:
+            if self.call_state is None or call_seq not in (None, self.call_seq):
+                return
+            self.call_state = None
+            self.caller = None
+        self.inject('NO CARRIER')
+    
+    # Port I/O
+    
+    def inject(self, line):
+        """Emit an unsolicited result code"""
+        self._write(f'\r\n{line}\r\n')
+    
+    def _write(self, text):
+        if self.master is None:
+            return
+        with self.write_lock:
+            try:
+                os.write(self.master, text.encode())
+            except OSError:
+                pass
+    
+    def _serve(self):
+        """Read commands, answer them, and collect SMS bodies after the prompt"""
+        buffer = b''
+        body_for = None
+        while self.master is not None:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            
+            while True:
+                if body_for is not None:
+                    end = min((i for i in (buffer.find(b'\x1a'), buffer.find(b'\x1b')) if i >= 0), default=-1)
+                    if end < 0:
+                        break
+                    body, terminator, buffer = buffer[:end], buffer[end:end + 1], buffer[end + 1:]
+                    self._finish_send(body_for, body.decode(errors='ignore'), terminator == b'\x1a')
+                    body_for = None
+                    continue
+                
+                end = buffer.find(b'\r')
+                if end < 0:
+                    break
+                line, buffer = buffer[:end].decode(errors='ignore').strip(), buffer[end + 1:].lstrip(b'\n')
+                if not line:
+                    continue
+                body_for = self._handle(line)
+    
+    def _pause(self, command):
+        matches = [prefix for prefix in self.delays if command.startswith(prefix)]
+        delay = self.delays[max(matches, key=len)] if matches else self.delay
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _handle(self, command):
+        """Answer one command line; returns the recipient when a body is expected"""
+        self.commands[command.split('=')[0].split('?')[0]] += 1
+        self._pause(command)
+        echo = command + '\r' if self.echo else ''
+        upper = command.upper()
+        
+        if upper.startswith('AT+CMGS='):
+            argument = command.split('=', 1)[1]
+            if self.cmgf != 1 and not argument.isdigit():
+                self._write(echo + '\r\n+CMS ERROR: 304\r\n')
+                return None
+            self._write(echo + '\r\n> ')
+            # PDU mode: <length> of the TPDU that follows as hex
+            return int(argument) if self.cmgf != 1 else argument.strip('"')
+        
+        if upper.startswith('AT+CMGL'):
+            with self.write_lock:
+                self._write(echo)
+                self._list_messages(command)
+            return None
+        
+        try:
+            lines = self._execute(command, upper)
+        except (ValueError, IndexError, KeyError):
+            lines = ['ERROR']
+        self._write(echo + ''.join(f'\r\n{line}\r\n' for line in lines))
+        return None
+    
+    def _execute(self, command, upper):
+        """Result lines (final code included) for commands answered in one piece"""
+        argument = command.split('=', 1)[1] if '=' in command else None
+        with self.lock:
+            if upper in ('AT', 'ATE0', 'ATE1', 'ATE', 'ATZ'):
+                if upper != 'AT':
+                    self.echo = upper == 'ATE1'
+                return ['OK']
+            if upper.startswith('AT+CMGF='):
+                self.cmgf = int(argument)
+                return ['OK']
+            if upper.startswith('AT+CSCS='):
+                self.cscs = argument.strip('"')
+                return ['OK']
+            if upper == 'AT+CPMS?':
+                usage = ','.join(f'"{m}",{len(self.stores[m])},{self.capacity[m]}' for m in self.memories)
+                return [f'+CPMS: {usage}', 'OK']
+            if upper.startswith('AT+CPMS='):
+                requested = [m.strip().strip('"') for m in argument.split(',')]
+                if any(m not in self.stores for m in requested):
+                    return ['+CMS ERROR: 302']
+                self.memories[:len(requested)] = requested
+                usage = ','.join(f'{len(self.stores[m])},{self.capacity[m]}' for m in self.memories)
+                return [f'+CPMS: {usage}', 'OK']
+            if upper.startswith('AT+CMGR='):
+                return self._read_message(int(argument))
+            if upper.startswith('AT+CMGD='):
+                return self._delete_messages(argument)
+            if upper == 'AT+CSQ':
+                return [f'+CSQ: {self.csq},99', 'OK']
+            if upper.startswith('AT+CREG='):
+                self.creg = int(argument)
+                return ['OK']
+            if upper == 'AT+CREG?':
+                return [f'+CREG: {self.creg},1', 'OK']
+            if upper == 'AT+COPS?':
+                return [f'+COPS: 0,0,"{self.operator}",7', 'OK']
+            if upper.startswith('AT+QENG='):
+                rsrp = -140 + self.csq * 3
+                return [f'+QENG: "servingcell","NOCONN","LTE","FDD",214,07,1A2B3C4,123,1850,3,5,5,'
+                        f'ABCD,{rsrp},-10,{rsrp + 30},{self.random.randint(80, 150)},-', 'OK']
+            if upper.startswith('AT+CLIP='):
+                self.clip = argument == '1'
+                return ['OK']
+            if upper == 'AT+CLIP?':
+                return [f'+CLIP: {int(self.clip)},1', 'OK']
+            if upper.startswith('AT+CNMI='):
+                self.cnmi = [field.strip() for field in argument.split(',')]
+                return ['OK']
+            if upper == 'AT+CLCC':
+                if self.call_state is None:
+                    return ['OK']
+                state = 0 if self.call_state == 'active' else 4
+                return [f'+CLCC: 1,1,{state},0,0,"{self.caller}",145', 'OK']
+            if upper == 'ATA':
+                if self.call_state != 'ringing':
+                    return ['NO CARRIER']
+                self.call_state = 'active'
+                return ['OK']
+            if upper in ('ATH', 'ATH0', 'AT+CHUP'):
+                self.call_state = None
+                self.caller = None
+                self.call_seq += 1
+                return ['OK']
+        return ['ERROR']
+    
+    def _header(self, index, message):
+        status, number, timestamp = message[:3]
+        if self.cmgf != 1:
+            # PDU mode: <stat>,<alpha>,<length of the TPDU>
+            _, length = encode_deliver(*message[1:])
+            if index is None:
+                return f'+CMGR: {PDU_STATUS.index(status)},,{length}'
+            return f'+CMGL: {index},{PDU_STATUS.index(status)},,{length}'
+        if index is None:
+            return f'+CMGR: "{status}","{number}",,"{timestamp}"'
+        return f'+CMGL: {index},"{status}","{number}",,"{timestamp}"'
+    
+    def _body(self, message):
+        if self.cmgf != 1:
+            return encode_deliver(*message[1:])[0]
+        return message[3].replace('\n', '\r\n')
+    
+    def _list_messages(self, command):
+        """Stream AT+CMGL output message by message, as the modem does"""
+        argument = command.split('=', 1)[1] if '=' in command else ('"REC UNREAD"' if self.cmgf == 1 else '0')
+        if self.cmgf != 1:
+            filters = {str(stat): status for stat, status in enumerate(PDU_STATUS + [None])}
+        else:
+            filters = CMGL_FILTERS
+        if argument.upper() not in filters:
+            self._write('\r\n+CMS ERROR: 302\r\n')
+            return
+        wanted = filters[argument.upper()]
+        
+        with self.lock:
+            store = self.stores[self.memories[0]]
+            # Listed with the status they had; unread ones become read
+            selected = [(index, list(message)) for index, message in store.items()
+                        if wanted is None or message[0] == wanted]
+            for index, message in selected:
+                if message[0] == 'REC UNREAD':
+                    store[index][0] = 'REC READ'
+        
+        chunk = []
+        for index, message in selected:
+            chunk.append(f'\r\n{self._header(index, message)}\r\n{self._body(message)}')
+            if self.per_message_delay > 0:
+                self._write(''.join(chunk))
+                chunk = []
+                time.sleep(self.per_message_delay)
+            elif len(chunk) >= 64:
+                self._write(''.join(chunk))
+                chunk = []
+        self._write(''.join(chunk) + ('\r\n' if selected else '') + '\r\nOK\r\n')
+    
+    def _read_message(self, index):
+        message = self.stores[self.memories[0]].get(index)
+        if message is None:
+            return ['+CMS ERROR: 321']
+        lines = [f'{self._header(None, message)}\r\n{self._body(message)}', 'OK']
+        if message[0] == 'REC UNREAD':
+            message[0] = 'REC READ'
+        return lines
+    
+    def _delete_messages(self, argument):
+        fields = [field.strip() for field in argument.split(',')]
+        store = self.stores[self.memories[0]]
+        index = int(fields[0])
+        flag = int(fields[1]) if len(fields) > 1 else 0
+        # <delflag>: 1 read, 2 read+sent, 3 read+sent+unsent, 4 all
+        statuses = {
+            1: ('REC READ',),
+            2: ('REC READ', 'STO SENT'),
+            3: ('REC READ', 'STO SENT', 'STO UNSENT'),
+        }
+        if flag == 0:
+            if index not in store and not 1 <= index <= self.capacity[self.memories[0]]:
+                return ['+CMS ERROR: 321']
+            store.pop(index, None)
+        elif flag == 4:
+            store.clear()
+        elif flag in statuses:
+            for i in [i for i, message in store.items() if message[0] in statuses[flag]]:
+                del store[i]
+        else:
+            return ['+CMS ERROR: 302']
+        return ['OK']
+    
+    def _finish_send(self, number, text, submit):
+        """Complete AT+CMGS once the body is terminated (Ctrl-Z sends, ESC aborts)"""
+        self._pause('AT+CMGS')
+        if not submit:
+            self._write('\r\nOK\r\n')
+            return
+        with self.lock:
+            if isinstance(number, int):
+                try:
+                    pdu = bytes.fromhex(text.strip())
+                    valid = len(pdu) == 1 + pdu[0] + number
+                except (ValueError, IndexError):
+                    valid = False
+                if not valid:
+                    self._write('\r\n+CMS ERROR: 304\r\n')
+                    return
+            if self.send_failures:
+                code = self.send_failures.popleft()
+                self._write(f'\r\n+CMS ERROR: {code}\r\n')
+                return
+            self.message_ref = (self.message_ref + 1) % 256
+            reference = self.message_ref
+            self.sent.append((number, text))
+        logger.info(f"SMS to {number}: {text!r}" if isinstance(number, str) else f"SMS PDU ({number} octets): {text}")
+        self._write(f'\r\n+CMGS: {reference}\r\n\r\nOK\r\n')
+
+
+def console(sim):
+    """Interactive control: inject SMS, calls and URCs from stdin"""
+    print("Commands: sms <from> <text> | ring <from> [rings] | hangup | urc <line> | "
+          "populate <count> [storage] | clear | fail <count> [code] | csq <value> | quit")
+    while True:
+        try:
+            line = input('ec25> ').strip()
+        except EOFError:
+            return
+        if not line:
+            continue
+        name, _, rest = line.partition(' ')
+        args = rest.split()
+        try:
+            if name == 'sms':
+                sender, _, text = rest.partition(' ')
+                index = sim.deliver_sms(sender, text.replace('\\n', '\n'))
+                print(f"Stored at index {index}")
+            elif name == 'ring':
+                sim.ring(args[0], int(args[1]) if len(args) > 1 else 3)
+            elif name == 'hangup':
+                sim.remote_hangup()
+            elif name == 'urc':
+                sim.inject(rest)
+            elif name == 'populate':
+                sim.populate(int(args[0]), args[1] if len(args) > 1 else 'ME')
+            elif name == 'clear':
+                sim.clear()
+            elif name == 'fail':
+                sim.fail_sends(int(args[0]), int(args[1]) if len(args) > 1 else 500)
+            elif name == 'csq':
+                sim.csq = int(args[0])
+            elif name in ('quit', 'exit'):
+                return
+            else:
+                print(f"Unknown command: {name}")
+        except (IndexError, ValueError) as e:
+            print(f"Bad arguments: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated EC25 modem on a pseudo-terminal")
+    parser.add_argument('--delay', type=float, default=DEFAULT_DELAY,
+                        help="seconds before answering a command")
+    parser.add_argument('--per-message-delay', type=float, default=0.0,
+                        help="seconds between messages of an AT+CMGL listing")
+    parser.add_argument('--messages', type=int, default=0, help="synthetic messages to preload")
+    parser.add_argument('--storage', default='ME', choices=sorted(DEFAULT_CAPACITY),
+                        help="storage to preload")
+    parser.add_argument('--seed', type=int, help="random seed for synthetic messages")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sim = EC25Simulator(delay=args.delay, per_message_delay=args.per_message_delay, seed=args.seed)
+    if args.messages:
+        sim.populate(args.messages, args.storage)
+    print(f"EC25 simulator on {sim.start()} (set MODEM_PORT to this path)")
+    try:
+        console(sim)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == '__main__':
+    main()
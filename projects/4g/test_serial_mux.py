@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for how SerialMux splits the modem byte stream into lines.
+
+Run with: python3 -m unittest test_serial_mux
+"""
+
+import queue
+import unittest
+
+from advanced_sms_forwarder import SerialMux
+
+
+class ChunkedPort:
+    """Serial port stand-in that answers each write with reads cut at given points"""
+    
+    def __init__(self, replies):
+        self.replies = list(replies)  # one list of chunks per command written
+        self.reads = queue.Queue()
+        self.is_open = True
+        self.in_waiting = 0  # the mux then reads one chunk per call
+    
+    def write(self, data):
+        for chunk in self.replies.pop(0):
+            self.reads.put(chunk)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def read(self, size=1):
+        try:
+            return self.reads.get(timeout=0.05)
+        except queue.Empty:
+            return b''
+    
+    def close(self):
+        self.is_open = False
+
+
+class ChunkBoundaryTest(unittest.TestCase):
+    
+    def transact(self, command, *replies):
+        mux = SerialMux()
+        port = ChunkedPort(replies)
+        mux.attach(port, '/dev/test')
+        self.addCleanup(mux.close)
+        return mux.transact(command, timeout=2), port
+    
+    def test_read_split_inside_line_ending(self):
+        response, _ = self.transact('AT+CSQ', [b'\r\n+CSQ: 20,99\r', b'\n\r\nOK\r', b'\n'])
+        self.assertEqual(response.final, 'OK')
+        self.assertEqual(response.lines, ['+CSQ: 20,99'])
+    
+    def test_split_before_body_line_reading_ok(self):
+        header = b'+CMGR: "REC UNREAD","+15550100",,"26/10/17,10:00:00+08"'
+        response, port = self.transact('AT+CMGR=1', [b'\r\n' + header + b'\r\nline1\r',
+                                                     b'\nOK\r\nline3\r\n\r\nOK\r\n'])
+        self.assertEqual(response.final, 'OK')
+        self.assertEqual(response.lines, [header.decode(), 'line1', 'OK', 'line3', ''])
+        self.assertTrue(port.reads.empty())
+    
+    def test_multiline_body_gets_no_stray_blank_lines(self):
+        header = b'+CMGL: 1,"REC READ","+15550100",,"26/10/17,10:00:00+08"'
+        response, _ = self.transact('AT+CMGL="ALL"', [b'\r\n' + header + b'\r\nfirst\r', b'\nsecond\r',
+                                                      b'\n\r', b'\nOK\r\n'])
+        self.assertEqual(response.final, 'OK')
+        self.assertEqual(response.lines, [header.decode(), 'first', 'second', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()